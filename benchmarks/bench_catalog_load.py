@@ -0,0 +1,99 @@
+"""
+Catalog load time and memory: JSON snapshot vs memory-mapped binary snapshot.
+
+Writes the same catalog (synthetic, or a DummyJSON dump) in both formats, then
+times loading each into a CatalogIndex and measures the Python heap it holds
+with tracemalloc. Mapped pages live in the shared page cache, not the heap.
+Also times find_gift for names no product matches, which run the whole lookup
+chain down to the last-resort substring scan.
+
+Usage:
+    python benchmarks/bench_catalog_load.py [--products 10000] [--repeat 5]
+    python benchmarks/bench_catalog_load.py --dump products.json
+"""
+import argparse
+import gc
+import json
+import logging
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_recommender import synthetic_products  # noqa: E402
+from catalog import load_snapshot  # noqa: E402
+from catalog_store import build_snapshot  # noqa: E402
+
+
+def _measure(path: Path, repeat: int) -> None:
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        catalog = load_snapshot(path)
+        timings.append((time.perf_counter() - started) * 1000)
+        del catalog
+
+    gc.collect()
+    tracemalloc.start()
+    catalog = load_snapshot(path)
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    started = time.perf_counter()
+    for position in range(0, len(catalog), max(1, len(catalog) // 1000)):
+        catalog.products[position]
+    access_us = (time.perf_counter() - started) * 1e6 / min(1000, len(catalog))
+
+    misses = []
+    for attempt in range(20):
+        started = time.perf_counter()
+        catalog.find_gift(f"zqxv gizmo {attempt}")
+        misses.append((time.perf_counter() - started) * 1000)
+
+    print(
+        f"{path.suffix[1:]:>4}: {path.stat().st_size / 1e6:6.1f} MB on disk, "
+        f"load p50={statistics.median(timings):7.1f}ms, heap held={held / 1e6:6.1f} MB "
+        f"peak={peak / 1e6:6.1f} MB, product access={access_us:.2f}us, "
+        f"find_gift miss p50={statistics.median(misses):.2f}ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5, help="timed loads per format")
+    parser.add_argument("--dump", help="DummyJSON products dump to use instead of a synthetic catalog")
+    args = parser.parse_args()
+    logging.getLogger("avatar").setLevel(logging.WARNING)
+
+    if args.dump:
+        with open(args.dump, "r", encoding="utf-8") as f:
+            products = json.load(f)["products"]
+    else:
+        products = synthetic_products(args.products)
+        for position, product in enumerate(products):
+            product["id"] = position + 1
+            product["thumbnail"] = f"https://cdn.dummyjson.com/products/{position + 1}/thumbnail.webp"
+            product["images"] = [f"https://cdn.dummyjson.com/products/{position + 1}/1.webp"]
+
+    with tempfile.TemporaryDirectory() as directory:
+        json_path = Path(directory) / "catalog.json"
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump({"products": products}, f)
+        bin_path = Path(directory) / "catalog.bin"
+        build_snapshot(products, bin_path)
+        del products
+
+        print(f"{args.repeat} loads per format")
+        _measure(json_path, args.repeat)
+        _measure(bin_path, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
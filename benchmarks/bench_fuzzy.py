@@ -0,0 +1,137 @@
+"""
+Typo-tolerant gift matching: recovery rate and latency.
+
+Misspells catalog title words the way STT does (substituted, dropped, doubled
+or swapped letters, and words split in two), then measures how often the plain
+search variants and the typo-corrected lookup still find a product with the
+original word in its title, and how long correction and find_gift take.
+Also checks that correctly spelled gifts the catalog doesn't sell resolve to
+nothing or to a related product, never to an unrelated one, and that names
+containing a shorter alias ("headphones" / "phone") get the right category
+(exits 1 if not).
+
+Usage:
+    python benchmarks/bench_fuzzy.py [--queries 2000]
+    python benchmarks/bench_fuzzy.py --dump products.json
+"""
+import argparse
+import json
+import logging
+import random
+import statistics
+import string
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_tools import fixture_products  # noqa: E402
+from catalog import CatalogIndex, match_category, search_variants, tokenize  # noqa: E402
+
+# Gifts the fixture catalog doesn't sell, and the title words or category a
+# related product would have
+UNSOLD_GIFTS = {
+    "bike": ("bike", "bicycle", "sports-accessories"),
+    "teddy bear": ("teddy", "bear", "toys"),
+}
+# Gift names whose category key contains (or is contained in) another key
+CATEGORY_CASES = {
+    "headphones": "headphones",
+    "wireless headphone": "headphones",
+    "smartphones": "smartphone",
+    "handbags": "handbag",
+}
+
+
+def misspell(word: str, rng: random.Random) -> str:
+    position = rng.randrange(1, len(word) - 1)
+    kind = rng.choice(("substitute", "drop", "double", "swap", "split"))
+    if kind == "substitute":
+        return word[:position] + rng.choice(string.ascii_lowercase) + word[position + 1 :]
+    if kind == "drop":
+        return word[:position] + word[position + 1 :]
+    if kind == "double":
+        return word[:position] + word[position] + word[position:]
+    if kind == "swap":
+        return word[: position - 1] + word[position] + word[position - 1] + word[position + 1 :]
+    return f"{word[:position]} {word[position:]}"
+
+
+def _percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--dump", help="DummyJSON products dump to use instead of the fixture catalog")
+    args = parser.parse_args()
+    logging.getLogger("avatar").setLevel(logging.WARNING)
+
+    if args.dump:
+        with open(args.dump, "r", encoding="utf-8") as f:
+            products = json.load(f)["products"]
+    else:
+        products = fixture_products()
+    catalog = CatalogIndex(products)
+
+    rng = random.Random(0)
+    words = sorted({token for p in products for token in tokenize(p.get("title", "")) if len(token) >= 5})
+    exact_found = corrected_found = 0
+    correct_latencies: List[float] = []
+    find_latencies: List[float] = []
+    for _ in range(args.queries):
+        word = rng.choice(words)
+        query = misspell(word, rng)
+
+        if any(
+            word in product.get("title", "").lower()
+            for term in search_variants(query)
+            for product in catalog.search(term)[:1]
+        ):
+            exact_found += 1
+
+        started = time.perf_counter()
+        catalog.correct(query)
+        correct_latencies.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        product = catalog.find_gift(query)
+        find_latencies.append((time.perf_counter() - started) * 1000)
+        if product and word in product.get("title", "").lower():
+            corrected_found += 1
+
+    print(f"{args.queries} misspelled queries over {len(products)} products ({len(catalog.vocabulary())} terms)")
+    print(f"found without correction: {exact_found / args.queries:.1%}")
+    print(f"found with correction:    {corrected_found / args.queries:.1%}")
+    print(
+        f"correct():   p50={statistics.median(correct_latencies):.3f}ms "
+        f"p99={_percentile(correct_latencies, 0.99):.3f}ms"
+    )
+    print(
+        f"find_gift(): p50={statistics.median(find_latencies):.3f}ms "
+        f"p99={_percentile(find_latencies, 0.99):.3f}ms"
+    )
+
+    unrelated = 0
+    for gift, related in UNSOLD_GIFTS.items():
+        product = catalog.find_gift(gift)
+        ok = product is None or any(
+            word in product.get("title", "").lower() or word == product.get("category") for word in related
+        )
+        unrelated += not ok
+        print(f"unsold '{gift}': {product.get('title') if product else 'not found'}{'' if ok else '  UNRELATED'}")
+    for gift, expected in CATEGORY_CASES.items():
+        key = match_category(gift)
+        unrelated += key != expected
+        print(f"category '{gift}': {key}{'' if key == expected else f'  EXPECTED {expected}'}")
+    if unrelated:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+agent.gameChoice handler latency: before and after the server-side game engine.
+
+Simulates a user clicking Rock, Paper, Scissors every --click-ms and measures
+how long each agent.gameChoice RPC takes to be answered, for:
+
+- legacy: the original handler, which spoke the choice commentary, slept one
+  second and awaited the client.showRockPaperScissors RPC before answering
+- engine: rps_game.handle_choice, which decides the round, answers with it and
+  leaves commentary to the session's RoundAnnouncer
+
+Also reports how many rounds' commentary the announcer skipped as stale.
+
+Usage:
+    python benchmarks/bench_game.py [--clicks 50] [--click-ms 300] [--rpc-latency-ms 20]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import statistics
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_tools import FakeRoom, _percentile  # noqa: E402
+from rps_game import CHOICES, RoundAnnouncer, RpsGame, handle_choice, round_result  # noqa: E402
+
+
+async def legacy_handle_choice(room: FakeRoom, spoken: List[str], payload: str) -> str:
+    """The handler before the game engine: the client picked Santa's move and waited for the commentary."""
+    data = json.loads(payload)
+    spoken.append(data["choice"])
+    await asyncio.sleep(1)
+    spoken.append(data["result"])
+    await room.local_participant.perform_rpc(
+        destination_identity="user",
+        method="client.showRockPaperScissors",
+        payload=json.dumps({"action": "update_message", "message": data["result"]}),
+    )
+    return "success"
+
+
+async def clicks(handler: Callable[[str], Awaitable[str]], payloads: List[str], interval: float) -> List[float]:
+    """Send each payload `interval` seconds apart without waiting for answers; returns latencies in ms."""
+    latencies: List[float] = []
+
+    async def one(payload: str) -> None:
+        started = time.perf_counter()
+        await handler(payload)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    tasks = []
+    for payload in payloads:
+        tasks.append(asyncio.create_task(one(payload)))
+        await asyncio.sleep(interval)
+    await asyncio.gather(*tasks)
+    return latencies
+
+
+def _report(name: str, latencies: List[float]) -> None:
+    print(
+        f"{name:<8} p50={statistics.median(latencies):9.3f}ms p95={_percentile(latencies, 0.95):9.3f}ms "
+        f"p99={_percentile(latencies, 0.99):9.3f}ms"
+    )
+
+
+async def run(args: argparse.Namespace) -> None:
+    rng = random.Random(0)
+    interval = args.click_ms / 1000
+    rpc_stats: Dict[str, List[int]] = defaultdict(list)
+    room = FakeRoom(args.rpc_latency_ms / 1000, rpc_stats)
+
+    legacy_payloads = []
+    for _ in range(args.clicks):
+        choice, santa_choice = rng.choice(CHOICES), rng.choice(CHOICES)
+        legacy_payloads.append(
+            json.dumps({"choice": choice, "santaChoice": santa_choice, "result": round_result(choice, santa_choice)})
+        )
+    legacy_spoken: List[str] = []
+    legacy = await clicks(lambda payload: legacy_handle_choice(room, legacy_spoken, payload), legacy_payloads, interval)
+
+    game = RpsGame()
+    announced: List[int] = []
+    announcer = RoundAnnouncer(lambda identity, played: None, lambda identity, played: announced.append(played.number))
+
+    async def engine_handler(payload: str) -> str:
+        return handle_choice(game, announcer, "user", payload)
+
+    engine_payloads = [json.dumps({"choice": rng.choice(CHOICES)}) for _ in range(args.clicks)]
+    engine = await clicks(engine_handler, engine_payloads, interval)
+    # Let the last round's commentary finish
+    await asyncio.sleep(announcer.reveal_delay + 0.1)
+    await announcer.close()
+
+    print(f"{args.clicks} clicks every {args.click_ms:.0f}ms, rpc latency {args.rpc_latency_ms:.0f}ms")
+    _report("legacy", legacy)
+    _report("engine", engine)
+    print(f"engine score: {game.score()}; results announced for {len(announced)} round(s), {announcer.dropped} skipped as stale")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clicks", type=int, default=50)
+    parser.add_argument("--click-ms", type=float, default=300.0, help="time between the user's clicks")
+    parser.add_argument("--rpc-latency-ms", type=float, default=20.0, help="fake perform_rpc latency")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Streamed letter rewrites: time until the frontend sees the letter change.
+
+Runs AvatarAgent's LLM letter rewrite against a fake LLM that streams a
+message word by word at a fixed token rate, and a recording fake room. Reports
+when the first client.showLetter update is sent (what the user waits for with
+streaming) against when the rewrite completes (what they'd wait for if the
+letter were only sent once the completion finished), plus showLetter RPCs and
+bytes per rewrite.
+
+Building the agent needs the same API key variables as the worker (.env);
+dummy values are filled in when they are missing.
+
+Usage:
+    python benchmarks/bench_letter_stream.py [--rewrites 20] [--words 150]
+        [--token-ms 25] [--rpc-latency-ms 20]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from types import SimpleNamespace
+from typing import AsyncIterator, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_tools import FakeRoom, _percentile  # noqa: E402
+
+MESSAGE_WORDS = (
+    "Every Christmas I think about how lucky I am to have you. You make every day brighter and "
+    "warmer, and I miss you a lot when we are apart. I can't wait to see you again!"
+).split()
+
+
+class FakeStream:
+    """Streams a message word by word, like LLMStream.to_str_iterable()."""
+
+    def __init__(self, words: int, token_delay: float) -> None:
+        self.words = words
+        self.token_delay = token_delay
+
+    async def __aenter__(self) -> "FakeStream":
+        return self
+
+    async def __aexit__(self, *exc: object) -> None:
+        pass
+
+    async def to_str_iterable(self) -> AsyncIterator[str]:
+        for i in range(self.words):
+            await asyncio.sleep(self.token_delay)
+            # A blank line every 40 words starts a new paragraph
+            separator = "\n\n" if i and i % 40 == 0 else " "
+            yield (separator if i else "") + MESSAGE_WORDS[i % len(MESSAGE_WORDS)]
+
+
+class FakeLLM:
+    def __init__(self, words: int, token_delay: float) -> None:
+        self.words = words
+        self.token_delay = token_delay
+
+    def chat(self, *, chat_ctx: object, **_: object) -> FakeStream:
+        return FakeStream(self.words, self.token_delay)
+
+
+class TimedRoom(FakeRoom):
+    """FakeRoom that also records when the first RPC is sent."""
+
+    def __init__(self, rpc_latency: float, rpc_stats: Dict[str, List[int]]) -> None:
+        super().__init__(rpc_latency, rpc_stats)
+        self.first_rpc_at: Optional[float] = None
+        perform_rpc = self.local_participant.perform_rpc
+
+        async def timed_perform_rpc(**kwargs: object) -> str:
+            if self.first_rpc_at is None:
+                self.first_rpc_at = time.perf_counter()
+            return await perform_rpc(**kwargs)
+
+        self.local_participant.perform_rpc = timed_perform_rpc
+
+
+async def run(args: argparse.Namespace) -> None:
+    from tavus import AvatarAgent, UserData
+    from http_client import WorkerHttpClient
+    from product_cache import ProductCache
+
+    logging.getLogger("avatar").setLevel(logging.WARNING)
+    http_client = WorkerHttpClient()
+    agent = AvatarAgent(http_client=http_client, product_cache=ProductCache())
+    model = FakeLLM(args.words, args.token_ms / 1000)
+
+    first_update: List[float] = []
+    completed: List[float] = []
+    rpc_counts: List[int] = []
+    rpc_bytes: List[int] = []
+    for _ in range(args.rewrites):
+        rpc_stats: Dict[str, List[int]] = defaultdict(list)
+        room = TimedRoom(args.rpc_latency_ms / 1000, rpc_stats)
+        userdata = UserData(ctx=SimpleNamespace(room=room))
+        userdata.set_letter("my mom", "I love you very much")
+        participant = userdata.client()
+
+        started = time.perf_counter()
+        await agent._rewrite_letter(participant, userdata, model, "Make it longer and warmer", fallback_text="")
+        completed.append((time.perf_counter() - started) * 1000)
+        await userdata.outbox.close()
+        first_update.append((room.first_rpc_at - started) * 1000)
+        rpc_counts.append(len(rpc_stats["client.showLetter"]))
+        rpc_bytes.append(sum(rpc_stats["client.showLetter"]))
+
+    await http_client.close()
+    stream_ms = args.words * args.token_ms
+    print(f"{args.rewrites} rewrites of {args.words} words at {args.token_ms}ms/token ({stream_ms:.0f}ms stream)")
+    print(
+        f"first update:    p50={statistics.median(first_update):8.1f}ms p95={_percentile(first_update, 0.95):8.1f}ms"
+    )
+    print(f"rewrite done:    p50={statistics.median(completed):8.1f}ms p95={_percentile(completed, 0.95):8.1f}ms")
+    print(
+        f"showLetter RPCs: {statistics.mean(rpc_counts):.1f}/rewrite, "
+        f"{statistics.mean(rpc_bytes):,.0f} bytes/rewrite"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rewrites", type=int, default=20)
+    parser.add_argument("--words", type=int, default=150, help="words in the streamed message")
+    parser.add_argument("--token-ms", type=float, default=25.0, help="fake LLM time per streamed word")
+    parser.add_argument("--rpc-latency-ms", type=float, default=20.0, help="fake perform_rpc latency")
+    args = parser.parse_args()
+
+    for name in ("ELEVEN_API_KEY", "OPENAI_API_KEY", "LIVEKIT_API_KEY", "LIVEKIT_API_SECRET"):
+        os.environ.setdefault(name, "benchmark-placeholder-benchmark-placeholder")
+    logging.basicConfig(level=logging.WARNING)
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Cold vs warm job start benchmark.
+
+Times what a job does before Santa can greet and answer, with the worker's
+prewarm() work (Silero VAD, catalog bulk fetch and recommender, phrase audio
+from disk, HTTP client, product cache, session store) done inside every job
+(cold, the pre-prewarm behavior) versus once per process (warm):
+
+- job start: that per-job work, then the entrypoint's own setup up to
+  avatar.start() (UserData, RPC outbox, participant registry, AgentSession,
+  AvatarAgent). Starting the Tavus avatar and the agent session needs LiveKit
+  and Tavus, so it isn't included; it costs the same either way.
+- first gift: the session's first add_gift_to_wishlist call.
+
+The catalog is bulk-fetched from a local DummyJSON stand-in (see
+bench_tools.py) and phrase audio is read from a temporary cache directory, so
+no network access is needed. Building the agent needs the same API key
+variables as the worker (.env); dummy values are filled in when they are
+missing.
+
+Usage:
+    python benchmarks/bench_prewarm.py [--runs 20] [--products 200] [--latency-ms 80]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_tools import FakeDummyJSON, FakeRoom, _percentile, fixture_products  # noqa: E402
+
+
+def _reset_process_state() -> None:
+    """Forget the per-process catalog and recommender, as in a freshly forked worker."""
+    import catalog
+    import recommender
+
+    catalog._catalog = None
+    catalog._catalog_failed_at = None
+    recommender._recommenders.clear()
+
+
+async def start_job(proc: SimpleNamespace) -> Dict[str, float]:
+    """The entrypoint's setup up to avatar.start(), then the first gift lookup."""
+    from livekit.agents import AgentSession
+
+    from rpc_dispatcher import RpcOutbox
+    from participants import ParticipantRegistry
+    from tavus import AvatarAgent, UserData
+
+    started = time.perf_counter()
+    http_client = proc.userdata["http_client"]
+    http_client.open()
+    room = FakeRoom(0.0, defaultdict(list))
+    userdata = UserData(
+        ctx=SimpleNamespace(room=room),
+        outbox=RpcOutbox(room),
+        participants=ParticipantRegistry(room, avatar_identity="tavus-avatar-agent"),
+    )
+    AgentSession[UserData](userdata=userdata, turn_detection=None)
+    agent = AvatarAgent(
+        http_client=http_client,
+        product_cache=proc.userdata["product_cache"],
+        vad=proc.userdata.get("vad"),
+    )
+    job_start = time.perf_counter() - started
+
+    started = time.perf_counter()
+    await agent.add_gift_to_wishlist(SimpleNamespace(userdata=userdata), "AirPods")
+    first_gift = time.perf_counter() - started
+
+    agent.prefetcher.close()
+    await userdata.outbox.close()
+    return {"job start": job_start, "first gift": first_gift}
+
+
+async def run(args: argparse.Namespace, port: int) -> None:
+    # Imported after the environment points the agent at the fake server
+    from phrase_cache import CachedPhrase, PhraseCache
+    from tavus import SANTA_PHRASES, SANTA_VOICE_ID, prewarm
+
+    logging.getLogger("avatar").setLevel(logging.WARNING)
+    # AgentSession(turn_detection=...) is built exactly as in the entrypoint; skip its deprecation warning
+    logging.getLogger("livekit.agents").setLevel(logging.ERROR)
+
+    # Phrase audio already on disk, as after the first worker synthesized it
+    silence = CachedPhrase(pcm=bytes(2 * 24000), sample_rate=24000, num_channels=1)
+    phrases = PhraseCache(SANTA_VOICE_ID)
+    for text in dict.fromkeys(SANTA_PHRASES):
+        phrases._save(text, silence)
+
+    server = FakeDummyJSON(fixture_products(args.products), args.latency_ms / 1000, error_rate=0.0)
+    await server.start(port)
+    samples: Dict[str, Dict[str, List[float]]] = {"cold": defaultdict(list), "warm": defaultdict(list)}
+    try:
+        for _ in range(args.runs):
+            # Without prewarm, every job loads everything itself
+            _reset_process_state()
+            proc = SimpleNamespace(userdata={})
+            started = time.perf_counter()
+            await asyncio.to_thread(prewarm, proc)
+            in_job = time.perf_counter() - started
+            timings = await start_job(proc)
+            samples["cold"]["job start"].append(in_job + timings["job start"])
+            samples["cold"]["first gift"].append(timings["first gift"])
+            # A cold job's session goes away with its process
+            await proc.userdata["http_client"].close()
+
+        _reset_process_state()
+        proc = SimpleNamespace(userdata={})
+        started = time.perf_counter()
+        await asyncio.to_thread(prewarm, proc)
+        prewarm_seconds = time.perf_counter() - started
+        for _ in range(args.runs):
+            for name, seconds in (await start_job(proc)).items():
+                samples["warm"][name].append(seconds)
+        await proc.userdata["http_client"].close()
+    finally:
+        await server.stop()
+
+    print(f"prewarm (once per process): {prewarm_seconds * 1000:.2f}ms "
+          f"({args.products} products, latency={args.latency_ms}ms)")
+    print(f"{'':<6}{'step':<12}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for kind, steps in samples.items():
+        for name, seconds in steps.items():
+            samples_ms = [s * 1000 for s in seconds]
+            print(
+                f"{kind:<6}{name:<12}{statistics.mean(samples_ms):>10.2f}"
+                f"{statistics.median(samples_ms):>10.2f}{_percentile(samples_ms, 0.95):>10.2f}"
+            )
+    saved = sum(statistics.mean(samples["cold"][name]) - statistics.mean(samples["warm"][name]) for name in samples["cold"])
+    print(f"saved per job: {saved * 1000:.2f}ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--products", type=int, default=200, help="products in the fake catalog")
+    parser.add_argument("--latency-ms", type=float, default=80.0, help="fake DummyJSON latency")
+    args = parser.parse_args()
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    os.environ["PRODUCT_API_BASE_URL"] = f"http://127.0.0.1:{port}"
+    # Point the snapshot at a missing file so the catalog is bulk-fetched from the fake server
+    scratch = Path(tempfile.mkdtemp())
+    os.environ["CATALOG_SNAPSHOT_PATH"] = str(scratch / "catalog.json")
+    os.environ["PHRASE_CACHE_DIR"] = str(scratch / "phrases")
+    os.environ["SESSION_STORE"] = "memory"
+    os.environ["TRACE_EXPORTERS"] = ""
+    for name in ("ELEVEN_API_KEY", "OPENAI_API_KEY", "LIVEKIT_API_KEY", "LIVEKIT_API_SECRET"):
+        os.environ.setdefault(name, "benchmark-placeholder-benchmark-placeholder")
+    logging.basicConfig(level=logging.WARNING)
+
+    asyncio.run(run(args, port))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Recommender build time and per-request latency.
+
+Embeds a synthetic catalog (or a DummyJSON dump) with ProductRecommender and
+times recommend() for several wishlist sizes.
+
+Usage:
+    python benchmarks/bench_recommender.py [--products 10000] [--requests 1000]
+    python benchmarks/bench_recommender.py --dump products.json
+"""
+import argparse
+import json
+import logging
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from recommender import ProductRecommender  # noqa: E402
+
+
+def synthetic_products(count: int, vocabulary: int = 5000, categories: int = 24, seed: int = 0) -> List[dict]:
+    rng = random.Random(seed)
+    words = [f"word{i}" for i in range(vocabulary)]
+    # Zipf-like word frequencies, like real product text
+    weights = [1 / (rank + 1) for rank in range(vocabulary)]
+    return [
+        {
+            "title": " ".join(rng.choices(words, weights, k=4)),
+            "description": " ".join(rng.choices(words, weights, k=25)),
+            "tags": rng.choices(words, weights, k=3),
+            "category": f"category-{rng.randrange(categories)}",
+            "price": round(rng.lognormvariate(4, 1.2), 2),
+        }
+        for _ in range(count)
+    ]
+
+
+def _percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=1000, help="recommend() calls per wishlist size")
+    parser.add_argument("--dump", help="DummyJSON products dump to embed instead of a synthetic catalog")
+    args = parser.parse_args()
+    logging.getLogger("avatar").setLevel(logging.WARNING)
+
+    if args.dump:
+        with open(args.dump, "r", encoding="utf-8") as f:
+            products = json.load(f)["products"]
+    else:
+        products = synthetic_products(args.products)
+
+    started = time.perf_counter()
+    recommender = ProductRecommender(products)
+    build_ms = (time.perf_counter() - started) * 1000
+    print(
+        f"build: {len(products)} products x {recommender.dimensions} features in {build_ms:.1f}ms "
+        f"({recommender._features.nbytes / 1e6:.1f} MB)"
+    )
+
+    rng = random.Random(1)
+    for wishlist_size in (1, 3, 10, 30):
+        latencies = []
+        for _ in range(args.requests):
+            wishlist = rng.sample(products, k=min(wishlist_size, len(products)))
+            started = time.perf_counter()
+            recommender.recommend(wishlist, limit=6)
+            latencies.append((time.perf_counter() - started) * 1000)
+        print(
+            f"wishlist of {wishlist_size:>2}: p50={statistics.median(latencies):.3f}ms "
+            f"p99={_percentile(latencies, 0.99):.3f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Session state memory benchmark.
+
+Builds UserData sessions with 10, 100 and 1000 wishlist items plus a letter
+and reports the bytes allocated per session (measured with tracemalloc), so
+changes to Product, Letter and UserData can be compared.
+
+Building the agent module needs the same API key variables as the worker
+(.env), but makes no network calls.
+
+Usage:
+    python benchmarks/bench_session_memory.py [--sessions 50]
+"""
+import argparse
+import gc
+import logging
+import sys
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from tavus import UserData  # noqa: E402
+
+CATEGORIES = ["smartphones", "laptops", "mobile-accessories", "fragrances", "furniture"]
+
+
+def _product_data(i: int) -> dict:
+    # Built outside the measured region, like responses from the catalog
+    return {
+        "title": f"Product {i}",
+        "description": "A wonderful gift that anyone would be delighted to find under the tree this year",
+        "price": 9.99 + i,
+        "thumbnail": f"https://cdn.dummyjson.com/products/images/{i}/thumbnail.png",
+        "category": CATEGORIES[i % len(CATEGORIES)],
+    }
+
+
+def bytes_per_session(items: int, sessions: int) -> float:
+    product_data = [_product_data(i) for i in range(items)]
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+
+    kept = []
+    for _ in range(sessions):
+        userdata = UserData()
+        for data in product_data:
+            userdata.add_product(data)
+        userdata.set_letter("Mom", "I love you very much")
+        kept.append(userdata)
+
+    gc.collect()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (after - before) / sessions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=50)
+    args = parser.parse_args()
+    logging.getLogger("avatar").setLevel(logging.WARNING)
+
+    for items in (10, 100, 1000):
+        per_session = bytes_per_session(items, args.sessions)
+        print(f"{items:>5} items: {per_session:>12,.0f} bytes/session  ({per_session / items:,.0f} bytes/item)")
+
+
+if __name__ == "__main__":
+    main()
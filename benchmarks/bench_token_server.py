@@ -0,0 +1,120 @@
+"""
+Token service load benchmark.
+
+Starts token_server in-process on a local port (or targets --url) and drives it
+with concurrent HTTP clients, reporting tokens per second and p50/p99 request
+latency. Also reports raw signing throughput of TokenIssuer against
+livekit.api.AccessToken for reference.
+
+Usage:
+    python benchmarks/bench_token_server.py [--clients 50] [--requests 200] [--bulk 1]
+    python benchmarks/bench_token_server.py --url http://127.0.0.1:8081
+"""
+import argparse
+import asyncio
+import datetime
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import aiohttp
+from aiohttp import web
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from token_server import TokenIssuer, create_app  # noqa: E402
+
+API_KEY = "bench_key"
+API_SECRET = "bench_secret_bench_secret_bench_secret"
+
+
+def _percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def bench_signing(count: int) -> None:
+    from livekit import api
+
+    issuer = TokenIssuer(API_KEY, API_SECRET)
+    started = time.perf_counter()
+    issuer.issue_bulk([(f"user_{i}", "room") for i in range(count)])
+    issuer_rate = count / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for i in range(count):
+        (
+            api.AccessToken(API_KEY, API_SECRET)
+            .with_identity(f"user_{i}")
+            .with_name(f"user_{i}")
+            .with_ttl(datetime.timedelta(minutes=15))
+            .with_grants(api.VideoGrants(room_join=True, room="room", can_publish=True, can_publish_data=True, can_subscribe=True))
+            .to_jwt()
+        )
+    baseline_rate = count / (time.perf_counter() - started)
+    print(f"signing: TokenIssuer {issuer_rate:,.0f} tokens/s, livekit.api.AccessToken {baseline_rate:,.0f} tokens/s")
+
+
+async def _client(session: aiohttp.ClientSession, url: str, requests: int, bulk: int, latencies: List[float]) -> int:
+    issued = 0
+    for _ in range(requests):
+        started = time.perf_counter()
+        if bulk > 1:
+            async with session.post(f"{url}/api/tokens", json={"count": bulk}) as response:
+                data = await response.json()
+                issued += len(data["tokens"])
+        else:
+            async with session.get(f"{url}/api/connection-details") as response:
+                await response.json()
+                issued += 1
+        latencies.append(time.perf_counter() - started)
+    return issued
+
+
+async def bench_http(url: Optional[str], clients: int, requests: int, bulk: int) -> None:
+    runner = None
+    if url is None:
+        runner = web.AppRunner(create_app(TokenIssuer(API_KEY, API_SECRET), "ws://localhost:7880"), access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        url = f"http://127.0.0.1:{port}"
+
+    latencies: List[float] = []
+    try:
+        connector = aiohttp.TCPConnector(limit=clients)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            started = time.perf_counter()
+            issued = await asyncio.gather(*(_client(session, url, requests, bulk, latencies) for _ in range(clients)))
+            elapsed = time.perf_counter() - started
+    finally:
+        if runner is not None:
+            await runner.cleanup()
+
+    total = sum(issued)
+    latencies_ms = [latency * 1000 for latency in latencies]
+    print(
+        f"http: {clients} clients x {requests} requests (bulk={bulk}): "
+        f"{total / elapsed:,.0f} tokens/s, {len(latencies) / elapsed:,.0f} req/s, "
+        f"p50={statistics.median(latencies_ms):.2f}ms p99={_percentile(latencies_ms, 0.99):.2f}ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="existing token_server to target instead of an in-process one")
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=200, help="requests per client")
+    parser.add_argument("--bulk", type=int, default=1, help="tokens per request (uses POST /api/tokens when > 1)")
+    parser.add_argument("--sign", type=int, default=20000, help="tokens for the raw signing comparison")
+    args = parser.parse_args()
+
+    bench_signing(args.sign)
+    asyncio.run(bench_http(args.url, args.clients, args.requests, args.bulk))
+
+
+if __name__ == "__main__":
+    main()
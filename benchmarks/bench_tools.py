@@ -0,0 +1,356 @@
+"""
+Offline benchmark for the AvatarAgent tool functions.
+
+Drives add_gift_to_wishlist, create_letter, edit_letter and
+recommend_similar_products against a fake RunContext[UserData], a recording
+fake room (perform_rpc) and a local aiohttp server that replays DummyJSON
+responses with configurable latency, tail latency and error rate. No LiveKit server or
+dummyjson.com access is needed.
+
+Reports per-tool p50/p95/p99 latency, upstream request counts per route, the
+product API policy's breaker and hedging counters, and RPC counts and payload
+bytes per method.
+
+Building the agent needs the same API key variables as the worker (.env);
+dummy values are filled in when they are missing.
+
+Usage:
+    python benchmarks/bench_tools.py [--sessions 50] [--concurrency 10]
+        [--latency-ms 80] [--error-rate 0.05] [--slow-rate 0.05 --slow-ms 2000]
+        [--catalog local|remote]
+        [--dump products.json] [--trace jsonl] [--batch]
+        [--prefetch --think-ms 300]
+"""
+import argparse
+import asyncio
+import dataclasses
+import json
+import logging
+import os
+import random
+import socket
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+from aiohttp import web
+from livekit import rtc
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+GIFTS = ["iPhone", "AirPods", "gaming laptop", "perfume", "sofa", "sunglasses"]
+
+# Synthetic catalog used when no DummyJSON dump is given
+_FIXTURE = [
+    ("iPhone 9", "An apple mobile which is nothing like apple", "smartphones", ["smartphones", "apple"]),
+    ("iPhone X", "SIM-Free, Model A19211 6.5-inch Super Retina HD display with OLED technology", "smartphones", ["smartphones", "apple"]),
+    ("Apple AirPods", "Wireless earbuds with charging case and great sound for everyday listening", "mobile-accessories", ["audio", "apple"]),
+    ("Apple MacBook Pro 14 Inch Space Grey", "A powerful laptop with a stunning display and all-day battery life", "laptops", ["laptops", "apple"]),
+    ("Asus Zenbook Pro Dual Screen Laptop", "A high-performance laptop with a secondary touchscreen for creators", "laptops", ["laptops"]),
+    ("Calvin Klein CK One", "A classic unisex fragrance with fresh citrus notes", "fragrances", ["fragrances", "perfumes"]),
+    ("Annibale Colombo Sofa", "A luxurious sofa crafted with premium materials for the living room", "furniture", ["furniture", "sofas"]),
+    ("Black Sun Glasses", "Classic black sunglasses offering UV protection for sunny days", "sunglasses", ["sunglasses"]),
+    ("Rolex Submariner Watch", "A luxury dive watch with a ceramic bezel", "mens-watches", ["watches"]),
+    ("Charger SXT RWD", "A powerful and stylish car with rear-wheel drive", "vehicle", ["vehicles", "cars"]),
+]
+
+
+def fixture_products(count: int = 200) -> List[dict]:
+    products = []
+    for i in range(count):
+        title, description, category, tags = _FIXTURE[i % len(_FIXTURE)]
+        products.append({
+            "id": i + 1,
+            "title": title if i < len(_FIXTURE) else f"{title} {i}",
+            "description": description,
+            "category": category,
+            "tags": tags,
+            "price": round(10 + (i * 37) % 1990, 2),
+            "thumbnail": f"https://cdn.dummyjson.com/products/images/{i + 1}/thumbnail.png",
+            "images": [f"https://cdn.dummyjson.com/products/images/{i + 1}/1.png"],
+        })
+    return products
+
+
+class FakeDummyJSON:
+    """Local DummyJSON stand-in with injected latency and errors."""
+
+    def __init__(
+        self,
+        products: List[dict],
+        latency: float,
+        error_rate: float,
+        slow_rate: float = 0.0,
+        slow_latency: float = 0.0,
+        seed: int = 0,
+    ) -> None:
+        self.products = products
+        self.latency = latency
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.requests: Counter = Counter()
+        self._random = random.Random(seed)
+        self._runner: Optional[web.AppRunner] = None
+
+    def _listing(self, request: web.Request, products: List[dict]) -> web.Response:
+        limit = int(request.query.get("limit", 30))
+        skip = int(request.query.get("skip", 0))
+        page = products[skip:] if limit == 0 else products[skip:skip + limit]
+        return web.json_response({"products": page, "total": len(products), "skip": skip, "limit": len(page)})
+
+    async def _delay_or_fail(self, route: str) -> Optional[web.Response]:
+        self.requests[route] += 1
+        # Jitter of +/-50% around the configured latency, plus the occasional straggler
+        latency = self.latency * self._random.uniform(0.5, 1.5)
+        if self._random.random() < self.slow_rate:
+            self.requests[f"{route} (slow)"] += 1
+            latency = self.slow_latency
+        await asyncio.sleep(latency)
+        if self._random.random() < self.error_rate:
+            self.requests[f"{route} (error)"] += 1
+            return web.Response(status=503, text="injected error")
+        return None
+
+    async def _search(self, request: web.Request) -> web.Response:
+        failure = await self._delay_or_fail("/products/search")
+        if failure:
+            return failure
+        q = request.query.get("q", "").lower()
+        matches = [p for p in self.products if q in p["title"].lower() or q in p["description"].lower()]
+        return self._listing(request, matches)
+
+    async def _category(self, request: web.Request) -> web.Response:
+        failure = await self._delay_or_fail("/products/category")
+        if failure:
+            return failure
+        category = request.match_info["category"]
+        return self._listing(request, [p for p in self.products if p["category"] == category])
+
+    async def _all(self, request: web.Request) -> web.Response:
+        failure = await self._delay_or_fail("/products")
+        if failure:
+            return failure
+        return self._listing(request, self.products)
+
+    async def start(self, port: int) -> None:
+        app = web.Application()
+        app.router.add_get("/products/search", self._search)
+        app.router.add_get("/products/category/{category}", self._category)
+        app.router.add_get("/products", self._all)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, "127.0.0.1", port).start()
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+class RecordingLocalParticipant:
+    """Records perform_rpc calls and their payload sizes."""
+
+    def __init__(self, latency: float, stats: Dict[str, List[int]]) -> None:
+        self.identity = "santa-agent"
+        self.latency = latency
+        self.stats = stats
+
+    async def perform_rpc(self, *, destination_identity: str, method: str, payload: str, **_: object) -> str:
+        self.stats[method].append(len(payload.encode()))
+        await asyncio.sleep(self.latency)
+        return "Success"
+
+
+class FakeRoom:
+    def __init__(self, rpc_latency: float, rpc_stats: Dict[str, List[int]]) -> None:
+        self.local_participant = RecordingLocalParticipant(rpc_latency, rpc_stats)
+        self.remote_participants = {
+            "user": SimpleNamespace(identity="user", kind=rtc.ParticipantKind.PARTICIPANT_KIND_STANDARD)
+        }
+
+    def on(self, event: str, callback=None):
+        return callback
+
+
+def _percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+async def run_session(
+    agent,
+    userdata_cls,
+    room: FakeRoom,
+    timings: Dict[str, List[float]],
+    errors: Counter,
+    gifts: List[str],
+    batch: bool = False,
+    prefetch: bool = False,
+    think: float = 0.0,
+    dispatch_stats: Optional[Counter] = None,
+) -> None:
+    from livekit.agents import ToolError
+
+    userdata = userdata_cls(ctx=SimpleNamespace(room=room))
+    context = SimpleNamespace(userdata=userdata)
+    if batch:
+        calls = [("add_gifts_to_wishlist", (gifts,))]
+    else:
+        calls = [("add_gift_to_wishlist", (gift,)) for gift in gifts]
+    calls += [
+        ("create_letter", ("my mom", "I love you very much")),
+        ("edit_letter", ("Add that I miss her a lot",)),
+        ("edit_letter", ("Change the ending to say I can't wait to see her",)),
+        ("recommend_similar_products", ()),
+    ]
+    for tool_name, args in calls:
+        if tool_name.startswith("add_gift"):
+            if prefetch:
+                # Interim transcript of the request, seen before the LLM picks the tool
+                agent.prefetcher.observe(f"I'd really like {' and '.join(gifts)} for Christmas")
+            # LLM time between the transcript and the tool call (not timed)
+            await asyncio.sleep(think)
+        started = time.perf_counter()
+        try:
+            await getattr(agent, tool_name)(context, *args)
+        except ToolError:
+            errors[tool_name] += 1
+        timings[tool_name].append(time.perf_counter() - started)
+
+    # Tools return before their RPCs are sent; wait for the queued updates
+    if userdata.outbox is not None:
+        await userdata.outbox.close()
+        if dispatch_stats is not None:
+            dispatch_stats.update(dataclasses.asdict(userdata.outbox.stats))
+
+
+async def run(args: argparse.Namespace, port: int) -> None:
+    # Imported after the environment points the agent at the fake server
+    from http_client import WorkerHttpClient
+    from product_cache import ProductCache
+    import tracing
+    import upstream
+    from catalog import get_catalog
+    from product_search import products_url
+    from tavus import AvatarAgent, UserData
+
+    # Same as the worker's prewarm; a no-op unless --trace is given
+    tracing.configure()
+    logging.getLogger("avatar").setLevel(logging.WARNING)
+
+    products = fixture_products()
+    if args.dump:
+        with open(args.dump, "r", encoding="utf-8") as f:
+            products = json.load(f)["products"]
+
+    server = FakeDummyJSON(
+        products, args.latency_ms / 1000, args.error_rate, slow_rate=args.slow_rate, slow_latency=args.slow_ms / 1000
+    )
+    await server.start(port)
+    http_client = WorkerHttpClient()
+    # Like the worker's prewarm, load the catalog (bulk fetch) before any session starts
+    await get_catalog(http_client.session, bulk_url=products_url(0))
+    product_cache = ProductCache() if not args.no_cache else ProductCache(max_entries=0, ttl=0, negative_ttl=0)
+    timings: Dict[str, List[float]] = defaultdict(list)
+    errors: Counter = Counter()
+    rpc_stats: Dict[str, List[int]] = defaultdict(list)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    rng = random.Random(1)
+    prefetch_stats: Counter = Counter()
+    dispatch_stats: Counter = Counter()
+
+    async def one_session() -> None:
+        async with semaphore:
+            agent = AvatarAgent(http_client=http_client, product_cache=product_cache)
+            gifts = rng.sample(GIFTS, k=min(args.gifts, len(GIFTS)))
+            room = FakeRoom(args.rpc_latency_ms / 1000, rpc_stats)
+            await run_session(
+                agent, UserData, room, timings, errors, gifts,
+                batch=args.batch, prefetch=args.prefetch, think=args.think_ms / 1000,
+                dispatch_stats=dispatch_stats,
+            )
+            agent.prefetcher.close()
+            prefetch_stats.update(agent.prefetcher.stats.as_dict())
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(one_session() for _ in range(args.sessions)))
+    finally:
+        elapsed = time.perf_counter() - started
+        await http_client.close()
+        await server.stop()
+        tracing.tracer.close()
+
+    print(
+        f"{args.sessions} sessions in {elapsed:.2f}s (catalog={args.catalog}, latency={args.latency_ms}ms, "
+        f"error_rate={args.error_rate}, slow_rate={args.slow_rate})"
+    )
+    print(f"{'tool':<28}{'calls':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for tool_name, samples in timings.items():
+        samples_ms = [s * 1000 for s in samples]
+        print(
+            f"{tool_name:<28}{len(samples):>7}{errors[tool_name]:>8}"
+            f"{statistics.median(samples_ms):>10.2f}{_percentile(samples_ms, 0.95):>10.2f}{_percentile(samples_ms, 0.99):>10.2f}"
+        )
+    print("upstream requests:", dict(server.requests) or "none")
+    print("product cache:", product_cache.stats())
+    print("upstream policy:", upstream.product_api.stats())
+    if args.prefetch:
+        lookups = prefetch_stats["hits"] + prefetch_stats["misses"]
+        print(
+            f"prefetch: {prefetch_stats['prefetched']} prefetched, hit rate "
+            f"{prefetch_stats['hits'] / lookups if lookups else 0.0:.0%} ({prefetch_stats['hits']}/{lookups}), "
+            f"{prefetch_stats['saved_seconds'] * 1000 / max(prefetch_stats['hits'], 1):.1f}ms saved per hit, "
+            f"{prefetch_stats['wasted']} unused"
+        )
+    print(
+        f"rpc dispatch: {dispatch_stats['queued']} queued, {dispatch_stats['sent']} sent, "
+        f"{dispatch_stats['coalesced']} coalesced, {dispatch_stats['retries']} retries, {dispatch_stats['failed']} failed"
+    )
+    for method, sizes in rpc_stats.items():
+        print(f"rpc {method:<28} calls={len(sizes):>5} bytes={sum(sizes):>9,} avg={sum(sizes) / len(sizes):>8,.0f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--gifts", type=int, default=3, help="gifts added per session")
+    parser.add_argument("--latency-ms", type=float, default=80.0, help="fake DummyJSON latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of upstream requests answered with 503")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="fraction of upstream requests answered after --slow-ms")
+    parser.add_argument("--slow-ms", type=float, default=2000.0, help="latency of slow upstream requests")
+    parser.add_argument("--rpc-latency-ms", type=float, default=20.0, help="fake perform_rpc latency")
+    parser.add_argument("--catalog", choices=["local", "remote"], default="local", help="use the in-process catalog or only the remote API")
+    parser.add_argument("--no-cache", action="store_true", help="disable the product cache")
+    parser.add_argument("--dump", help="DummyJSON products dump to serve instead of the synthetic fixture")
+    parser.add_argument("--batch", action="store_true", help="add each session's gifts with one add_gifts_to_wishlist call")
+    parser.add_argument("--prefetch", action="store_true", help="feed interim transcripts to the gift prefetcher before each wishlist call")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="simulated LLM time between transcript and tool call")
+    parser.add_argument("--trace", default="", help="trace exporters to enable, e.g. jsonl (writes TRACE_JSONL_PATH)")
+    args = parser.parse_args()
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    os.environ["PRODUCT_API_BASE_URL"] = f"http://127.0.0.1:{port}"
+    os.environ["LOCAL_CATALOG"] = "1" if args.catalog == "local" else "0"
+    os.environ["TRACE_EXPORTERS"] = args.trace
+    # No LLM offline: edit_letter takes the keyword path (see bench_letter_stream.py for rewrites)
+    os.environ["LETTER_REWRITE"] = "0"
+    # Point the snapshot at a missing file so the catalog is bulk-fetched from the fake server
+    os.environ["CATALOG_SNAPSHOT_PATH"] = str(Path(tempfile.mkdtemp()) / "catalog.json")
+    for name in ("ELEVEN_API_KEY", "OPENAI_API_KEY", "LIVEKIT_API_KEY", "LIVEKIT_API_SECRET"):
+        os.environ.setdefault(name, "benchmark-placeholder-benchmark-placeholder")
+    logging.basicConfig(level=logging.WARNING)
+
+    asyncio.run(run(args, port))
+
+
+if __name__ == "__main__":
+    main()
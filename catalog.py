@@ -0,0 +1,439 @@
+"""
+In-process product catalog with an inverted index for gift lookups.
+
+The catalog is loaded once per worker process at prewarm, either from a bundled
+DummyJSON snapshot (a JSON file with a top-level "products" list) or from a
+single bulk fetch of the DummyJSON catalog. Lookups are answered from memory
+without any network I/O.
+"""
+import asyncio
+import bisect
+import heapq
+import json
+import logging
+import os
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+import aiohttp
+import numpy as np
+
+import upstream
+from catalog_store import LIST_SEPARATOR, SCAN_SEPARATOR, MappedCatalog, is_binary_snapshot, scan_entry
+from fuzzy import TrigramIndex
+
+logger = logging.getLogger("avatar.catalog")
+
+# Bulk endpoint returning the whole DummyJSON catalog in one response
+CATALOG_BULK_URL = "https://dummyjson.com/products?limit=0"
+
+# Set LOCAL_CATALOG=0 to always resolve gifts through the remote API
+LOCAL_CATALOG_ENABLED = os.getenv("LOCAL_CATALOG", "1") != "0"
+
+# Optional bundled snapshot: a binary snapshot built with `catalog_store.py build`
+# (mapped, shared between processes) or a DummyJSON JSON dump. Defaults to
+# catalog.bin next to this file, else catalog.json
+_DEFAULT_SNAPSHOT = Path(__file__).parent / "catalog.bin"
+if not _DEFAULT_SNAPSHOT.exists():
+    _DEFAULT_SNAPSHOT = _DEFAULT_SNAPSHOT.with_suffix(".json")
+CATALOG_SNAPSHOT_PATH = Path(os.getenv("CATALOG_SNAPSHOT_PATH", _DEFAULT_SNAPSHOT))
+
+# Map gift names to DummyJSON categories
+# Based on available categories: beauty, fragrances, furniture, groceries, home-decoration,
+# kitchen-accessories, laptops, mens-shirts, mens-shoes, mens-watches, mobile-accessories,
+# motorcycle, skin-care, smartphones, sports-accessories, sunglasses, tablets, tops,
+# vehicle, womens-bags, womens-dresses, womens-jewellery, womens-shoes, womens-watches
+CATEGORY_MAPPINGS = {
+    "webcam": "mobile-accessories",
+    "camera": "mobile-accessories",
+    "car": "vehicle",
+    "vehicle": "vehicle",
+    "phone": "smartphones",
+    "iphone": "smartphones",
+    "smartphone": "smartphones",
+    "laptop": "laptops",
+    "computer": "laptops",
+    "watch": "mens-watches",
+    "wristwatch": "mens-watches",
+    "headphones": "mobile-accessories",
+    "earbuds": "mobile-accessories",
+    "airpods": "mobile-accessories",
+    "tablet": "tablets",
+    "bicycle": "sports-accessories",
+    "bike": "sports-accessories",
+    "sunglasses": "sunglasses",
+    "glasses": "sunglasses",
+    "bag": "womens-bags",
+    "handbag": "womens-bags",
+    "furniture": "furniture",
+    "chair": "furniture",
+    "sofa": "furniture",
+    "perfume": "fragrances",
+    "cologne": "fragrances",
+}
+
+# Field weights used to rank matches (a title hit beats a description hit)
+FIELD_WEIGHTS = {
+    "title": 4,
+    "tags": 3,
+    "category": 2,
+    "description": 1,
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Category aliases for typo-tolerant matching ("labtop", "head phones")
+_ALIASES = TrigramIndex(CATEGORY_MAPPINGS)
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase alphanumeric tokens."""
+    return _TOKEN_RE.findall(text.lower())
+
+
+def match_category(gift_name: str) -> Optional[str]:
+    """Return the category mapping key for a gift name, if any.
+
+    Whole words win ("headphones" is never "phone"), then split or misspelled
+    aliases matched fuzzily, then the longest key contained in the name
+    ("gamingheadphones").
+    """
+    gift_lower = gift_name.lower()
+    tokens = tokenize(gift_lower)
+    for token in tokens:
+        if token in CATEGORY_MAPPINGS:
+            return token
+    for token in _ALIASES.correct(tokens):
+        if token in _ALIASES:
+            return token
+    contained = [key for key in CATEGORY_MAPPINGS if key in gift_lower]
+    return max(contained, key=len) if contained else None
+
+
+def search_variants(gift_name: str) -> List[str]:
+    """Build the ordered list of search terms tried for a spoken gift name."""
+    search_terms = [
+        gift_name,  # Original term
+        gift_name.lower(),  # Lowercase
+        gift_name.replace(" ", "-"),  # With hyphens
+        gift_name.replace(" ", ""),  # No spaces
+    ]
+    category_key = match_category(gift_name)
+    if category_key:
+        search_terms.append(category_key)
+    return search_terms
+
+
+class CatalogIndex:
+    """Inverted index over product title, description, category and tags."""
+
+    def __init__(self, products: Iterable[dict]) -> None:
+        # Sequences (e.g. a MappedCatalog) are kept as-is so products stay lazy
+        self.products: Sequence[dict] = products if isinstance(products, Sequence) else list(products)
+        # token -> {product position -> accumulated field weight}
+        self._postings: Dict[str, Dict[int, int]] = {}
+        # category -> product positions in catalog order
+        self._by_category: Dict[str, List[int]] = {}
+        # Lowercased title/description/category of every product, for the
+        # last-resort substring scan, and where each product's entry starts.
+        # A MappedCatalog scans its mapped scan column instead
+        self._scan_text = ""
+        self._scan_starts: List[int] = []
+        # Title and tag tokens: what misspelled gift names are corrected onto
+        spelling_terms: Set[str] = set()
+
+        if isinstance(self.products, MappedCatalog):
+            fields = self._index_columns(self.products)
+        else:
+            fields = self._index_products(self.products)
+        for field_name, field_tokens in fields.items():
+            weight = FIELD_WEIGHTS[field_name]
+            for pos, tokens in field_tokens:
+                tokens = set(tokens)
+                if field_name in ("title", "tags"):
+                    spelling_terms.update(tokens)
+                for token in tokens:
+                    postings = self._postings.setdefault(token, {})
+                    postings[pos] = postings.get(pos, 0) + weight
+
+        self._vocabulary = tuple(self._postings)
+        self._terms = TrigramIndex(self._vocabulary)
+        self._spelling = TrigramIndex(spelling_terms)
+        # Substring expansions are per-index, so bind the cache to this instance
+        self._expand = lru_cache(maxsize=4096)(self._expand_uncached)
+
+    def _index_products(self, products: Sequence[dict]) -> Dict[str, Iterable[Tuple[int, List[str]]]]:
+        """Categories and scan text of product dicts; returns each field's (position, tokens) pairs."""
+        scan_parts: List[str] = []
+        scan_length = 0
+        for pos, product in enumerate(products):
+            category = product.get("category", "")
+            self._by_category.setdefault(category, []).append(pos)
+            entry = scan_entry(product.get("title", ""), product.get("description", ""), category)
+            self._scan_starts.append(scan_length)
+            scan_parts.append(entry)
+            scan_length += len(entry)
+        self._scan_text = "".join(scan_parts)
+
+        def field(text_of: Callable[[dict], str]) -> Iterator[Tuple[int, List[str]]]:
+            return ((pos, tokenize(text_of(product))) for pos, product in enumerate(products))
+
+        return {
+            "title": field(lambda product: product.get("title", "")),
+            "description": field(lambda product: product.get("description", "")),
+            "category": field(lambda product: product.get("category", "")),
+            "tags": field(lambda product: " ".join(product.get("tags", []) or [])),
+        }
+
+    def _index_columns(self, catalog: MappedCatalog) -> Dict[str, Iterable[Tuple[int, List[str]]]]:
+        """Categories of a mapped catalog; returns each field's (position, tokens) pairs.
+
+        Everything is read from the mapped columns, so no product dicts are
+        built and no product text is copied onto the heap.
+        """
+        codes = catalog.category_codes
+        for code, category in enumerate(catalog.categories):
+            positions = np.flatnonzero(codes == code).tolist()
+            if positions:
+                self._by_category[category] = positions
+        category_tokens = [tokenize(category) for category in catalog.categories]
+        return {
+            "title": catalog.tokens("title"),
+            "description": catalog.tokens("description"),
+            "category": ((pos, category_tokens[code]) for pos, code in enumerate(codes.tolist())),
+            "tags": catalog.tokens("tags"),
+        }
+
+    def __len__(self) -> int:
+        return len(self.products)
+
+    def _expand_uncached(self, token: str) -> frozenset:
+        """Indexed tokens containing the query token (DummyJSON matches substrings)."""
+        if token in self._postings and len(token) < 3:
+            return frozenset((token,))
+        return frozenset(self._terms.containing(token))
+
+    def _score_token(self, token: str) -> Dict[int, int]:
+        """Best field weight per product for any indexed token containing `token`."""
+        scores: Dict[int, int] = {}
+        for indexed in self._expand(token):
+            for pos, weight in self._postings[indexed].items():
+                # Exact token hits rank above substring hits
+                weighted = weight * 2 if indexed == token else weight
+                if weighted > scores.get(pos, 0):
+                    scores[pos] = weighted
+        return scores
+
+    def scan(self, terms: Sequence[str]) -> Optional[int]:
+        """Position of the first product whose title, description or category contains any term.
+
+        Searches the precomputed scan text (for a MappedCatalog, its mapped scan
+        column in place), so no product dicts are built.
+        """
+        first: Optional[int] = None
+        for term in dict.fromkeys(terms):
+            if not term or SCAN_SEPARATOR in term or LIST_SEPARATOR in term:
+                continue
+            if isinstance(self.products, MappedCatalog):
+                pos = self.products.find("scan", term)
+            else:
+                offset = self._scan_text.find(term)
+                pos = bisect.bisect_right(self._scan_starts, offset) - 1 if offset >= 0 else None
+            if pos is not None and (first is None or pos < first):
+                first = pos
+        return first
+
+    def search(self, query: str, limit: int = 5) -> List[dict]:
+        """Return products matching every query token, best matches first."""
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        totals: Optional[Dict[int, int]] = None
+        for token in tokens:
+            scores = self._score_token(token)
+            if not scores:
+                return []
+            if totals is None:
+                totals = scores
+            else:
+                totals = {pos: totals[pos] + score for pos, score in scores.items() if pos in totals}
+                if not totals:
+                    return []
+
+        # Highest score first, ties keep catalog order like the upstream search
+        ranked = heapq.nsmallest(limit, totals, key=lambda pos: (-totals[pos], pos))
+        return [self.products[pos] for pos in ranked]
+
+    def by_category(self, category: str, limit: Optional[int] = None) -> List[dict]:
+        """Products in a category, in catalog order."""
+        positions = self._by_category.get(category, [])
+        if limit is not None:
+            positions = positions[:limit]
+        return [self.products[pos] for pos in positions]
+
+    def correct(self, query: str) -> str:
+        """The query with split or misspelled tokens mapped onto title and tag tokens.
+
+        Description words are left out: correcting onto them turns real words
+        the catalog doesn't sell ("bike") into unrelated ones ("like"). Category
+        aliases are kept as spoken so the category lookup still sees them.
+        """
+        return " ".join(self._spelling.correct(tokenize(query), keep=CATEGORY_MAPPINGS))
+
+    def suggest(self, query: str, limit: int = 5) -> List[dict]:
+        """Ranked products for a possibly misspelled query."""
+        return self.search(self.correct(query), limit=limit)
+
+    def _best_match(self, search_term: str) -> Optional[dict]:
+        """The first search result with the term in its title, else the first result."""
+        products = self.search(search_term)
+        if not products:
+            return None
+        term_lower = search_term.lower()
+        return next((p for p in products if term_lower in p.get("title", "").lower()), products[0])
+
+    def find_gift(self, gift_name: str) -> Optional[dict]:
+        """Resolve a spoken gift name to a product without network I/O.
+
+        Mirrors the remote lookup chain: search variants (preferring a product with
+        the term in its title, else the first result), then the mapped category,
+        then the typo-corrected name, then a substring scan over
+        title/description/category. Returns None rather than an unrelated product.
+        """
+        search_terms = search_variants(gift_name)
+
+        for search_term in search_terms:
+            product = self._best_match(search_term)
+            if product:
+                logger.info(f"Found product in local catalog using search term: '{search_term}'")
+                return product
+
+        category_key = match_category(gift_name)
+        if category_key:
+            category_products = self.by_category(CATEGORY_MAPPINGS[category_key], limit=1)
+            if category_products:
+                logger.info(f"Found product in local catalog from category '{CATEGORY_MAPPINGS[category_key]}'")
+                return category_products[0]
+
+        corrected = self.correct(gift_name)
+        if corrected not in search_terms:
+            product = self._best_match(corrected)
+            if product:
+                logger.info(f"Found product in local catalog using corrected name: '{corrected}'")
+                return product
+
+        pos = self.scan([term.lower() for term in search_terms[:3]])
+        if pos is not None:
+            product = self.products[pos]
+            logger.info(f"Found related product in local catalog: {product.get('title')}")
+            return product
+
+        return None
+
+    def vocabulary(self) -> Set[str]:
+        """All indexed tokens."""
+        return set(self._vocabulary)
+
+
+def load_snapshot(path: Path = CATALOG_SNAPSHOT_PATH) -> Optional[CatalogIndex]:
+    """Build the index from a bundled snapshot, if one exists."""
+    if not path.exists():
+        return None
+    if is_binary_snapshot(path):
+        products = MappedCatalog(path)
+        logger.info(f"Mapped {len(products)} products from binary catalog snapshot {path}")
+        return CatalogIndex(products)
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    products = data.get("products", []) if isinstance(data, dict) else data
+    logger.info(f"Loaded {len(products)} products from catalog snapshot {path}")
+    return CatalogIndex(products)
+
+
+async def fetch_catalog(session: aiohttp.ClientSession, url: str = CATALOG_BULK_URL) -> CatalogIndex:
+    """Build the index from one bulk fetch of the DummyJSON catalog.
+
+    Goes through the product API's circuit breaker, unhedged: a duplicate bulk
+    download would only add load.
+    """
+
+    async def get(timeout: float) -> dict:
+        async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            response.raise_for_status()
+            return await response.json()
+
+    data = await upstream.product_api.call(get, timeout=10, hedge=False)
+    products = data.get("products", [])
+    logger.info(f"Fetched {len(products)} products for the local catalog")
+    return CatalogIndex(products)
+
+
+# Seconds to wait before retrying a failed catalog load
+CATALOG_RETRY_INTERVAL = 60.0
+# Seconds prewarm may spend on the bulk fetch when no snapshot is bundled
+CATALOG_PREWARM_TIMEOUT = float(os.getenv("CATALOG_PREWARM_TIMEOUT", "5"))
+
+_catalog: Optional[CatalogIndex] = None
+_catalog_lock: Optional[asyncio.Lock] = None
+_catalog_failed_at: Optional[float] = None
+
+
+async def _prefetch_catalog(bulk_url: str) -> CatalogIndex:
+    async with aiohttp.ClientSession() as session:
+        return await fetch_catalog(session, bulk_url)
+
+
+def preload_catalog(bulk_url: Optional[str] = None) -> Optional[CatalogIndex]:
+    """Load the catalog synchronously at worker prewarm.
+
+    Uses the bundled snapshot, else bulk-fetches `bulk_url` within
+    CATALOG_PREWARM_TIMEOUT, so the first gift lookup of a job doesn't wait on
+    the download. If both fail, get_catalog() retries on first use.
+    """
+    global _catalog
+    if not LOCAL_CATALOG_ENABLED or _catalog is not None:
+        return _catalog
+    try:
+        _catalog = load_snapshot()
+    except (OSError, ValueError) as e:
+        logger.warning(f"Failed to preload catalog snapshot: {e}")
+    if _catalog is None and bulk_url:
+        try:
+            _catalog = asyncio.run(asyncio.wait_for(_prefetch_catalog(bulk_url), CATALOG_PREWARM_TIMEOUT))
+        except (OSError, ValueError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning(f"Couldn't fetch the catalog at prewarm, retrying on first use: {e!r}")
+    return _catalog
+
+
+async def get_catalog(session: aiohttp.ClientSession, bulk_url: str = CATALOG_BULK_URL) -> Optional[CatalogIndex]:
+    """Return the per-process catalog, loading it on first use.
+
+    Returns None if the catalog is disabled or neither the snapshot nor the bulk
+    fetch is available, in which case callers fall back to the remote search API.
+    """
+    global _catalog, _catalog_lock, _catalog_failed_at
+    if not LOCAL_CATALOG_ENABLED:
+        return None
+    if _catalog is not None:
+        return _catalog
+    loop = asyncio.get_running_loop()
+    if _catalog_failed_at is not None and loop.time() - _catalog_failed_at < CATALOG_RETRY_INTERVAL:
+        return None
+    if _catalog_lock is None:
+        _catalog_lock = asyncio.Lock()
+
+    async with _catalog_lock:
+        if _catalog is not None:
+            return _catalog
+        try:
+            _catalog = load_snapshot()
+            if _catalog is None:
+                _catalog = await fetch_catalog(session, bulk_url)
+        except (OSError, ValueError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning(f"Local catalog unavailable, using remote search: {e}")
+            _catalog_failed_at = loop.time()
+            return None
+    return _catalog
@@ -0,0 +1,255 @@
+"""
+Compact binary catalog snapshots opened with mmap.
+
+A snapshot stores the catalog column by column: fixed-width arrays for ids,
+prices and category codes, and for each text field an offsets array into a
+UTF-8 blob, plus a lowercased "scan" column searched by CatalogIndex.scan().
+Workers map the file read-only, so every process on a node shares the same
+page-cache pages instead of parsing and holding its own copy of the JSON
+dump. The index is built by tokenizing the mapped columns, and product dicts
+are only materialized when a lookup returns them.
+
+Layout: 8-byte magic, little-endian u32 header length, JSON header, then
+8-byte aligned sections described by the header (name -> offset from the end
+of the header rounded up to 8 bytes, dtype, count).
+
+Usage:
+    python catalog_store.py build products.json catalog.bin
+    python catalog_store.py info catalog.bin
+"""
+import argparse
+import bisect
+import json
+import logging
+import mmap
+import re
+import struct
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+logger = logging.getLogger("avatar.catalog")
+
+MAGIC = b"AVCATLG1"
+# Version 2 added the scan column
+FORMAT_VERSION = 2
+# Joins multi-valued fields (tags, images) inside one string
+LIST_SEPARATOR = "\x1f"
+# Ends each product's scan entry, so a search can't match across products
+SCAN_SEPARATOR = "\x1e"
+# Single-valued and list-valued text columns
+TEXT_FIELDS = ("title", "description", "thumbnail")
+LIST_FIELDS = ("tags", "images")
+# Tokens as catalog.tokenize() finds them in lowercased text
+_TOKEN_RE = re.compile(rb"[a-z0-9]+")
+# memoryview formats for the fixed-width dtypes (sections are 8-byte aligned)
+_FORMATS = {"<i8": "q", "<f8": "d", "<u2": "H", "<u8": "Q"}
+
+
+def is_binary_snapshot(path: Path) -> bool:
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def scan_entry(title: str, description: str, category: str) -> str:
+    """A product's entry in the text searched by CatalogIndex.scan()."""
+    return LIST_SEPARATOR.join((title, description, category)).lower() + SCAN_SEPARATOR
+
+
+def _text_column(values: List[str]) -> Tuple[np.ndarray, bytes]:
+    encoded = [value.encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return offsets, b"".join(encoded)
+
+
+def build_snapshot(products: List[dict], path: Path) -> int:
+    """Write `products` (DummyJSON dicts) as a binary snapshot; returns its size in bytes."""
+    categories = sorted({product.get("category", "") or "" for product in products})
+    category_codes = {category: code for code, category in enumerate(categories)}
+
+    sections: Dict[str, Union[np.ndarray, bytes]] = {
+        "id": np.array([int(product.get("id", 0) or 0) for product in products], dtype=np.int64),
+        "price": np.array([float(product.get("price", 0) or 0) for product in products], dtype=np.float64),
+        "category": np.array([category_codes[product.get("category", "") or ""] for product in products], dtype=np.uint16),
+    }
+    for name in TEXT_FIELDS:
+        offsets, blob = _text_column([product.get(name, "") or "" for product in products])
+        sections[f"{name}.offsets"], sections[f"{name}.data"] = offsets, blob
+    for name in LIST_FIELDS:
+        offsets, blob = _text_column([LIST_SEPARATOR.join(product.get(name, []) or []) for product in products])
+        sections[f"{name}.offsets"], sections[f"{name}.data"] = offsets, blob
+    offsets, blob = _text_column([
+        scan_entry(product.get("title", "") or "", product.get("description", "") or "", product.get("category", "") or "")
+        for product in products
+    ])
+    sections["scan.offsets"], sections["scan.data"] = offsets, blob
+
+    layout: Dict[str, Tuple[int, str, int]] = {}
+    offset = 0
+    for name, data in sections.items():
+        offset = _align(offset)
+        if isinstance(data, np.ndarray):
+            layout[name] = (offset, data.dtype.str, len(data))
+            offset += data.nbytes
+        else:
+            layout[name] = (offset, "bytes", len(data))
+            offset += len(data)
+
+    header = json.dumps({
+        "version": FORMAT_VERSION,
+        "count": len(products),
+        "categories": categories,
+        "sections": layout,
+    }).encode("utf-8")
+    data_start = _align(len(MAGIC) + 4 + len(header))
+
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(header)))
+        f.write(header)
+        for name, data in sections.items():
+            f.write(b"\0" * (data_start + layout[name][0] - f.tell()))
+            f.write(data.tobytes() if isinstance(data, np.ndarray) else data)
+        return f.tell()
+
+
+class MappedCatalog(Sequence):
+    """Read-only product sequence backed by a memory-mapped snapshot.
+
+    Indexing returns a freshly built DummyJSON-style dict; nothing is cached
+    per product, so untouched products cost no process memory. tokens() and
+    find() work on the mapped columns without building any products.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[: len(MAGIC)] != MAGIC:
+            raise ValueError(f"{self.path} is not a binary catalog snapshot")
+        (header_length,) = struct.unpack_from("<I", self._mmap, len(MAGIC))
+        start = len(MAGIC) + 4
+        header = json.loads(self._mmap[start : start + header_length])
+        data_start = _align(start + header_length)
+        if header["version"] != FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported catalog snapshot version {header['version']}; rebuild it with `catalog_store.py build`"
+            )
+
+        self._count: int = header["count"]
+        self.categories: List[str] = header["categories"]
+        self._buffer = memoryview(self._mmap)
+        self._arrays: Dict[str, np.ndarray] = {}
+        # The same arrays as memoryviews: indexing them returns plain ints/floats, much faster than NumPy scalars
+        self._views: Dict[str, memoryview] = {}
+        self._blobs: Dict[str, memoryview] = {}
+        # Blob name -> (start, end) in the mapping, for mmap.find()
+        self._spans: Dict[str, Tuple[int, int]] = {}
+        for name, (offset, dtype, count) in header["sections"].items():
+            offset += data_start
+            if dtype == "bytes":
+                self._blobs[name] = self._buffer[offset : offset + count]
+                self._spans[name] = (offset, offset + count)
+            else:
+                array = np.frombuffer(self._mmap, dtype=np.dtype(dtype), count=count, offset=offset)
+                self._arrays[name] = array
+                self._views[name] = self._buffer[offset : offset + array.nbytes].cast(_FORMATS[array.dtype.str])
+
+        self.ids = self._arrays["id"]
+        self.prices = self._arrays["price"]
+        self.category_codes = self._arrays["category"]
+        # Text column name -> (offsets, blob), looked up once per field access
+        self._columns: Dict[str, Tuple[memoryview, memoryview]] = {
+            name[: -len(".data")]: (self._views[name[: -len(".data")] + ".offsets"], blob)
+            for name, blob in self._blobs.items()
+        }
+
+    def __len__(self) -> int:
+        return self._count
+
+    def text(self, name: str, position: int) -> str:
+        """One text field of one product, decoded straight from the mapping."""
+        offsets, blob = self._columns[name]
+        return str(blob[offsets[position] : offsets[position + 1]], "utf-8")
+
+    def _list(self, name: str, position: int) -> List[str]:
+        value = self.text(name, position)
+        return value.split(LIST_SEPARATOR) if value else []
+
+    def _product(self, position: int) -> dict:
+        views = self._views
+        return {
+            "id": views["id"][position],
+            "title": self.text("title", position),
+            "description": self.text("description", position),
+            "category": self.categories[views["category"][position]],
+            "price": views["price"][position],
+            "tags": self._list("tags", position),
+            "thumbnail": self.text("thumbnail", position),
+            "images": self._list("images", position),
+        }
+
+    def tokens(self, name: str) -> Iterator[Tuple[int, List[str]]]:
+        """(product position, lowercased tokens) of a text or list column, as catalog.tokenize() splits them."""
+        offsets = self._views[f"{name}.offsets"]
+        # Lowercased once for the whole column; only held while the index is built
+        data = self._blobs[f"{name}.data"].tobytes().lower()
+        # Tokens repeat across products; decode each distinct one once
+        decoded: Dict[bytes, str] = {}
+        for position in range(self._count):
+            raw_tokens = _TOKEN_RE.findall(data, offsets[position], offsets[position + 1])
+            yield position, [decoded.get(raw) or decoded.setdefault(raw, raw.decode("ascii")) for raw in raw_tokens]
+
+    def find(self, name: str, text: str) -> Optional[int]:
+        """Position of the first product whose `name` column contains `text`, searching the mapping in place."""
+        start, end = self._spans[f"{name}.data"]
+        offset = self._mmap.find(text.encode("utf-8"), start, end)
+        if offset < 0:
+            return None
+        return bisect.bisect_right(self._views[f"{name}.offsets"], offset - start) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._product(position) for position in range(*index.indices(self._count))]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("catalog index out of range")
+        return self._product(index)
+
+    def __iter__(self) -> Iterator[dict]:
+        for position in range(self._count):
+            yield self._product(position)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build or inspect binary catalog snapshots")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="convert a DummyJSON dump (e.g. /products?limit=0) to a snapshot")
+    build.add_argument("dump")
+    build.add_argument("output")
+    info = subparsers.add_parser("info", help="print a snapshot's product count and categories")
+    info.add_argument("snapshot")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        with open(args.dump, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        products = data.get("products", []) if isinstance(data, dict) else data
+        size = build_snapshot(products, Path(args.output))
+        print(f"Wrote {len(products)} products to {args.output} ({size:,} bytes)")
+    else:
+        catalog = MappedCatalog(Path(args.snapshot))
+        print(f"{args.snapshot}: {len(catalog)} products, {len(catalog.categories)} categories")
+        print(", ".join(catalog.categories))
+
+
+if __name__ == "__main__":
+    main()
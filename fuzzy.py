@@ -0,0 +1,148 @@
+"""
+Typo-tolerant term matching for spoken gift names.
+
+STT output splits and misspells product words ("air pods", "i phone",
+"labtop"). A trigram index narrows a vocabulary (catalog tokens, category
+aliases) to the few terms sharing enough trigrams with a query token, and a
+bounded edit distance ranks them. Lookups touch a handful of posting lists, so
+they stay well under a millisecond for catalogs of tens of thousands of terms.
+"""
+import heapq
+from collections import Counter
+from typing import Container, Dict, Iterable, List, Optional, Set, Tuple
+
+# Edit distance allowed by token length: short words are too easy to confuse
+# ("bag" / "bat"), so only tokens of 4+ characters are corrected
+MIN_FUZZY_LENGTH = 4
+LONG_TOKEN_LENGTH = 8
+# Trigrams shared by more terms than this are skipped when collecting
+# candidates, and edit distance is only computed for the best-overlapping
+# terms, which bounds lookup cost on large vocabularies
+MAX_POSTINGS = 256
+MAX_VERIFIED = 32
+
+
+def max_distance(term: str) -> int:
+    if len(term) < MIN_FUZZY_LENGTH:
+        return 0
+    return 1 if len(term) < LONG_TOKEN_LENGTH else 2
+
+
+def trigrams(term: str) -> Set[str]:
+    padded = f"${term}$"
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Optimal string alignment distance (adjacent swaps cost 1), capped at limit + 1."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2: List[int] = []
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return min(previous[-1], limit + 1)
+
+
+class TrigramIndex:
+    """Vocabulary terms looked up by shared trigrams, verified by edit distance."""
+
+    def __init__(self, terms: Iterable[str]) -> None:
+        self.terms: Set[str] = set(terms)
+        # trigram -> terms containing it
+        self._postings: Dict[str, List[str]] = {}
+        for term in self.terms:
+            for gram in trigrams(term):
+                self._postings.setdefault(gram, []).append(term)
+
+    def __contains__(self, term: str) -> bool:
+        return term in self.terms
+
+    def candidates(self, term: str, limit: int = 5) -> List[Tuple[str, int]]:
+        """Terms within the allowed edit distance, closest first, as (term, distance)."""
+        allowed = max_distance(term)
+        if term in self.terms:
+            return [(term, 0)]
+        if allowed == 0:
+            return []
+
+        grams = trigrams(term)
+        shared: Counter = Counter()
+        skipped = 0
+        for gram in grams:
+            postings = self._postings.get(gram, ())
+            if len(postings) > MAX_POSTINGS:
+                skipped += 1
+            else:
+                shared.update(postings)
+        # Each edit changes at most four trigrams (three, or four for a swap)
+        required = max(1, len(grams) - 4 * allowed - skipped)
+        ranked = []
+        for candidate, overlap in heapq.nlargest(MAX_VERIFIED, shared.items(), key=lambda item: item[1]):
+            if overlap < required:
+                break
+            distance = edit_distance(term, candidate, allowed)
+            if distance <= allowed:
+                ranked.append((distance, -overlap, candidate))
+        ranked.sort()
+        return [(candidate, distance) for distance, _, candidate in ranked[:limit]]
+
+    def containing(self, fragment: str) -> Set[str]:
+        """Terms containing `fragment` as a substring.
+
+        Every trigram of the fragment is a trigram of such a term, so only the
+        intersection of their posting lists is checked. Fragments shorter than
+        a trigram are looked up through the trigrams that contain them.
+        """
+        if len(fragment) < 3:
+            found = {term for gram, terms in self._postings.items() if fragment in gram for term in terms}
+        else:
+            postings = sorted(
+                (self._postings.get(fragment[i : i + 3], ()) for i in range(len(fragment) - 2)), key=len
+            )
+            found = set(postings[0])
+            for terms in postings[1:]:
+                if not found:
+                    break
+                found.intersection_update(terms)
+        return {term for term in found if fragment in term}
+
+    def best(self, term: str) -> Optional[str]:
+        found = self.candidates(term, limit=1)
+        return found[0][0] if found else None
+
+    def correct(self, tokens: List[str], keep: Container[str] = ()) -> List[str]:
+        """Map query tokens onto the vocabulary.
+
+        Adjacent tokens are joined when the joined form is a term ("air pods" ->
+        "airpods"); other unknown tokens become their closest term, if any.
+        Tokens in `keep` are only ever joined into an exact term, never
+        corrected.
+        """
+        corrected: List[str] = []
+        position = 0
+        while position < len(tokens):
+            token = tokens[position]
+            if position + 1 < len(tokens):
+                following = tokens[position + 1]
+                joined = token + following
+                match = joined if joined in self.terms else None
+                if match is None and not (token in self.terms and following in self.terms) and not (
+                    token in keep or following in keep
+                ):
+                    match = self.best(joined)
+                if match is not None:
+                    corrected.append(match)
+                    position += 2
+                    continue
+            corrected.append(token if token in keep else self.best(token) or token)
+            position += 1
+        return corrected
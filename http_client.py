@@ -0,0 +1,120 @@
+"""
+Worker-scoped pooled HTTP client.
+
+One aiohttp ClientSession per worker process, shared by every job running in
+that process. The client is built at prewarm; the session itself is bound to an
+event loop, and prewarm runs before the process's job loop exists, so it is
+opened once when that loop starts running jobs and stays open until the loop
+shuts down with the process. The connector keeps connections alive between
+tool calls and across jobs and caches DNS lookups, so repeated catalog requests
+skip the TCP/TLS handshake and name resolution.
+"""
+import asyncio
+import logging
+import os
+from typing import Dict, Optional
+
+import aiohttp
+
+logger = logging.getLogger("avatar.http")
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+class WorkerHttpClient:
+    """Shared aiohttp session with keep-alive, per-host limits and DNS caching."""
+
+    def __init__(
+        self,
+        limit: int = 100,
+        limit_per_host: int = 20,
+        dns_cache_ttl: int = 300,
+        keepalive_timeout: float = 30.0,
+    ) -> None:
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._connector: Optional[aiohttp.TCPConnector] = None
+        self._closer: Optional[asyncio.Task[None]] = None
+
+    @classmethod
+    def from_env(cls) -> "WorkerHttpClient":
+        """Build a client sized from HTTP_POOL_* environment variables."""
+        return cls(
+            limit=_env_int("HTTP_POOL_LIMIT", 100),
+            limit_per_host=_env_int("HTTP_POOL_LIMIT_PER_HOST", 20),
+            dns_cache_ttl=_env_int("HTTP_DNS_CACHE_TTL", 300),
+            keepalive_timeout=_env_float("HTTP_KEEPALIVE_TIMEOUT", 30.0),
+        )
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """The shared session, opened on the running event loop if it isn't yet."""
+        return self.open()
+
+    def open(self) -> aiohttp.ClientSession:
+        """Open the shared session on the running event loop, once per process.
+
+        The session is closed when the loop shuts down (the process exits),
+        not when a job ends, so connections are reused by later jobs.
+        """
+        if self._session is None or self._session.closed:
+            self._connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                use_dns_cache=True,
+                ttl_dns_cache=self.dns_cache_ttl,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            self._session = aiohttp.ClientSession(connector=self._connector)
+            # Pending tasks are cancelled when the job loop shuts down, which closes the session
+            self._closer = asyncio.get_running_loop().create_task(self._close_on_shutdown(), name="http_client_close")
+            logger.info(
+                f"Created shared HTTP session (limit={self.limit}, "
+                f"limit_per_host={self.limit_per_host}, dns_ttl={self.dns_cache_ttl}s)"
+            )
+        return self._session
+
+    async def _close_on_shutdown(self) -> None:
+        try:
+            await asyncio.Future()
+        finally:
+            await self.close()
+
+    async def close(self) -> None:
+        """Close the shared session and its connection pool."""
+        closer, self._closer = self._closer, None
+        if closer is not None and closer is not asyncio.current_task():
+            closer.cancel()
+        if self._session is not None and not self._session.closed:
+            logger.info(f"Closing shared HTTP session, pool stats: {self.pool_stats()}")
+            await self._session.close()
+        self._session = None
+        self._connector = None
+
+    def pool_stats(self) -> Dict[str, int]:
+        """Active, idle and waiting connection counts for sizing the pool."""
+        connector = self._connector
+        if connector is None or connector.closed:
+            return {"active": 0, "idle": 0, "waiting": 0, "limit": self.limit, "limit_per_host": self.limit_per_host}
+        # aiohttp does not expose these counters publicly
+        active = len(getattr(connector, "_acquired", ()))
+        idle = sum(len(conns) for conns in getattr(connector, "_conns", {}).values())
+        waiting = sum(len(waiters) for waiters in getattr(connector, "_waiters", {}).values())
+        return {
+            "active": active,
+            "idle": idle,
+            "waiting": waiting,
+            "limit": self.limit,
+            "limit_per_host": self.limit_per_host,
+        }
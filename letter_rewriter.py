@@ -0,0 +1,80 @@
+"""
+LLM rewrites of the letter message, streamed to the frontend as they're written.
+
+Keyword edits can only append text to the letter. A rewrite asks the LLM for
+the whole new message instead, and publishes the text received so far every
+LETTER_STREAM_INTERVAL seconds or LETTER_STREAM_CHUNKS chunks, so the letter
+starts changing on screen right away rather than after the full completion.
+Only the message paragraphs are generated; the greeting, products section and
+signature stay part of the letter template.
+"""
+import logging
+import os
+import time
+from typing import AsyncIterable, Callable, List
+
+from livekit.agents.llm import ChatContext
+
+import tracing
+
+logger = logging.getLogger("avatar.letter_rewriter")
+
+# Set to 0 to edit letters with keyword rules only
+LETTER_REWRITE = os.getenv("LETTER_REWRITE", "1") != "0"
+# Partial updates are published at most this often, or after this many chunks
+LETTER_STREAM_INTERVAL = float(os.getenv("LETTER_STREAM_INTERVAL", "0.1"))
+LETTER_STREAM_CHUNKS = int(os.getenv("LETTER_STREAM_CHUNKS", "20"))
+# Seconds a rewrite may take before falling back to the keyword edit
+LETTER_REWRITE_TIMEOUT = float(os.getenv("LETTER_REWRITE_TIMEOUT", "20"))
+
+REWRITE_INSTRUCTIONS = """
+You rewrite the message of a Christmas letter from Santa Claus.
+Apply the requested change and return only the new message: one or more
+paragraphs separated by a blank line. Do not include the greeting, the list of
+gifts, the closing or the signature; they are added separately. Keep the
+writer's language, keep the tone warm and personal, and keep the parts of the
+message the change doesn't touch.
+"""
+
+
+def rewrite_context(recipient: str, message: List[str], instructions: str) -> ChatContext:
+    """Chat context asking for the rewritten message of a letter."""
+    current = "\n\n".join(message) or "(empty)"
+    chat_ctx = ChatContext.empty()
+    chat_ctx.add_message(role="system", content=REWRITE_INSTRUCTIONS.strip())
+    chat_ctx.add_message(
+        role="user",
+        content=f"Letter to: {recipient}\n\nCurrent message:\n{current}\n\nRequested change: {instructions}",
+    )
+    return chat_ctx
+
+
+async def stream_text(
+    chunks: AsyncIterable[str],
+    on_partial: Callable[[str], None],
+    interval: float = LETTER_STREAM_INTERVAL,
+    max_chunks: int = LETTER_STREAM_CHUNKS,
+) -> str:
+    """Collect streamed text, calling on_partial with the text so far at a throttled rate.
+
+    Returns the full text; the caller publishes it as the final version.
+    """
+    parts: List[str] = []
+    unpublished = 0
+    updates = 0
+    last_published = time.monotonic()
+    with tracing.span("letter.stream") as span:
+        async for chunk in chunks:
+            if not chunk:
+                continue
+            parts.append(chunk)
+            unpublished += 1
+            now = time.monotonic()
+            if unpublished >= max_chunks or now - last_published >= interval:
+                on_partial("".join(parts))
+                unpublished = 0
+                updates += 1
+                last_published = now
+        span.set("chunks", len(parts))
+        span.set("partial_updates", updates)
+    return "".join(parts)
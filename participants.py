@@ -0,0 +1,86 @@
+"""
+Room participants by role, for routing RPCs to the right peer.
+
+The registry follows join/leave events and separates the Tavus avatar (and any
+other agent) from human clients, so frontend updates are never sent to the
+avatar or to whichever participant happens to be first in the room. Clients
+are looked up by identity in O(1); with no identity, the primary client is the
+earliest-joined human still in the room.
+"""
+import asyncio
+import logging
+from typing import Callable, Dict, List, Optional
+
+from livekit import rtc
+
+logger = logging.getLogger("avatar.participants")
+
+# Participant kinds that are people using the frontend
+CLIENT_KINDS = frozenset((
+    rtc.ParticipantKind.PARTICIPANT_KIND_STANDARD,
+    rtc.ParticipantKind.PARTICIPANT_KIND_SIP,
+))
+
+
+class ParticipantRegistry:
+    """Avatar and client participants of one room, kept current from room events."""
+
+    def __init__(self, room: rtc.Room, avatar_identity: Optional[str] = None) -> None:
+        self._room = room
+        self.avatar_identity = avatar_identity
+        self.avatar: Optional[rtc.RemoteParticipant] = None
+        # Human clients in join order
+        self._clients: Dict[str, rtc.RemoteParticipant] = {}
+        self._client_joined = asyncio.Event()
+        # Called with the identity of each client that leaves
+        self._on_client_left: List[Callable[[str], None]] = []
+
+        room.on("participant_connected", self._on_connected)
+        room.on("participant_disconnected", self._on_disconnected)
+        for participant in room.remote_participants.values():
+            self._on_connected(participant)
+
+    def is_avatar(self, participant: rtc.RemoteParticipant) -> bool:
+        if self.avatar_identity is not None:
+            return participant.identity == self.avatar_identity
+        return participant.kind == rtc.ParticipantKind.PARTICIPANT_KIND_AGENT
+
+    def _on_connected(self, participant: rtc.RemoteParticipant) -> None:
+        if self.is_avatar(participant):
+            self.avatar = participant
+            logger.info(f"Avatar participant joined: {participant.identity}")
+        elif participant.kind in CLIENT_KINDS:
+            self._clients[participant.identity] = participant
+            self._client_joined.set()
+            logger.info(f"Client participant joined: {participant.identity} ({len(self._clients)} in room)")
+
+    def _on_disconnected(self, participant: rtc.RemoteParticipant) -> None:
+        if self.avatar is not None and participant.identity == self.avatar.identity:
+            self.avatar = None
+            logger.info(f"Avatar participant left: {participant.identity}")
+        elif self._clients.pop(participant.identity, None) is not None:
+            if not self._clients:
+                self._client_joined.clear()
+            logger.info(f"Client participant left: {participant.identity}")
+            for callback in self._on_client_left:
+                callback(participant.identity)
+
+    def on_client_left(self, callback: Callable[[str], None]) -> None:
+        self._on_client_left.append(callback)
+
+    def client(self, identity: Optional[str] = None) -> Optional[rtc.RemoteParticipant]:
+        """The client with this identity, or the primary client if identity is None."""
+        if identity is not None:
+            return self._clients.get(identity)
+        return next(iter(self._clients.values()), None)
+
+    def clients(self) -> List[rtc.RemoteParticipant]:
+        return list(self._clients.values())
+
+    async def wait_for_client(self) -> rtc.RemoteParticipant:
+        """The primary client, waiting for one to join if the room has none."""
+        while True:
+            participant = self.client()
+            if participant is not None:
+                return participant
+            await self._client_joined.wait()
@@ -0,0 +1,207 @@
+"""
+Pre-synthesized audio for Santa's fixed phrases.
+
+Game announcements ("Rock! A solid choice! Ho ho ho!") are the same words every
+time, so synthesizing them in every session only adds TTS latency and cost.
+The cache keeps the PCM audio of each known phrase for one voice, loaded from
+WAV files at worker prewarm (phrases missing on disk are synthesized there and
+saved), and session.say() plays the cached frames instead of calling TTS.
+Phrases that aren't cached fall back to live TTS.
+
+Build the files ahead of time (e.g. in a deployment image) with:
+    python phrase_cache.py build
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+import wave
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AsyncIterator, Callable, Dict, Iterable, List, Optional
+
+import aiohttp
+from livekit import rtc
+from livekit.agents import APIConnectOptions, tts
+
+logger = logging.getLogger("avatar.phrase_cache")
+
+# Set to 0 to always use live TTS
+PHRASE_CACHE = os.getenv("PHRASE_CACHE", "1") != "0"
+PHRASE_CACHE_DIR = Path(os.getenv("PHRASE_CACHE_DIR", Path(__file__).parent / "phrase_cache"))
+# Seconds prewarm may spend synthesizing phrases that aren't on disk yet
+PHRASE_CACHE_WARM_TIMEOUT = float(os.getenv("PHRASE_CACHE_WARM_TIMEOUT", "5"))
+# One retry per phrase, so an unreachable TTS doesn't use up the warm-up time
+WARM_CONN_OPTIONS = APIConnectOptions(max_retry=1, retry_interval=0.5)
+# Length of the frames cached audio is played back in
+FRAME_MS = 20
+
+# Builds the TTS used to fill the cache, given the aiohttp session to use
+TTSFactory = Callable[[aiohttp.ClientSession], tts.TTS]
+
+
+@dataclass(slots=True)
+class CachedPhrase:
+    """16-bit PCM audio of one phrase."""
+    pcm: bytes
+    sample_rate: int
+    num_channels: int
+
+    async def frames(self) -> AsyncIterator[rtc.AudioFrame]:
+        samples_per_frame = self.sample_rate * FRAME_MS // 1000
+        frame_bytes = samples_per_frame * self.num_channels * 2
+        pcm = memoryview(self.pcm)
+        for offset in range(0, len(pcm), frame_bytes):
+            chunk = pcm[offset : offset + frame_bytes]
+            yield rtc.AudioFrame(
+                data=chunk,
+                sample_rate=self.sample_rate,
+                num_channels=self.num_channels,
+                samples_per_channel=len(chunk) // (2 * self.num_channels),
+            )
+
+
+class PhraseCache:
+    """Phrase audio for one voice, in memory and as WAV files under directory/voice_id."""
+
+    def __init__(self, voice_id: str, directory: Path = PHRASE_CACHE_DIR) -> None:
+        self.voice_id = voice_id
+        self.directory = directory / voice_id
+        self._phrases: Dict[str, CachedPhrase] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, text: str) -> Path:
+        return self.directory / f"{hashlib.sha1(text.encode()).hexdigest()[:16]}.wav"
+
+    def load(self, texts: Iterable[str]) -> int:
+        """Load the phrases saved on disk; returns how many were loaded."""
+        loaded = 0
+        for text in texts:
+            path = self.path(text)
+            if text in self._phrases or not path.exists():
+                continue
+            try:
+                with wave.open(str(path), "rb") as f:
+                    self._phrases[text] = CachedPhrase(
+                        pcm=f.readframes(f.getnframes()),
+                        sample_rate=f.getframerate(),
+                        num_channels=f.getnchannels(),
+                    )
+                loaded += 1
+            except (OSError, wave.Error) as e:
+                logger.warning(f"Ignoring unreadable phrase audio {path}: {e}")
+        return loaded
+
+    def missing(self, texts: Iterable[str]) -> List[str]:
+        return [text for text in dict.fromkeys(texts) if text not in self._phrases]
+
+    def _save(self, text: str, phrase: CachedPhrase) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.path(text)
+        # A temp file of its own, so workers warming the same phrase don't write into each other's
+        with tempfile.NamedTemporaryFile(dir=self.directory, prefix=f"{path.stem}.", suffix=".tmp", delete=False) as tmp:
+            tmp_path = tmp.name
+            try:
+                with wave.open(tmp, "wb") as f:
+                    f.setnchannels(phrase.num_channels)
+                    f.setsampwidth(2)
+                    f.setframerate(phrase.sample_rate)
+                    f.writeframes(phrase.pcm)
+            except BaseException:
+                tmp.close()
+                os.unlink(tmp_path)
+                raise
+        # Atomic, so a concurrently starting worker never reads a partial file
+        os.replace(tmp_path, path)
+
+    async def synthesize(self, tts_factory: TTSFactory, texts: Iterable[str]) -> int:
+        """Synthesize the given phrases that aren't cached yet and save them; returns how many were added."""
+        missing = self.missing(texts)
+        if not missing:
+            return 0
+        async with aiohttp.ClientSession() as http_session:
+            engine = tts_factory(http_session)
+
+            async def one(text: str) -> None:
+                frame = await engine.synthesize(text, conn_options=WARM_CONN_OPTIONS).collect()
+                phrase = CachedPhrase(
+                    pcm=bytes(frame.data), sample_rate=frame.sample_rate, num_channels=frame.num_channels
+                )
+                self._phrases[text] = phrase
+                await asyncio.to_thread(self._save, text, phrase)
+
+            try:
+                results = await asyncio.gather(*(one(text) for text in missing), return_exceptions=True)
+            finally:
+                await engine.aclose()
+        for text, result in zip(missing, results):
+            if isinstance(result, BaseException):
+                logger.warning(f"Couldn't synthesize phrase '{text}': {result}")
+        return sum(1 for result in results if not isinstance(result, BaseException))
+
+    def audio(self, text: str) -> Optional[AsyncIterator[rtc.AudioFrame]]:
+        """Frames to pass to session.say(text, audio=...), or None to use live TTS."""
+        phrase = self._phrases.get(text)
+        if phrase is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return phrase.frames()
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "phrases": len(self._phrases),
+            "bytes": sum(len(phrase.pcm) for phrase in self._phrases.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def from_env(voice_id: str, texts: Iterable[str], tts_factory: Optional[TTSFactory] = None) -> Optional[PhraseCache]:
+    """The phrase cache for a voice, warmed from disk and then TTS, or None if disabled.
+
+    Runs at worker prewarm (outside any event loop). Synthesis is bounded by
+    PHRASE_CACHE_WARM_TIMEOUT; phrases it doesn't finish use live TTS.
+    """
+    if not PHRASE_CACHE:
+        return None
+    texts = list(dict.fromkeys(texts))
+    cache = PhraseCache(voice_id)
+    loaded = cache.load(texts)
+    synthesized = 0
+    if tts_factory is not None and cache.missing(texts):
+        try:
+            synthesized = asyncio.run(
+                asyncio.wait_for(cache.synthesize(tts_factory, texts), PHRASE_CACHE_WARM_TIMEOUT)
+            )
+        except Exception as e:
+            logger.warning(f"Phrase cache warm-up incomplete, uncached phrases will use live TTS: {e!r}")
+            # Phrases finished before the timeout are still usable
+            synthesized = len(texts) - loaded - len(cache.missing(texts))
+    logger.info(
+        f"Phrase cache for voice {voice_id}: {loaded} loaded from {cache.directory}, "
+        f"{synthesized} synthesized, {len(cache.missing(texts))} missing"
+    )
+    return cache
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Synthesize Santa's fixed phrases into PHRASE_CACHE_DIR")
+    parser.add_argument("command", choices=["build", "info"])
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    from tavus import SANTA_PHRASES, SANTA_VOICE_ID, santa_tts
+
+    cache = PhraseCache(SANTA_VOICE_ID)
+    cache.load(SANTA_PHRASES)
+    if args.command == "build":
+        added = asyncio.run(cache.synthesize(lambda http_session: santa_tts(http_session=http_session), SANTA_PHRASES))
+        print(f"Synthesized {added} phrase(s) into {cache.directory}")
+    print(f"{len(SANTA_PHRASES) - len(cache.missing(SANTA_PHRASES))}/{len(SANTA_PHRASES)} phrases cached: {cache.stats()}")
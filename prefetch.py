@@ -0,0 +1,184 @@
+"""
+Speculative gift lookups driven by streaming STT transcripts.
+
+While the user is still speaking, interim transcripts are scanned for product
+nouns from the category vocabulary ("...an iPhone for my dad..."). Each noun
+found starts a gift lookup in the background, so by the time the LLM calls
+add_gift_to_wishlist the product is usually already resolved. Results live in
+a small per-session cache keyed by the normalized gift name.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import tracing
+from catalog import CATEGORY_MAPPINGS, tokenize
+
+logger = logging.getLogger("avatar.prefetch")
+
+# Set GIFT_PREFETCH=0 to disable speculative lookups
+PREFETCH_ENABLED = os.getenv("GIFT_PREFETCH", "1") != "0"
+# Seconds a prefetched lookup stays usable, and lookups kept per session
+PREFETCH_TTL = float(os.getenv("GIFT_PREFETCH_TTL", "30"))
+PREFETCH_MAX_ENTRIES = int(os.getenv("GIFT_PREFETCH_MAX_ENTRIES", "16"))
+
+# Words that never modify a product noun ("a laptop", "my watch")
+_STOPWORDS = frozenset(
+    "a an the my his her their our your some new and or for to of with i me want would like "
+    "get need please also one two".split()
+)
+
+Resolver = Callable[[str], Awaitable[Optional[dict]]]
+
+
+def gift_key(gift_name: str) -> str:
+    """Normalized gift name shared by transcript spotting and tool calls."""
+    return " ".join(tokenize(gift_name))
+
+
+def _vocabulary_noun(token: str) -> Optional[str]:
+    """The category vocabulary word for a token, allowing simple plurals."""
+    if token in CATEGORY_MAPPINGS:
+        return token
+    for suffix in ("es", "s"):
+        if token.endswith(suffix) and token[: -len(suffix)] in CATEGORY_MAPPINGS:
+            return token[: -len(suffix)]
+    return None
+
+
+def spot_gifts(transcript: str) -> List[str]:
+    """Gift names a tool call is likely to use for this transcript.
+
+    Each vocabulary noun yields the noun itself ("laptop", plus the plural as
+    spoken) and, if it has a modifier, the two-word phrase ("gaming laptop").
+    """
+    tokens = tokenize(transcript)
+    candidates: List[str] = []
+    for index, token in enumerate(tokens):
+        noun = _vocabulary_noun(token)
+        if noun is None:
+            continue
+        candidates.append(noun)
+        candidates.append(token)
+        if index > 0 and tokens[index - 1] not in _STOPWORDS:
+            candidates.append(f"{tokens[index - 1]} {noun}")
+    return list(dict.fromkeys(candidates))
+
+
+@dataclass(slots=True)
+class _Prefetch:
+    task: asyncio.Task
+    started: float
+    finished: Optional[float] = None
+
+
+@dataclass(slots=True)
+class PrefetchStats:
+    prefetched: int = 0
+    hits: int = 0
+    misses: int = 0
+    # Lookup time already spent when the tool asked for it
+    saved_seconds: float = 0.0
+    # Prefetches dropped (expired or evicted) without being used
+    wasted: int = 0
+
+    def as_dict(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "prefetched": self.prefetched,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "saved_seconds": round(self.saved_seconds, 4),
+            "wasted": self.wasted,
+        }
+
+
+class GiftPrefetcher:
+    """Per-session cache of speculative gift lookups."""
+
+    def __init__(
+        self,
+        resolve: Resolver,
+        ttl: float = PREFETCH_TTL,
+        max_entries: int = PREFETCH_MAX_ENTRIES,
+        enabled: bool = PREFETCH_ENABLED,
+    ) -> None:
+        self._resolve = resolve
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._entries: "OrderedDict[str, _Prefetch]" = OrderedDict()
+        self.stats = PrefetchStats()
+
+    def observe(self, transcript: str) -> None:
+        """Start lookups for gifts mentioned in an (interim) transcript."""
+        if not self.enabled:
+            return
+        for gift_name in spot_gifts(transcript):
+            self.prefetch(gift_name)
+
+    def prefetch(self, gift_name: str) -> None:
+        key = gift_key(gift_name)
+        entry = self._entries.get(key)
+        if entry is not None and not self._expired(entry):
+            return
+        if entry is not None:
+            self._drop(key)
+        while len(self._entries) >= self.max_entries:
+            self._drop(next(iter(self._entries)))
+
+        entry = _Prefetch(task=asyncio.ensure_future(self._resolve(gift_name)), started=time.perf_counter())
+        entry.task.add_done_callback(lambda task, entry=entry: self._on_done(entry, task))
+        self._entries[key] = entry
+        self.stats.prefetched += 1
+        logger.debug(f"Prefetching gift '{key}'")
+
+    def _on_done(self, entry: _Prefetch, task: asyncio.Task) -> None:
+        entry.finished = time.perf_counter()
+        # Retrieve the exception so failed speculative lookups aren't reported as unhandled
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug(f"Prefetch failed: {task.exception()}")
+
+    def _expired(self, entry: _Prefetch) -> bool:
+        return entry.finished is not None and time.perf_counter() - entry.finished > self.ttl
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        if not entry.task.done():
+            entry.task.cancel()
+        self.stats.wasted += 1
+
+    async def get(self, gift_name: str) -> Optional[dict]:
+        """Resolve a gift, reusing a prefetched lookup when one is available.
+
+        A prefetch that failed or expired counts as a miss and the gift is
+        resolved normally.
+        """
+        entry = self._entries.pop(gift_key(gift_name), None)
+        if entry is not None and not self._expired(entry) and not entry.task.cancelled():
+            asked = time.perf_counter()
+            saved = min(asked, entry.finished or asked) - entry.started
+            try:
+                result = await entry.task
+            except Exception as e:
+                logger.debug(f"Prefetched lookup for '{gift_name}' failed, resolving again: {e}")
+            else:
+                self.stats.hits += 1
+                self.stats.saved_seconds += saved
+                tracing.set_attribute("prefetch_saved_ms", round(saved * 1000, 2))
+                return result
+        elif entry is not None:
+            self.stats.wasted += 1
+        self.stats.misses += 1
+        tracing.set_attribute("prefetch_miss", True)
+        return await self._resolve(gift_name)
+
+    def close(self) -> None:
+        """Cancel lookups still in flight."""
+        for key in list(self._entries):
+            self._drop(key)
@@ -0,0 +1,141 @@
+"""
+Bounded TTL + LRU cache for product API responses.
+
+Shared by every session in a worker process. Entries are keyed by normalized
+search query or by listing URL, expire after a per-entry TTL, and are evicted
+least-recently-used first when the entry count or the memory cap is exceeded.
+Empty ("not found") results are cached with a shorter TTL so repeated misses
+don't hammer the API. Expired entries are kept for a further stale TTL so they
+can still be served while the API is unreachable.
+"""
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+CacheKey = Tuple[str, str]
+
+
+def search_key(term: str) -> CacheKey:
+    """Cache key for a search query (DummyJSON search is case-insensitive)."""
+    return ("search", " ".join(term.lower().split()))
+
+
+def url_key(url: str) -> CacheKey:
+    """Cache key for a category or listing URL."""
+    return ("url", url)
+
+
+class ProductCache:
+    """LRU cache of product lists with positive and negative TTLs and a memory cap."""
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        max_bytes: int = 8 * 1024 * 1024,
+        ttl: float = 600.0,
+        negative_ttl: float = 30.0,
+        stale_ttl: float = 3600.0,
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.stale_ttl = stale_ttl
+        # key -> (expires_at, size_bytes, products)
+        self._entries: "OrderedDict[CacheKey, Tuple[float, int, List[dict]]]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.stale_hits = 0
+
+    @classmethod
+    def from_env(cls) -> "ProductCache":
+        """Build a cache sized from PRODUCT_CACHE_* environment variables."""
+        return cls(
+            max_entries=int(os.getenv("PRODUCT_CACHE_MAX_ENTRIES", "1024")),
+            max_bytes=int(os.getenv("PRODUCT_CACHE_MAX_BYTES", str(8 * 1024 * 1024))),
+            ttl=float(os.getenv("PRODUCT_CACHE_TTL", "600")),
+            negative_ttl=float(os.getenv("PRODUCT_CACHE_NEGATIVE_TTL", "30")),
+            stale_ttl=float(os.getenv("PRODUCT_CACHE_STALE_TTL", "3600")),
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: CacheKey) -> Optional[List[dict]]:
+        """Return cached products (possibly an empty "not found" list), or None on a miss."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, _, products = entry
+        now = time.monotonic()
+        if expires_at + self.stale_ttl <= now:
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        if expires_at <= now:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return products
+
+    def get_stale(self, key: CacheKey) -> Optional[List[dict]]:
+        """Return products cached for `key` even if expired (within the stale TTL), or None.
+
+        For when the API can't be reached, after get() has already counted the
+        miss: only a served stale entry is counted.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, _, products = entry
+        if expires_at + self.stale_ttl <= time.monotonic():
+            return None
+        self.stale_hits += 1
+        self._entries.move_to_end(key)
+        return products
+
+    def set(self, key: CacheKey, products: List[dict]) -> None:
+        """Store products; an empty list is cached with the negative TTL."""
+        ttl = self.ttl if products else self.negative_ttl
+        if ttl <= 0:
+            return
+        # Approximate the footprint by the serialized size of the payload
+        size = len(json.dumps(products, separators=(",", ":")))
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + ttl, size, products)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    def _remove(self, key: CacheKey) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self) -> Dict[str, int]:
+        """Hit, miss, eviction and size counters."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "stale_hits": self.stale_hits,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+        }
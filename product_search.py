@@ -0,0 +1,228 @@
+"""
+Remote product lookups against the DummyJSON API.
+
+Used when the in-process catalog is unavailable. All search variants for a
+gift (plus the mapped category) are requested concurrently under one overall
+deadline; the highest-priority variant that returns a product wins and the
+remaining requests are cancelled. Every request goes through the shared
+product API policy (circuit breaker, hedging, tool budget; see upstream.py),
+and cached responses are served past their TTL while the API is failing.
+"""
+import asyncio
+import logging
+import os
+import urllib.parse
+from typing import Awaitable, Dict, List, Optional, Sequence, Tuple
+
+import aiohttp
+
+import tracing
+import upstream
+from catalog import CATEGORY_MAPPINGS, match_category, search_variants
+from product_cache import CacheKey, ProductCache, search_key, url_key
+
+logger = logging.getLogger("avatar.search")
+
+PRODUCT_API_BASE_URL = os.getenv("PRODUCT_API_BASE_URL", "https://dummyjson.com").rstrip("/")
+
+# Per-request timeout and overall budget for one gift lookup, in seconds
+REQUEST_TIMEOUT = 5.0
+SEARCH_DEADLINE = float(os.getenv("PRODUCT_SEARCH_DEADLINE", "6"))
+
+
+def search_url(term: str, limit: int = 5) -> str:
+    return f"{PRODUCT_API_BASE_URL}/products/search?q={urllib.parse.quote(term)}&limit={limit}"
+
+
+def category_url(category: str, limit: Optional[int] = None) -> str:
+    url = f"{PRODUCT_API_BASE_URL}/products/category/{category}"
+    return f"{url}?limit={limit}" if limit is not None else url
+
+
+def products_url(limit: int) -> str:
+    return f"{PRODUCT_API_BASE_URL}/products?limit={limit}"
+
+
+async def _get_products(session: aiohttp.ClientSession, url: str, timeout: float) -> Optional[List[dict]]:
+    """GET a DummyJSON listing; None on a non-200 response.
+
+    Server errors and rate limiting raise, so they count against the circuit breaker.
+    """
+    with tracing.span("http.get", url=url) as span:
+        async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            span.set("status", response.status)
+            if response.status >= 500 or response.status == 429:
+                response.raise_for_status()
+            if response.status != 200:
+                return None
+            data = await response.json()
+    return data.get("products", [])
+
+
+async def fetch_products(
+    session: aiohttp.ClientSession,
+    url: str,
+    timeout: float = REQUEST_TIMEOUT,
+    cache: Optional[ProductCache] = None,
+    cache_key: Optional[CacheKey] = None,
+) -> List[dict]:
+    """Return a listing's products, served from the cache when possible.
+
+    Successful responses are cached (empty ones as "not found"); errors and
+    non-200 responses are never cached. If the request fails (or the breaker
+    is open), an expired cache entry is served instead when there is one.
+    """
+    key = cache_key or url_key(url)
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            tracing.incr("cache_hits")
+            return cached
+        tracing.incr("cache_misses")
+    try:
+        products = await upstream.product_api.call(lambda t: _get_products(session, url, t), timeout)
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        stale = cache.get_stale(key) if cache is not None else None
+        if stale is None:
+            raise
+        tracing.incr("stale_hits")
+        return stale
+    if products is None:
+        return []
+    if cache is not None:
+        cache.set(key, products)
+    return products
+
+
+async def _search_best_match(
+    session: aiohttp.ClientSession,
+    term: str,
+    cache: Optional[ProductCache] = None,
+) -> Optional[dict]:
+    """Search one term, preferring a product with the term in its title, else the first result."""
+    products = await fetch_products(session, search_url(term), cache=cache, cache_key=search_key(term))
+    if not products:
+        return None
+    term_lower = term.lower()
+    best_match = next((p for p in products if term_lower in p.get("title", "").lower()), None)
+    return best_match or products[0]
+
+
+async def _first_in_category(
+    session: aiohttp.ClientSession,
+    category: str,
+    cache: Optional[ProductCache] = None,
+) -> Optional[dict]:
+    products = await fetch_products(session, category_url(category), cache=cache)
+    return products[0] if products else None
+
+
+async def first_by_priority(
+    lookups: Sequence[Tuple[str, Awaitable[Optional[dict]]]],
+    timeout: float,
+) -> Tuple[Optional[str], Optional[dict]]:
+    """Run lookups concurrently and return the highest-priority non-empty result.
+
+    A lookup only wins once every higher-priority lookup has finished without a
+    result, so ties are decided by list order. Losing lookups are cancelled, and
+    the whole race is bounded by `timeout`.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    tasks = [(label, asyncio.ensure_future(lookup)) for label, lookup in lookups]
+    try:
+        for label, task in tasks:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                logger.warning("Product search deadline exceeded")
+                break
+            done, _ = await asyncio.wait({task}, timeout=remaining)
+            if not done:
+                logger.warning(f"Product search deadline exceeded while waiting on '{label}'")
+                break
+            try:
+                result = task.result()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning(f"Error searching with '{label}': {e}")
+                continue
+            if result:
+                return label, result
+        return None, None
+    finally:
+        for _, task in tasks:
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled():
+                # Lower-priority lookups that failed after losing the race aren't awaited; mark them retrieved
+                task.exception()
+
+
+async def find_gift_remote(
+    session: aiohttp.ClientSession,
+    gift_name: str,
+    deadline: float = SEARCH_DEADLINE,
+    cache: Optional[ProductCache] = None,
+) -> Optional[dict]:
+    """Resolve a gift through the DummyJSON API within one overall deadline.
+
+    The deadline is cut to what's left of the caller's upstream budget, if any.
+    Raises UpstreamUnavailable if the circuit breaker is open and no cached
+    response could stand in.
+    """
+    deadline = upstream.remaining(deadline)
+    if deadline <= 0:
+        return None
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+
+    # DummyJSON search is case-insensitive, so variants differing only in case
+    # (e.g. "iPhone" / "iphone") need a single request
+    unique_terms: Dict[CacheKey, str] = {}
+    for term in search_variants(gift_name):
+        unique_terms.setdefault(search_key(term), term)
+    search_terms = list(unique_terms.values())
+    lookups: List[Tuple[str, Awaitable[Optional[dict]]]] = [
+        (term, _search_best_match(session, term, cache)) for term in search_terms
+    ]
+    # The mapped category is raced too, as the lowest-priority lookup
+    category_key = match_category(gift_name)
+    if category_key:
+        category = CATEGORY_MAPPINGS[category_key]
+        lookups.append((f"category:{category}", _first_in_category(session, category, cache)))
+
+    tracing.set_attribute("search_attempts", len(lookups))
+    label, product_data = await first_by_priority(lookups, timeout=deadline)
+    tracing.set_attribute("search_match", label or "")
+    if product_data:
+        logger.info(f"Found product using '{label}': {product_data.get('title')}")
+        return product_data
+
+    # Last resort: scan the general product list with whatever budget is left
+    remaining = deadline - (loop.time() - started)
+    if remaining <= 0:
+        return None
+    tracing.set_attribute("search_fallback", True)
+    try:
+        all_products = await fetch_products(
+            session, products_url(100), timeout=min(REQUEST_TIMEOUT, remaining), cache=cache
+        )
+    except upstream.UpstreamUnavailable:
+        # The API is known to be down and nothing is cached: not the same as "no such gift"
+        raise
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logger.warning(f"Error in fallback search: {e}")
+        return None
+
+    terms = [term.lower() for term in search_variants(gift_name)[:3]]
+    for product in all_products:
+        haystacks = (
+            product.get("title", "").lower(),
+            product.get("description", "").lower(),
+            product.get("category", "").lower(),
+        )
+        if any(term in haystack for term in terms for haystack in haystacks):
+            logger.info(f"Found related product: {product.get('title')}")
+            return product
+
+    # Nothing related: the caller says so rather than adding an unrelated product
+    return None
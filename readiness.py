@@ -0,0 +1,103 @@
+"""
+Readiness signals that gate Santa's first greeting.
+
+Instead of sleeping a fixed amount of time, the greeting waits until the Tavus
+avatar has published its video, the human participant's audio is subscribed,
+and the TTS connection is warm, bounded by a configurable timeout.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Optional
+
+from livekit import rtc
+from livekit.agents import tts as agents_tts
+
+logger = logging.getLogger("avatar.readiness")
+
+# Upper bound on how long the greeting waits for readiness, in seconds
+GREETING_READY_TIMEOUT = float(os.getenv("GREETING_READY_TIMEOUT", "5"))
+
+
+class GreetingReadiness:
+    """Tracks avatar video, participant audio and TTS warm-up for one room.
+
+    Create it before the avatar session starts so no room events are missed.
+    """
+
+    def __init__(self, room: rtc.Room, avatar_identity: str) -> None:
+        self._room = room
+        self._avatar_identity = avatar_identity
+        self._created_at = time.perf_counter()
+        self.avatar_video = asyncio.Event()
+        self.participant_audio = asyncio.Event()
+        # Seconds from creation until each signal fired
+        self.timings: Dict[str, float] = {}
+
+        room.on("track_published", self._on_track_published)
+        room.on("track_subscribed", self._on_track_subscribed)
+        self._check_existing_tracks()
+
+    def _mark(self, event: asyncio.Event, name: str) -> None:
+        if not event.is_set():
+            event.set()
+            self.timings[name] = time.perf_counter() - self._created_at
+            logger.info(f"Greeting readiness: {name} after {self.timings[name]:.3f}s")
+
+    def _check_existing_tracks(self) -> None:
+        for participant in self._room.remote_participants.values():
+            for publication in participant.track_publications.values():
+                self._on_track_published(publication, participant)
+                if publication.subscribed:
+                    self._on_track_subscribed(publication.track, publication, participant)
+
+    def _on_track_published(self, publication: rtc.RemoteTrackPublication, participant: rtc.RemoteParticipant) -> None:
+        if participant.identity == self._avatar_identity and publication.kind == rtc.TrackKind.KIND_VIDEO:
+            self._mark(self.avatar_video, "avatar_video")
+
+    def _on_track_subscribed(
+        self,
+        track: rtc.Track,
+        publication: rtc.RemoteTrackPublication,
+        participant: rtc.RemoteParticipant,
+    ) -> None:
+        if participant.identity != self._avatar_identity and publication.kind == rtc.TrackKind.KIND_AUDIO:
+            self._mark(self.participant_audio, "participant_audio")
+
+    async def _tts_warm(self, tts: Optional[agents_tts.TTS]) -> None:
+        if tts is not None:
+            tts.prewarm()
+            # Plugins that warm up in the background (e.g. ElevenLabs) expose the task
+            prewarm_task = getattr(tts, "_prewarm_task", None)
+            if isinstance(prewarm_task, asyncio.Task):
+                try:
+                    await asyncio.shield(prewarm_task)
+                except Exception as e:
+                    logger.warning(f"TTS prewarm failed: {e}")
+        self.timings.setdefault("tts", time.perf_counter() - self._created_at)
+
+    async def wait(self, tts: Optional[agents_tts.TTS], timeout: float = GREETING_READY_TIMEOUT) -> bool:
+        """Wait for all signals; returns False if the timeout elapsed first."""
+        waiters = {
+            "avatar_video": asyncio.ensure_future(self.avatar_video.wait()),
+            "participant_audio": asyncio.ensure_future(self.participant_audio.wait()),
+            "tts": asyncio.ensure_future(self._tts_warm(tts)),
+        }
+        try:
+            _, pending = await asyncio.wait(waiters.values(), timeout=timeout)
+            if pending:
+                missing = [name for name, waiter in waiters.items() if waiter in pending]
+                logger.warning(f"Greeting readiness timed out after {timeout:.1f}s, still waiting on: {missing}")
+                return False
+            return True
+        finally:
+            for waiter in waiters.values():
+                if not waiter.done():
+                    waiter.cancel()
+            self.close()
+
+    def close(self) -> None:
+        """Stop listening to room events."""
+        self._room.off("track_published", self._on_track_published)
+        self._room.off("track_subscribed", self._on_track_subscribed)
@@ -0,0 +1,205 @@
+"""
+In-process product recommendations over the local catalog.
+
+The catalog is embedded once into a NumPy matrix: a TF-IDF block over title,
+tags and description, a category one-hot block and a two-column price
+encoding whose dot product is higher for similar (log) prices. Rows are L2
+normalized, so one matrix-vector product against the wishlist centroid scores
+every candidate by cosine similarity. The matrix is stored feature-major, so
+a small wishlist, whose centroid only has a few nonzero features, is scored
+over just those features' rows.
+"""
+import logging
+import math
+import os
+import time
+import weakref
+from collections import Counter
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from catalog import CatalogIndex, tokenize
+
+logger = logging.getLogger("avatar.recommender")
+
+# Text field weights for term frequencies
+TEXT_FIELD_WEIGHTS = {
+    "title": 2.0,
+    "tags": 2.0,
+    "description": 1.0,
+}
+# Relative weight of the category and price blocks against the (unit) text block
+CATEGORY_WEIGHT = 0.6
+PRICE_WEIGHT = 0.3
+# Vocabulary bounds: most frequent terms kept, minimum document frequency, and
+# the document share above which a term is too common to be informative.
+# Scoring is one pass over the matrix, so its width bounds per-request latency
+MAX_FEATURES = int(os.getenv("RECOMMENDER_MAX_FEATURES", "256"))
+MIN_DF = 2
+MAX_DF_RATIO = 0.5
+# Centroids with nonzero values in less than this share of the features are
+# scored over those features only; gathering more rows costs more than it saves
+SPARSE_SCORING_SHARE = 1 / 3
+
+
+def _text_fields(product: dict) -> Dict[str, str]:
+    return {
+        "title": product.get("title", "") or "",
+        "tags": " ".join(product.get("tags", []) or []),
+        "description": product.get("description", "") or "",
+    }
+
+
+class ProductRecommender:
+    """Cosine-similarity recommender over a fixed product list."""
+
+    def __init__(self, products: Sequence[dict], max_features: int = MAX_FEATURES) -> None:
+        started = time.perf_counter()
+        # Kept as-is: a mapped catalog materializes products lazily
+        self.products = products
+        count = len(self.products)
+
+        # One pass over the products; each access may build a fresh dict
+        documents: List[Counter] = []
+        product_categories: List[str] = []
+        log_prices: List[float] = []
+        titles: List[str] = []
+        for product in self.products:
+            documents.append(self._term_weights(product))
+            product_categories.append(product.get("category", ""))
+            log_prices.append(math.log1p(max(float(product.get("price", 0) or 0), 0.0)))
+            titles.append(product.get("title", "").lower())
+
+        document_frequency: Counter = Counter()
+        for terms in documents:
+            document_frequency.update(terms.keys())
+        max_df = max(MIN_DF, int(count * MAX_DF_RATIO))
+        kept = [
+            term for term, df in document_frequency.most_common()
+            if MIN_DF <= df <= max_df
+        ][:max_features]
+        self._terms: Dict[str, int] = {term: column for column, term in enumerate(kept)}
+        self._idf = np.array(
+            [math.log((1 + count) / (1 + document_frequency[term])) + 1.0 for term in kept],
+            dtype=np.float32,
+        )
+
+        categories = sorted(set(product_categories))
+        self._categories: Dict[str, int] = {category: column for column, category in enumerate(categories)}
+        self._price_min = min(log_prices, default=0.0)
+        self._price_span = (max(log_prices, default=0.0) - self._price_min) or 1.0
+
+        self._text_columns = len(kept)
+        self._category_offset = self._text_columns
+        self._price_offset = self._category_offset + len(categories)
+        self.dimensions = self._price_offset + 2
+
+        # Text block: sublinear TF, scattered in one call, then IDF
+        matrix = np.zeros((count, self.dimensions), dtype=np.float32)
+        rows: List[int] = []
+        columns: List[int] = []
+        values: List[float] = []
+        for row, terms in enumerate(documents):
+            for term, weight in terms.items():
+                column = self._terms.get(term)
+                if column is not None:
+                    rows.append(row)
+                    columns.append(column)
+                    values.append(1.0 + math.log(weight))
+        matrix[rows, columns] = values
+        text = matrix[:, : self._text_columns]
+        text *= self._idf
+        text /= np.maximum(np.linalg.norm(text, axis=1, keepdims=True), 1e-12)
+
+        category_columns = [self._category_offset + self._categories[category] for category in product_categories]
+        matrix[np.arange(count), category_columns] = CATEGORY_WEIGHT
+        matrix[:, self._price_offset : self._price_offset + 2] = PRICE_WEIGHT * self._price_encoding(
+            np.array(log_prices, dtype=np.float32)
+        )
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        # Feature-major (dimensions x products): a feature's values are contiguous
+        self._features = np.ascontiguousarray(matrix.T)
+        del matrix, text
+
+        # Lowercase title -> positions, to exclude everything already owned
+        self._positions: Dict[str, List[int]] = {}
+        for position, title in enumerate(titles):
+            self._positions.setdefault(title, []).append(position)
+
+        logger.info(
+            f"Built recommender over {count} products x {self.dimensions} features "
+            f"in {(time.perf_counter() - started) * 1000:.1f}ms"
+        )
+
+    @staticmethod
+    def _term_weights(product: dict) -> Counter:
+        """Field-weighted term counts for one product."""
+        weights: Counter = Counter()
+        for field_name, text in _text_fields(product).items():
+            field_weight = TEXT_FIELD_WEIGHTS[field_name]
+            for token in tokenize(text):
+                weights[token] += field_weight
+        return weights
+
+    def _price_encoding(self, log_prices: np.ndarray) -> np.ndarray:
+        # Points on a quarter circle: the dot product of two prices is cos of their distance
+        angle = np.clip((log_prices - self._price_min) / self._price_span, 0.0, 1.0) * (math.pi / 2)
+        return np.stack([np.cos(angle), np.sin(angle)], axis=-1)
+
+    def embed(self, product: dict) -> np.ndarray:
+        """Vector for a product outside the catalog (e.g. from the remote API)."""
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for term, weight in self._term_weights(product).items():
+            column = self._terms.get(term)
+            if column is not None:
+                vector[column] = (1.0 + math.log(weight)) * self._idf[column]
+        vector[: self._text_columns] /= max(float(np.linalg.norm(vector[: self._text_columns])), 1e-12)
+        category_column = self._categories.get(product.get("category", ""))
+        if category_column is not None:
+            vector[self._category_offset + category_column] = CATEGORY_WEIGHT
+        log_price = math.log1p(max(float(product.get("price", 0) or 0), 0.0))
+        vector[self._price_offset : self._price_offset + 2] = PRICE_WEIGHT * self._price_encoding(
+            np.array(log_price, dtype=np.float32)
+        )
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def recommend(self, owned: Sequence[dict], limit: int = 6) -> List[dict]:
+        """Products most similar to the centroid of `owned`, excluding owned titles."""
+        if not owned or not self.products:
+            return []
+        owned_positions: List[int] = []
+        vectors = []
+        for product in owned:
+            positions = self._positions.get(product.get("title", "").lower())
+            if positions:
+                owned_positions.extend(positions)
+                vectors.append(self._features[:, positions[0]])
+            else:
+                vectors.append(self.embed(product))
+        centroid = np.mean(vectors, axis=0, dtype=np.float32)
+
+        active = np.flatnonzero(centroid)
+        if len(active) < self.dimensions * SPARSE_SCORING_SHARE:
+            scores = centroid[active] @ self._features[active]
+        else:
+            scores = centroid @ self._features
+        scores[owned_positions] = -np.inf
+        limit = min(limit, len(self.products) - len(set(owned_positions)))
+        if limit <= 0:
+            return []
+        top = np.argpartition(scores, -limit)[-limit:]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [self.products[position] for position in top]
+
+
+_recommenders: "weakref.WeakKeyDictionary[CatalogIndex, ProductRecommender]" = weakref.WeakKeyDictionary()
+
+
+def recommender_for(catalog: CatalogIndex) -> ProductRecommender:
+    """The recommender for a catalog, built on first use and reused afterwards."""
+    recommender: Optional[ProductRecommender] = _recommenders.get(catalog)
+    if recommender is None:
+        recommender = ProductRecommender(catalog.products)
+        _recommenders[catalog] = recommender
+    return recommender
@@ -0,0 +1,256 @@
+"""
+Background delivery of agent -> frontend RPCs.
+
+Tools update session state and enqueue the matching frontend update instead of
+awaiting perform_rpc, so a slow client never delays Santa's reply. Each
+participant gets one queue drained in order by a single task, with retries on
+transient failures and a per-method response timeout. A response timeout is
+only retried for idempotent methods: the frontend may already have applied the
+first call (added the gift, downloaded the PDF) when its answer timed out. Updates that carry full
+state (the letter, recommendations) take a coalescing key: a newer update
+replaces one still waiting in the queue, so only the latest is sent.
+"""
+import asyncio
+import contextvars
+import logging
+import os
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, Optional, Union
+
+from livekit import rtc
+
+import tracing
+
+logger = logging.getLogger("avatar.rpc")
+
+# Seconds to wait for the frontend's response, by default and per method
+RPC_TIMEOUT = float(os.getenv("RPC_TIMEOUT", "5"))
+RPC_TIMEOUTS: Dict[str, float] = {
+    "client.restoreSession": 10.0,
+    "client.downloadLetterPDF": 10.0,
+}
+# Attempts per update, and the first retry delay (doubled on each retry)
+RPC_MAX_ATTEMPTS = int(os.getenv("RPC_MAX_ATTEMPTS", "3"))
+RPC_RETRY_BACKOFF = float(os.getenv("RPC_RETRY_BACKOFF", "0.2"))
+# Seconds shutdown waits for queued updates to go out
+RPC_DRAIN_TIMEOUT = 2.0
+
+# Errors after which the request can't have reached the frontend
+_RETRYABLE = frozenset((
+    rtc.RpcError.ErrorCode.CONNECTION_TIMEOUT,
+    rtc.RpcError.ErrorCode.SEND_FAILED,
+))
+# Methods whose payload replaces frontend state (or is a letter patch that only
+# applies to its base revision), so a duplicate delivery changes nothing; these
+# are also retried after a response timeout
+IDEMPOTENT_METHODS = frozenset((
+    "client.showLetter",
+    "client.showRecommendations",
+    "client.showRockPaperScissors",
+    "client.restoreSession",
+))
+
+# Builds the payload when the update is sent, so coalesced updates carry the latest state
+Payload = Union[str, Callable[[], str]]
+# Called with the payload sent and the response, or None if delivery failed
+ResultHook = Callable[[str, Optional[str]], None]
+
+
+async def send_rpc(
+    room: rtc.Room,
+    destination_identity: str,
+    method: str,
+    payload: str,
+    response_timeout: Optional[float] = None,
+) -> str:
+    """perform_rpc inside an `rpc.<method>` span that records the payload size."""
+    with tracing.span(f"rpc.{method}") as span:
+        if span.recording:
+            span.set("payload_bytes", len(payload.encode()))
+        return await room.local_participant.perform_rpc(
+            destination_identity=destination_identity,
+            method=method,
+            payload=payload,
+            response_timeout=response_timeout,
+        )
+
+
+def _retryable(method: str, error: BaseException) -> bool:
+    if isinstance(error, rtc.RpcError):
+        if error.code == rtc.RpcError.ErrorCode.RESPONSE_TIMEOUT:
+            return method in IDEMPOTENT_METHODS
+        return error.code in _RETRYABLE
+    if isinstance(error, asyncio.TimeoutError):
+        return method in IDEMPOTENT_METHODS
+    return isinstance(error, ConnectionError)
+
+
+@dataclass(slots=True)
+class _Update:
+    method: str
+    payload: Payload
+    key: Optional[str]
+    on_result: Optional[ResultHook]
+    # Context of the latest enqueue, so the rpc span nests under the tool that sent it
+    context: contextvars.Context
+
+
+@dataclass(slots=True)
+class DispatchStats:
+    queued: int = 0
+    sent: int = 0
+    coalesced: int = 0
+    retries: int = 0
+    failed: int = 0
+    # Largest queue length seen
+    max_depth: int = 0
+
+
+class RpcDispatcher:
+    """Ordered outbound RPC queue for one participant."""
+
+    def __init__(self, room: rtc.Room, destination_identity: str, stats: Optional[DispatchStats] = None) -> None:
+        self.room = room
+        self.destination_identity = destination_identity
+        self.stats = stats if stats is not None else DispatchStats()
+        self._queue: Deque[_Update] = deque()
+        # Coalescing key -> the queued update it refers to
+        self._pending: Dict[str, _Update] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    def dispatch(
+        self,
+        method: str,
+        payload: Payload,
+        key: Optional[str] = None,
+        on_result: Optional[ResultHook] = None,
+    ) -> None:
+        """Queue an update; returns immediately."""
+        self.stats.queued += 1
+        context = contextvars.copy_context()
+        queued = self._pending.get(key) if key is not None else None
+        if queued is not None:
+            # Replace the waiting update in place, keeping its position in the queue
+            queued.method, queued.payload, queued.on_result, queued.context = method, payload, on_result, context
+            self.stats.coalesced += 1
+            return
+        update = _Update(method=method, payload=payload, key=key, on_result=on_result, context=context)
+        self._queue.append(update)
+        if key is not None:
+            self._pending[key] = update
+        self.stats.max_depth = max(self.stats.max_depth, len(self._queue))
+        if self._task is None or self._task.done():
+            self._idle.clear()
+            # Run outside the caller's context; each send restores its update's own context
+            self._task = asyncio.get_running_loop().create_task(self._run(), context=contextvars.Context())
+
+    async def _run(self) -> None:
+        try:
+            while self._queue:
+                update = self._queue.popleft()
+                if update.key is not None:
+                    self._pending.pop(update.key, None)
+                await self._deliver(update)
+        finally:
+            self._idle.set()
+
+    async def _deliver(self, update: _Update) -> None:
+        try:
+            payload = update.context.run(update.payload) if callable(update.payload) else update.payload
+        except Exception as e:
+            logger.error(f"Failed to build {update.method} payload: {e}")
+            self.stats.failed += 1
+            return
+
+        timeout = RPC_TIMEOUTS.get(update.method, RPC_TIMEOUT)
+        response: Optional[str] = None
+        for attempt in range(1, RPC_MAX_ATTEMPTS + 1):
+            try:
+                response = await asyncio.create_task(
+                    send_rpc(self.room, self.destination_identity, update.method, payload, response_timeout=timeout),
+                    context=update.context,
+                )
+                self.stats.sent += 1
+                break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if attempt == RPC_MAX_ATTEMPTS or not _retryable(update.method, e):
+                    self.stats.failed += 1
+                    logger.warning(
+                        f"RPC {update.method} to {self.destination_identity} failed after {attempt} attempt(s): {e}"
+                    )
+                    break
+                self.stats.retries += 1
+                await asyncio.sleep(RPC_RETRY_BACKOFF * 2 ** (attempt - 1))
+
+        if update.on_result is not None:
+            try:
+                update.on_result(payload, response)
+            except Exception as e:
+                logger.error(f"Error handling {update.method} response: {e}")
+
+    async def drain(self, timeout: float = RPC_DRAIN_TIMEOUT) -> bool:
+        """Wait until the queue is empty; returns False on timeout."""
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def close(self) -> None:
+        """Drop queued updates and stop sending."""
+        self._queue.clear()
+        self._pending.clear()
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
+
+class RpcOutbox:
+    """Per-room set of participant queues, sharing one stats record."""
+
+    def __init__(self, room: rtc.Room) -> None:
+        self.room = room
+        self.stats = DispatchStats()
+        self._dispatchers: Dict[str, RpcDispatcher] = {}
+
+    def dispatcher(self, destination_identity: str) -> RpcDispatcher:
+        dispatcher = self._dispatchers.get(destination_identity)
+        if dispatcher is None:
+            dispatcher = RpcDispatcher(self.room, destination_identity, self.stats)
+            self._dispatchers[destination_identity] = dispatcher
+        return dispatcher
+
+    def dispatch(
+        self,
+        destination_identity: str,
+        method: str,
+        payload: Payload,
+        key: Optional[str] = None,
+        on_result: Optional[ResultHook] = None,
+    ) -> None:
+        """Queue an update for a participant; returns immediately."""
+        self.dispatcher(destination_identity).dispatch(method, payload, key=key, on_result=on_result)
+
+    def drop(self, destination_identity: str) -> None:
+        """Discard a departed participant's queue."""
+        dispatcher = self._dispatchers.pop(destination_identity, None)
+        if dispatcher is not None:
+            dispatcher.close()
+
+    async def drain(self, timeout: float = RPC_DRAIN_TIMEOUT) -> bool:
+        """Wait for every queue to empty, up to `timeout` seconds in total."""
+        results = await asyncio.gather(*(d.drain(timeout) for d in self._dispatchers.values()))
+        return all(results)
+
+    async def close(self) -> None:
+        """Give queued updates a moment to go out, then stop every queue."""
+        if not await self.drain():
+            logger.warning("Dropping undelivered RPC updates at shutdown")
+        for dispatcher in self._dispatchers.values():
+            dispatcher.close()
+        self._dispatchers.clear()
+        logger.info(f"RPC dispatch stats: {self.stats}")
@@ -0,0 +1,156 @@
+"""
+Server-authoritative Rock, Paper, Scissors.
+
+The agent picks Santa's move, decides the round and keeps each session's
+score, so the frontend only sends the user's choice. The agent.gameChoice RPC
+is answered as soon as the round is decided; Santa's commentary and the
+frontend message update run afterwards on a per-session queue. When the user
+plays again before a round's result was announced, that stale result is
+skipped and the newer round is announced instead.
+"""
+import asyncio
+import json
+import logging
+import random
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Dict, Optional, Tuple
+
+logger = logging.getLogger("avatar.game")
+
+CHOICES = ("rock", "paper", "scissors")
+# Each choice and the choice it beats
+BEATS = {"rock": "scissors", "paper": "rock", "scissors": "paper"}
+# Rounds kept per session
+HISTORY_SIZE = 50
+# Seconds between Santa's reaction to the choice and the result, for dramatic effect
+REVEAL_DELAY = 1.0
+
+_rng = random.SystemRandom()
+
+
+def round_result(user_choice: str, santa_choice: str) -> str:
+    """"win", "lose" or "tie", from the user's point of view."""
+    if user_choice == santa_choice:
+        return "tie"
+    return "win" if BEATS[user_choice] == santa_choice else "lose"
+
+
+@dataclass(slots=True)
+class Round:
+    number: int
+    user_choice: str
+    santa_choice: str
+    result: str
+
+
+@dataclass(slots=True)
+class RpsGame:
+    """One session's rounds and score."""
+    rounds: Deque[Round] = field(default_factory=lambda: deque(maxlen=HISTORY_SIZE))
+    wins: int = 0
+    losses: int = 0
+    ties: int = 0
+
+    def play(self, user_choice: str) -> Round:
+        """Pick Santa's move and record the round."""
+        if user_choice not in BEATS:
+            raise ValueError(f"Unknown choice '{user_choice}'")
+        santa_choice = _rng.choice(CHOICES)
+        result = round_result(user_choice, santa_choice)
+        if result == "win":
+            self.wins += 1
+        elif result == "lose":
+            self.losses += 1
+        else:
+            self.ties += 1
+        played = Round(number=self.wins + self.losses + self.ties, user_choice=user_choice, santa_choice=santa_choice, result=result)
+        self.rounds.append(played)
+        return played
+
+    def score(self) -> Dict[str, int]:
+        return {"wins": self.wins, "losses": self.losses, "ties": self.ties}
+
+    def round_json(self, played: Round) -> str:
+        """agent.gameChoice response: the decided round and the score after it."""
+        return json.dumps({
+            "round": played.number,
+            "choice": played.user_choice,
+            "santaChoice": played.santa_choice,
+            "result": played.result,
+            "score": self.score(),
+        })
+
+
+# Called with the identity of the participant who played and the round
+RoundHook = Callable[[str, Round], None]
+
+
+class RoundAnnouncer:
+    """Announces a session's rounds one at a time, skipping results a newer round made stale.
+
+    on_choice runs when a round's announcement starts, on_result REVEAL_DELAY
+    seconds later unless another round was submitted in the meantime. Only the
+    latest waiting round is kept.
+    """
+
+    def __init__(self, on_choice: RoundHook, on_result: RoundHook, reveal_delay: float = REVEAL_DELAY) -> None:
+        self._on_choice = on_choice
+        self._on_result = on_result
+        self.reveal_delay = reveal_delay
+        self._pending: Optional[Tuple[str, Round]] = None
+        self._task: Optional[asyncio.Task] = None
+        # Rounds whose choice or result commentary was skipped
+        self.dropped = 0
+
+    def submit(self, participant_identity: str, played: Round) -> None:
+        if self._pending is not None:
+            self.dropped += 1
+        self._pending = (participant_identity, played)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self) -> None:
+        while self._pending is not None:
+            participant_identity, played = self._pending
+            self._pending = None
+            try:
+                self._on_choice(participant_identity, played)
+                await asyncio.sleep(self.reveal_delay)
+                if self._pending is not None:
+                    # The user already played again; announce that round instead
+                    self.dropped += 1
+                    continue
+                self._on_result(participant_identity, played)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error announcing round {played.number}: {e}")
+
+    async def close(self) -> None:
+        if self.dropped:
+            logger.info(f"Skipped commentary for {self.dropped} stale round(s)")
+        self._pending = None
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
+
+def handle_choice(game: RpsGame, announcer: RoundAnnouncer, caller_identity: str, payload: str) -> str:
+    """agent.gameChoice: decide the round, queue its commentary and return the round JSON.
+
+    Never waits on speech or outbound RPCs, so the caller gets its answer
+    immediately. Errors are returned as "error: ..." strings.
+    """
+    try:
+        user_choice = json.loads(payload).get("choice")
+    except (json.JSONDecodeError, AttributeError) as e:
+        logger.error(f"Invalid game choice payload '{payload}': {e}")
+        return "error: invalid payload"
+    if user_choice not in BEATS:
+        logger.error(f"Invalid game choice: {user_choice}")
+        return f"error: invalid choice '{user_choice}'"
+
+    played = game.play(user_choice)
+    logger.info(f"Round {played.number}: user chose {played.user_choice}, Santa chose {played.santa_choice} ({played.result})")
+    announcer.submit(caller_identity, played)
+    return game.round_json(played)
@@ -0,0 +1,208 @@
+"""
+Persistent session state, so a wishlist and letter survive reconnects and
+worker restarts.
+
+Each session's state is a small JSON document keyed by participant identity.
+Changes are written asynchronously: a SessionWriter coalesces
+every change made within a short window into one write of the latest state, so
+tool calls never wait on storage. Backends: SQLite (shared by every worker
+process on a host) and in-memory (tests, local runs).
+"""
+import asyncio
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger("avatar.session_store")
+
+# Backend: sqlite, memory, or none to disable persistence
+SESSION_STORE = os.getenv("SESSION_STORE", "sqlite")
+SESSION_STORE_PATH = Path(os.getenv("SESSION_STORE_PATH", Path(__file__).parent / "sessions.db"))
+# Seconds a saved session can be resumed, and seconds changes are coalesced before a write
+SESSION_STORE_TTL = float(os.getenv("SESSION_STORE_TTL", "86400"))
+SESSION_FLUSH_DELAY = float(os.getenv("SESSION_FLUSH_DELAY", "0.5"))
+# Identities issued by the connection-details route (a random UUID each, kept
+# in the browser's identity cookie). Anything else may have been chosen by a
+# client, or collide with another user's, so it is never resumed. Room names
+# are new on every connection, so they can't key a resumable session.
+ISSUED_IDENTITY_RE = re.compile(r"voice_assistant_user_[0-9a-f]{32}")
+
+
+def session_key(participant_identity: str) -> Optional[str]:
+    """Store key for a session, or None if its identity wasn't issued by the server."""
+    if not ISSUED_IDENTITY_RE.fullmatch(participant_identity):
+        return None
+    return f"participant:{participant_identity}"
+
+
+class SessionStore:
+    """Backend interface; state is a JSON-serializable dict."""
+
+    async def load(self, key: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    async def save(self, key: str, state: dict) -> None:
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class MemorySessionStore(SessionStore):
+    """Process-local store; state is kept serialized so callers can't mutate it."""
+
+    def __init__(self, ttl: float = SESSION_STORE_TTL) -> None:
+        self.ttl = ttl
+        self._sessions: Dict[str, Tuple[float, str]] = {}
+
+    async def load(self, key: str) -> Optional[dict]:
+        entry = self._sessions.get(key)
+        if entry is None or time.time() - entry[0] > self.ttl:
+            return None
+        return json.loads(entry[1])
+
+    async def save(self, key: str, state: dict) -> None:
+        self._sessions[key] = (time.time(), json.dumps(state))
+
+    async def delete(self, key: str) -> None:
+        self._sessions.pop(key, None)
+
+
+class SqliteSessionStore(SessionStore):
+    """SQLite file store. Queries run in a thread so the event loop never blocks on disk."""
+
+    def __init__(self, path: Path = SESSION_STORE_PATH, ttl: float = SESSION_STORE_TTL) -> None:
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        # WAL lets several worker processes read while one writes
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA busy_timeout=5000")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions (key TEXT PRIMARY KEY, state TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        pruned = self._db.execute("DELETE FROM sessions WHERE updated_at < ?", (time.time() - ttl,)).rowcount
+        if pruned:
+            logger.info(f"Pruned {pruned} expired sessions from {path}")
+
+    def _load(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT state FROM sessions WHERE key = ? AND updated_at >= ?", (key, time.time() - self.ttl)
+            ).fetchone()
+        return row[0] if row else None
+
+    def _save(self, key: str, state_json: str) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO sessions (key, state, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET state = excluded.state, updated_at = excluded.updated_at",
+                (key, state_json, time.time()),
+            )
+
+    def _delete(self, key: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM sessions WHERE key = ?", (key,))
+
+    async def load(self, key: str) -> Optional[dict]:
+        state_json = await asyncio.to_thread(self._load, key)
+        return json.loads(state_json) if state_json else None
+
+    async def save(self, key: str, state: dict) -> None:
+        await asyncio.to_thread(self._save, key, json.dumps(state))
+
+    async def delete(self, key: str) -> None:
+        await asyncio.to_thread(self._delete, key)
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+def from_env() -> Optional[SessionStore]:
+    """The store selected by SESSION_STORE, or None if persistence is disabled."""
+    if SESSION_STORE == "memory":
+        return MemorySessionStore()
+    if SESSION_STORE == "sqlite":
+        try:
+            return SqliteSessionStore()
+        except sqlite3.Error as e:
+            logger.warning(f"Session store unavailable at {SESSION_STORE_PATH}, sessions won't persist: {e}")
+            return None
+    if SESSION_STORE not in ("", "none"):
+        logger.warning(f"Unknown SESSION_STORE '{SESSION_STORE}', sessions won't persist")
+    return None
+
+
+@dataclass(slots=True)
+class WriterStats:
+    changes: int = 0
+    writes: int = 0
+    errors: int = 0
+
+
+class SessionWriter:
+    """Coalesces state changes for one session into delayed background writes.
+
+    mark_dirty() is cheap and never blocks; the latest snapshot is written at
+    most once per flush delay, however many changes happened in between.
+    """
+
+    def __init__(
+        self,
+        store: SessionStore,
+        key: str,
+        snapshot: Callable[[], dict],
+        delay: float = SESSION_FLUSH_DELAY,
+    ) -> None:
+        self.store = store
+        self.key = key
+        self._snapshot = snapshot
+        self.delay = delay
+        self._dirty = False
+        self._task: Optional[asyncio.Task] = None
+        self.stats = WriterStats()
+
+    def mark_dirty(self) -> None:
+        self.stats.changes += 1
+        self._dirty = True
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        # Changes made while a write is in flight are picked up by the next loop
+        while self._dirty:
+            await asyncio.sleep(self.delay)
+            await self._write()
+
+    async def _write(self) -> None:
+        self._dirty = False
+        try:
+            await self.store.save(self.key, self._snapshot())
+            self.stats.writes += 1
+        except Exception as e:
+            self.stats.errors += 1
+            logger.warning(f"Failed to save session {self.key}: {e}")
+
+    async def flush(self) -> None:
+        """Write pending changes now (e.g. at shutdown)."""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._dirty:
+            await self._write()
@@ -17,17 +17,37 @@ import logging
 import json
 import uuid
 import os
+import secrets
+import sys
+import time
 import aiohttp
-import urllib.parse
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Optional, List, TypedDict
+from typing import Callable, Optional, List, Tuple
 from dotenv import load_dotenv
-from livekit.agents import JobContext, WorkerOptions, cli, RoomOutputOptions, ToolError
-from livekit.agents.llm import function_tool, ChatContext, ChatRole
+from livekit import rtc
+from livekit.agents import JobContext, JobProcess, NOT_GIVEN, WorkerOptions, cli, RoomOutputOptions, ToolError
+from livekit.agents.llm import function_tool, LLM
 from livekit.agents.voice import Agent, AgentSession, RunContext
 from livekit.plugins import silero, tavus, elevenlabs
 import asyncio
+from catalog import CATALOG_PREWARM_TIMEOUT, get_catalog, preload_catalog
+from http_client import WorkerHttpClient
+from product_cache import ProductCache
+from readiness import GREETING_READY_TIMEOUT, GreetingReadiness
+from recommender import recommender_for
+from prefetch import GiftPrefetcher
+import session_store
+import phrase_cache
+from phrase_cache import PhraseCache
+from rps_game import Round, RoundAnnouncer, RpsGame, handle_choice
+from session_store import SessionStore, SessionWriter, session_key
+from rpc_dispatcher import Payload, ResultHook, RpcOutbox
+from participants import ParticipantRegistry
+from letter_rewriter import LETTER_REWRITE, LETTER_REWRITE_TIMEOUT, rewrite_context, stream_text
+import tracing
+import upstream
+from product_search import category_url, fetch_products, find_gift_remote, products_url
 
 # Load .env file from parent directory (as specified in README)
 load_dotenv(dotenv_path=Path(__file__).parent.parent / '.env', override=True)
@@ -43,7 +63,67 @@ if not eleven_api_key:
 else:
     logger.info("ElevenLabs API key found.")
 
-@dataclass
+# Response from the frontend when a letter patch doesn't match its revision
+LETTER_RESYNC_RESPONSE = "resync"
+
+# Tool reply while the product API's circuit breaker is open and nothing cached could stand in
+CATALOG_UNAVAILABLE_MESSAGE = "My gift catalog is temporarily unavailable. Could you ask me again in a minute?"
+
+# Version of the persisted UserData state (see UserData.to_state)
+SESSION_STATE_VERSION = 2
+
+# Fixed sections of every letter; the frontend replaces the marker with the wishlist
+LETTER_PRODUCTS_INTRO = "I'm bringing you these wonderful gifts:\n[PRODUCTS]"
+LETTER_CLOSING = "I hope you have a magical Christmas filled with joy, love, and happiness!"
+LETTER_SIGNATURE = "With lots of love and Christmas cheer,\nSanta Claus\n🎅🎄🎁"
+
+# ElevenLabs voice Santa speaks with
+SANTA_VOICE_ID = "21m00Tcm4TlvDq8ikWAM"
+
+# What Santa says during Rock, Paper, Scissors
+GAME_CHOICE_MESSAGES = {
+    "rock": "Rock! A solid choice! Ho ho ho!",
+    "paper": "Paper! Very clever!",
+    "scissors": "Scissors! Sharp thinking! Ho ho ho!"
+}
+GAME_CHOICE_DEFAULT_MESSAGE = "Great choice! Let's see who wins!"
+GAME_RESULT_MESSAGES = {
+    "win": "Oh no! You beat me! Well played! Ho ho ho!",
+    "lose": "Ho ho ho! I won this round! Great game though!",
+    "tie": "It's a tie! What a coincidence! Let's play again!"
+}
+GAME_RESULT_DEFAULT_MESSAGE = "Great game!"
+
+# Fixed utterances whose audio is synthesized once per worker (see phrase_cache.py)
+SANTA_PHRASES = [
+    *GAME_CHOICE_MESSAGES.values(),
+    GAME_CHOICE_DEFAULT_MESSAGE,
+    *GAME_RESULT_MESSAGES.values(),
+    GAME_RESULT_DEFAULT_MESSAGE,
+]
+
+def compact_id() -> str:
+    """Short random id (48 bits) for session-scoped objects, instead of a full uuid4 string."""
+    return secrets.token_hex(6)
+
+def split_description(description: str) -> Tuple[str, str, str]:
+    """Split a description into the three display lines used by the frontend."""
+    words = description.split()
+    # If description is short, just use it as description1
+    if len(words) < 10:
+        return description, "", ""
+    part_length = len(words) // 3
+    return (
+        " ".join(words[:part_length]),
+        " ".join(words[part_length:part_length*2]),
+        " ".join(words[part_length*2:]),
+    )
+
+def product_image(product_data: dict) -> str:
+    """Thumbnail of a DummyJSON product, else its first image."""
+    return product_data.get("thumbnail", "") or (product_data.get("images", [""])[0] if product_data.get("images") else "")
+
+@dataclass(slots=True)
 class Product:
     """Class to represent a product in the wishlist."""
     id: str
@@ -52,65 +132,355 @@ class Product:
     price: float
     image: str
     category: str
+    # Serialized frontend representation, computed once when the product is created
+    display_json: str = field(default="", repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        if not self.display_json:
+            self.display_json = json.dumps(self.to_display())
+
+    def to_display(self) -> dict:
+        """Frontend representation with the description split into three lines."""
+        description1, description2, description3 = split_description(self.description or "")
+        return {
+            "id": self.id,
+            "title": self.title,
+            "description1": description1,
+            "description2": description2,
+            "description3": description3,
+            "image": self.image,
+            "price": self.price,
+            "category": self.category
+        }
+
+    def to_source(self) -> dict:
+        """The product in DummyJSON field names, for ranking against catalog products."""
+        return {
+            "title": self.title,
+            "description": self.description,
+            "price": self.price,
+            "category": self.category,
+        }
 
-@dataclass
+def products_json(products: List[Product]) -> str:
+    """JSON array assembled from the products' cached display fragments."""
+    return "[" + ", ".join(product.display_json for product in products) + "]"
+
+def split_paragraphs(text: str) -> List[str]:
+    """Non-empty, blank-line separated paragraphs of free text."""
+    return [paragraph.strip() for paragraph in text.split("\n\n") if paragraph.strip()]
+
+@dataclass(slots=True)
 class Letter:
-    """Class to represent a letter to Santa."""
+    """Class to represent a letter to Santa.
+
+    The letter is kept as sections (greeting, message paragraphs, products
+    placeholder, closing, signature) and rendered to text only when sent, so
+    edits change one section instead of re-parsing the whole text.
+    """
     id: str
     recipient: str
-    content: str
     created_at: str
+    message: List[str] = field(default_factory=list)
+    show_products: bool = False
+    # Message of a rewrite still streaming in; shown instead of the message, never persisted
+    draft: Optional[List[str]] = field(default=None, repr=False)
+    # Incremented on every change; patches name the revision they apply to
+    revision: int = 0
+    # State the frontend last received, used to compute delta updates
+    synced_revision: Optional[int] = None
+    synced_paragraphs: List[str] = field(default_factory=list, repr=False)
+    synced_product_ids: List[str] = field(default_factory=list, repr=False)
+    # Rendered paragraphs, reused until the revision changes
+    _rendered: Optional[List[str]] = field(default=None, init=False, repr=False)
+    _rendered_revision: int = field(default=-1, init=False, repr=False)
+
+    def paragraphs(self) -> List[str]:
+        """Letter sections as sent in patches (blank-line separated)."""
+        if self._rendered is None or self._rendered_revision != self.revision:
+            message = self.draft if self.draft is not None else self.message
+            rendered = [f"Dear {self.recipient},", *message]
+            if self.show_products:
+                rendered.append(LETTER_PRODUCTS_INTRO)
+            rendered += [LETTER_CLOSING, LETTER_SIGNATURE]
+            self._rendered = rendered
+            self._rendered_revision = self.revision
+        return self._rendered
 
-@dataclass
+    @property
+    def content(self) -> str:
+        return "\n\n".join(self.paragraphs())
+
+    def add_paragraphs(self, text: str) -> int:
+        """Append text to the message as new paragraphs; returns how many were added."""
+        added = split_paragraphs(text)
+        self.message.extend(added)
+        return len(added)
+
+@dataclass(slots=True)
 class UserData:
     """Class to store user data during a session."""
     ctx: Optional[JobContext] = None
     wishlist: List[Product] = field(default_factory=list)
     letter: Optional[Letter] = None
+    # Bytes sent over client.showLetter vs. what full payloads would have cost
+    letter_bytes_sent: int = 0
+    letter_bytes_full: int = 0
+    # Called after every wishlist or letter change, e.g. to persist the session
+    on_change: Optional[Callable[[], None]] = field(default=None, repr=False)
+    # Background queues for frontend updates, created on first use
+    outbox: Optional[RpcOutbox] = field(default=None, repr=False)
+    # Room participants by role, created on first use
+    participants: Optional[ParticipantRegistry] = field(default=None, repr=False)
+    # The client this session serves; None means the room's primary client
+    participant_identity: Optional[str] = None
+    # Rock, Paper, Scissors rounds and score
+    game: RpsGame = field(default_factory=RpsGame, repr=False)
+    # LLM rewrite of the letter in progress; a newer edit cancels it
+    letter_rewrite: Optional[asyncio.Task] = field(default=None, repr=False)
+    # Cached products_json(wishlist), invalidated whenever the wishlist changes
+    _wishlist_json: Optional[str] = field(default=None, init=False, repr=False)
 
     def reset(self) -> None:
         """Reset session data."""
 
+    def _changed(self) -> None:
+        if self.on_change is not None:
+            self.on_change()
+
+    def client(self) -> Optional[rtc.RemoteParticipant]:
+        """The human participant this session's updates are routed to."""
+        if self.participants is None:
+            self.participants = ParticipantRegistry(self.ctx.room)
+        return self.participants.client(self.participant_identity)
+
+    def dispatch(
+        self,
+        participant_identity: str,
+        method: str,
+        payload: Payload,
+        key: Optional[str] = None,
+        on_result: Optional[ResultHook] = None,
+    ) -> None:
+        """Queue a frontend update; it is sent in the background, in order."""
+        if self.outbox is None:
+            self.outbox = RpcOutbox(self.ctx.room)
+        self.outbox.dispatch(participant_identity, method, payload, key=key, on_result=on_result)
+
+    def to_state(self) -> dict:
+        """Wishlist and letter as a JSON-serializable dict for the session store."""
+        letter = self.letter
+        return {
+            "version": SESSION_STATE_VERSION,
+            "wishlist": [
+                {
+                    "id": product.id,
+                    "title": product.title,
+                    "description": product.description,
+                    "price": product.price,
+                    "image": product.image,
+                    "category": product.category,
+                }
+                for product in self.wishlist
+            ],
+            "letter": {
+                "id": letter.id,
+                "recipient": letter.recipient,
+                "created_at": letter.created_at,
+                "message": letter.message,
+                "show_products": letter.show_products,
+                "revision": letter.revision,
+            } if letter else None,
+        }
+
+    def restore_state(self, state: dict) -> None:
+        """Replace the wishlist and letter with a state saved by to_state()."""
+        if state.get("version") != SESSION_STATE_VERSION:
+            raise ValueError(f"Unsupported session state version {state.get('version')}")
+        self.wishlist = [
+            Product(
+                id=item["id"],
+                title=item["title"],
+                description=item["description"],
+                price=item["price"],
+                image=item["image"],
+                category=sys.intern(item["category"]),
+            )
+            for item in state.get("wishlist", [])
+        ]
+        self._wishlist_json = None
+        letter = state.get("letter")
+        # The frontend of a resumed session starts without a letter, so it isn't synced
+        self.letter = Letter(**letter) if letter else None
+
     def add_product(self, product_data: dict) -> Product:
         """Add a product to the wishlist."""
         product = Product(
-            id=str(uuid.uuid4()),
+            id=compact_id(),
             title=product_data.get("title", ""),
             description=product_data.get("description", ""),
             price=product_data.get("price", 0.0),
-            image=product_data.get("thumbnail", "") or (product_data.get("images", [""])[0] if product_data.get("images") else ""),
-            category=product_data.get("category", "")
+            image=product_image(product_data),
+            # Categories repeat across every session, so share one string per category
+            category=sys.intern(product_data.get("category", ""))
         )
         self.wishlist.append(product)
+        self._wishlist_json = None
+        self._changed()
         return product
 
-    def set_letter(self, recipient: str, content: str) -> Letter:
-        """Create or update the letter."""
+    def wishlist_json(self) -> str:
+        """Serialized wishlist for letter payloads, reused until the wishlist changes."""
+        if self._wishlist_json is None:
+            self._wishlist_json = products_json(self.wishlist)
+        return self._wishlist_json
+
+    def _letter_json(self) -> str:
+        """The letter with the wishlist as its products, as sent to the frontend."""
+        letter = self.letter
+        letter_json = json.dumps({
+            "id": letter.id,
+            "revision": letter.revision,
+            "recipient": letter.recipient,
+            "content": letter.content,
+        })
+        # Splice the cached wishlist fragment in rather than re-serializing every product
+        return f'{letter_json[:-1]}, "products": {self.wishlist_json()}}}'
+
+    def letter_payload(self, action: str) -> str:
+        """client.showLetter payload for the current letter and wishlist."""
+        return f'{{"action": {json.dumps(action)}, "letter": {self._letter_json()}}}'
+
+    def restore_payload(self) -> str:
+        """client.restoreSession payload: the whole wishlist and letter in one RPC."""
+        letter_json = self._letter_json() if self.letter else "null"
+        return f'{{"action": "restore", "wishlist": {self.wishlist_json()}, "letter": {letter_json}}}'
+
+    def letter_patch_payload(self) -> Optional[str]:
+        """client.showLetter delta against what the frontend last received.
+
+        Only changed paragraphs and added/removed product ids are sent. Returns
+        None when the frontend has no synced copy and needs the full letter.
+        """
+        letter = self.letter
+        if letter.synced_revision is None:
+            return None
+        paragraphs = letter.paragraphs()
+        synced = letter.synced_paragraphs
+        changed = {
+            str(index): paragraph
+            for index, paragraph in enumerate(paragraphs)
+            if index >= len(synced) or synced[index] != paragraph
+        }
+        synced_ids = set(letter.synced_product_ids)
+        current_ids = {product.id for product in self.wishlist}
+        added = [product for product in self.wishlist if product.id not in synced_ids]
+        removed = [product_id for product_id in letter.synced_product_ids if product_id not in current_ids]
+        patch_json = json.dumps({
+            "id": letter.id,
+            "baseRevision": letter.synced_revision,
+            "revision": letter.revision,
+            "recipient": letter.recipient,
+            "paragraphCount": len(paragraphs),
+            "paragraphs": changed,
+            "removedProductIds": removed,
+        })
+        return f'{{"action": "patch", "letter": {patch_json[:-1]}, "addedProducts": {products_json(added)}}}}}'
+
+    def mark_letter_synced(self) -> None:
+        """Record that the frontend now holds the current letter revision."""
+        letter = self.letter
+        letter.synced_revision = letter.revision
+        # Rendering builds a new list per revision, so the current one can be kept as is
+        letter.synced_paragraphs = letter.paragraphs()
+        letter.synced_product_ids = [product.id for product in self.wishlist]
+
+    def set_letter(self, recipient: str, message: str) -> Letter:
+        """Create the letter, or replace the recipient and message of the existing one."""
         from datetime import datetime
         if self.letter:
             # Update existing letter
             self.letter.recipient = recipient
-            self.letter.content = content
+            self.letter.message = split_paragraphs(message)
+            self.letter.draft = None
+            self.letter.revision += 1
         else:
             # Create new letter
             self.letter = Letter(
-                id=str(uuid.uuid4()),
+                id=compact_id(),
                 recipient=recipient,
-                content=content,
+                message=split_paragraphs(message),
                 created_at=datetime.now().isoformat()
             )
+        self.letter.show_products = bool(self.wishlist)
+        self._changed()
         return self.letter
 
+    def add_to_letter(self, text: str) -> Letter:
+        """Append paragraphs to the letter message and refresh its products section."""
+        letter = self.letter
+        letter.add_paragraphs(text)
+        letter.draft = None
+        letter.show_products = bool(self.wishlist)
+        letter.revision += 1
+        self._changed()
+        return letter
+
+    def set_letter_draft(self, text: str) -> None:
+        """Show the partial text of a rewrite in place of the message until it's committed."""
+        letter = self.letter
+        letter.draft = split_paragraphs(text)
+        letter.revision += 1
+
+    def cancel_letter_rewrite(self) -> None:
+        """Stop the rewrite in progress, if any; its draft is dropped by the next letter change."""
+        if self.letter_rewrite is not None and not self.letter_rewrite.done():
+            self.letter_rewrite.cancel()
+        self.letter_rewrite = None
+
+def santa_tts(http_session: Optional[aiohttp.ClientSession] = None) -> elevenlabs.TTS:
+    """ElevenLabs TTS with Santa's voice."""
+    if eleven_api_key:
+        # Pass API key explicitly
+        return elevenlabs.TTS(voice_id=SANTA_VOICE_ID, api_key=eleven_api_key, http_session=http_session)
+    return elevenlabs.TTS(voice_id=SANTA_VOICE_ID, http_session=http_session)
+
+def say_phrase(session: AgentSession, phrases: Optional[PhraseCache], text: str) -> None:
+    """session.say() with the text's pre-synthesized audio, or live TTS if it isn't cached."""
+    audio = phrases.audio(text) if phrases is not None else None
+    with tracing.span("tts.phrase", cached=audio is not None):
+        session.say(text, audio=audio if audio is not None else NOT_GIVEN)
+
+def load_vad() -> Optional[silero.VAD]:
+    """Load Silero VAD, but make it optional if it fails."""
+    try:
+        vad_instance = silero.VAD.load()
+        logger.info("Silero VAD loaded successfully")
+        return vad_instance
+    except Exception as e:
+        logger.warning(f"Failed to load Silero VAD: {e}. Continuing without VAD.")
+        return None
+
 class AvatarAgent(Agent):
-    def __init__(self) -> None:
-        # Try to load Silero VAD, but make it optional if it fails
-        vad_instance = None
-        try:
-            vad_instance = silero.VAD.load()
-            logger.info("Silero VAD loaded successfully")
-        except Exception as e:
-            logger.warning(f"Failed to load Silero VAD: {e}. Continuing without VAD.")
-            vad_instance = None
+    def __init__(
+        self,
+        http_client: WorkerHttpClient,
+        product_cache: ProductCache,
+        vad: Optional[silero.VAD] = None,
+        readiness: Optional[GreetingReadiness] = None,
+        resume: Optional[asyncio.Task] = None,
+    ) -> None:
+        self._http = http_client
+        self._product_cache = product_cache
+        self._readiness = readiness
+        # Loads a saved session for the participant; resolves to True if one was restored
+        self._resume = resume
+        self._created_at = time.perf_counter()
+        # Gift lookups started from interim transcripts, before the LLM calls a tool
+        self.prefetcher = GiftPrefetcher(self._resolve_gift)
+
+        # Reuse the VAD loaded at worker prewarm; only load it here if prewarm didn't
+        vad_instance = vad if vad is not None else load_vad()
         
         super().__init__(
             instructions="""
@@ -132,6 +502,8 @@ class AvatarAgent(Agent):
 
                 WISHLIST FEATURE:
                 When someone asks for a gift, you should use the add_gift_to_wishlist function to search for and add it to their wishlist.
+                When someone asks for several gifts at once (e.g., "I want an iPhone, AirPods and a laptop"), call add_gifts_to_wishlist
+                once with all of the gift names instead of calling add_gift_to_wishlist for each one.
                 
                 IMPORTANT - How to extract gift names:
                 - Extract the main product name from the user's request
@@ -191,16 +563,113 @@ class AvatarAgent(Agent):
             """,
             stt="assemblyai/universal-streaming",
             llm="openai/gpt-4.1-mini",
-            tts=elevenlabs.TTS(
-                voice_id="21m00Tcm4TlvDq8ikWAM",
-                api_key=eleven_api_key  # Pass API key explicitly
-            ) if eleven_api_key else elevenlabs.TTS(
-                voice_id="21m00Tcm4TlvDq8ikWAM"
-            ),
+            tts=santa_tts(),
             vad=vad_instance,
         )
 
+    def _queue_letter(
+        self,
+        participant: rtc.RemoteParticipant,
+        userdata: UserData,
+        full_action: str,
+        allow_patch: bool = False,
+    ) -> None:
+        """Queue the letter for client.showLetter, as a delta when the frontend is in sync.
+
+        The payload is built when the update goes out, so edits queued in quick
+        succession are sent as one update of the latest revision. The frontend
+        answers a patch with "resync" if its revision doesn't match, in which case
+        the full letter is queued instead.
+        """
+        def build() -> str:
+            with tracing.span("serialize.letter") as span:
+                full_payload = userdata.letter_payload(full_action)
+                payload = (userdata.letter_patch_payload() if allow_patch else None) or full_payload
+                span.set("letter_patch", payload is not full_payload)
+            # Later patches are computed against what this update carries
+            userdata.mark_letter_synced()
+
+            sent_bytes = len(payload.encode())
+            full_bytes = len(full_payload.encode())
+            userdata.letter_bytes_sent += sent_bytes
+            userdata.letter_bytes_full += full_bytes
+            logger.info(
+                f"Sending letter revision {userdata.letter.revision} "
+                f"({'patch' if payload is not full_payload else full_action}): {sent_bytes} bytes, "
+                f"full payload {full_bytes} bytes; session total {userdata.letter_bytes_sent}/{userdata.letter_bytes_full} bytes"
+            )
+            return payload
+
+        def on_result(payload: str, response: Optional[str]) -> None:
+            if response is None:
+                # Not delivered: the frontend's copy is unknown, so the next update is a full letter
+                userdata.letter.synced_revision = None
+            elif response == LETTER_RESYNC_RESPONSE:
+                logger.info(f"Frontend letter out of sync at revision {userdata.letter.revision}, sending full letter")
+                userdata.letter.synced_revision = None
+                self._queue_letter(participant, userdata, full_action)
+
+        userdata.dispatch(participant.identity, "client.showLetter", build, key="letter", on_result=on_result)
+
+    async def _rewrite_letter(
+        self,
+        participant: rtc.RemoteParticipant,
+        userdata: UserData,
+        model: LLM,
+        instructions: str,
+        fallback_text: str,
+    ) -> None:
+        """Rewrite the letter message with the LLM, showing the text on screen as it streams in.
+
+        Partial text is shown as a draft; the letter's message only changes once
+        the stream completes. If the LLM fails or times out, the keyword edit
+        (fallback_text appended to the message) is applied instead.
+        """
+        letter = userdata.letter
+        chat_ctx = rewrite_context(letter.recipient, letter.message, instructions)
+
+        def publish(text: str) -> None:
+            userdata.set_letter_draft(text)
+            self._queue_letter(participant, userdata, full_action="update", allow_patch=True)
+
+        try:
+            async with model.chat(chat_ctx=chat_ctx) as stream:
+                text = await asyncio.wait_for(stream_text(stream.to_str_iterable(), publish), LETTER_REWRITE_TIMEOUT)
+            if not split_paragraphs(text):
+                raise ValueError("the LLM returned an empty message")
+        except asyncio.CancelledError:
+            logger.info("Letter rewrite cancelled by a newer change")
+            raise
+        except Exception as e:
+            logger.warning(f"Letter rewrite failed, applying keyword edit instead: {e}")
+            userdata.add_to_letter(fallback_text)
+        else:
+            userdata.set_letter(letter.recipient, text)
+            logger.info(f"Letter rewritten: {len(userdata.letter.message)} paragraph(s)")
+        self._queue_letter(participant, userdata, full_action="update", allow_patch=True)
+
+    async def _resolve_gift(self, gift_name: str) -> Optional[dict]:
+        """Find the product for a gift: in-process catalog first, then the DummyJSON API.
+
+        All upstream requests share one UPSTREAM_TOOL_BUDGET, so the remote
+        search only gets whatever a slow catalog fetch left over.
+        """
+        with tracing.span("lookup.gift", gift=gift_name), upstream.budget():
+            # Resolve the gift from the in-process catalog first (no network I/O)
+            catalog = await get_catalog(self._http.session, bulk_url=products_url(0))
+            if catalog:
+                # None when nothing related is found: better "couldn't find" than a wrong gift
+                product_data = catalog.find_gift(gift_name)
+                tracing.set_attribute("source", "catalog" if product_data else "catalog_miss")
+                return product_data
+
+            # Fall back to the DummyJSON search API if the catalog is unavailable,
+            # racing all search variants concurrently under one deadline
+            tracing.set_attribute("source", "remote")
+            return await find_gift_remote(self._http.session, gift_name, cache=self._product_cache)
+
     @function_tool
+    @tracing.traced
     async def add_gift_to_wishlist(self, context: RunContext[UserData], gift_name: str):
         """Add a gift to Santa's wishlist by searching for a similar product.
         
@@ -216,200 +685,24 @@ class AvatarAgent(Agent):
         if not userdata.ctx or not userdata.ctx.room:
             raise ToolError("Couldn't access the room to add the gift.")
         
-        room = userdata.ctx.room
-        
-        # Get the first participant in the room (should be the client)
-        participants = room.remote_participants
-        if not participants:
-            raise ToolError("No participants found to send the gift to.")
-        
-        participant = next(iter(participants.values()), None)
+        # The human client this session serves (never the avatar)
+        participant = userdata.client()
         if not participant:
-            raise ToolError("Couldn't get the first participant.")
+            raise ToolError("No participants found to send the gift to.")
         
         try:
-            # Search for products using DummyJSON API
-            # Try multiple search variations to find a product
-            search_terms = [
-                gift_name,  # Original term
-                gift_name.lower(),  # Lowercase
-                gift_name.replace(" ", "-"),  # With hyphens
-                gift_name.replace(" ", ""),  # No spaces
-            ]
-            
-            # Map gift names to DummyJSON categories
-            # Based on available categories: beauty, fragrances, furniture, groceries, home-decoration, 
-            # kitchen-accessories, laptops, mens-shirts, mens-shoes, mens-watches, mobile-accessories,
-            # motorcycle, skin-care, smartphones, sports-accessories, sunglasses, tablets, tops,
-            # vehicle, womens-bags, womens-dresses, womens-jewellery, womens-shoes, womens-watches
-            category_mappings = {
-                "webcam": "mobile-accessories",
-                "camera": "mobile-accessories",
-                "car": "vehicle",
-                "vehicle": "vehicle",
-                "phone": "smartphones",
-                "iphone": "smartphones",
-                "smartphone": "smartphones",
-                "laptop": "laptops",
-                "computer": "laptops",
-                "watch": "mens-watches",
-                "wristwatch": "mens-watches",
-                "headphones": "mobile-accessories",
-                "earbuds": "mobile-accessories",
-                "airpods": "mobile-accessories",
-                "tablet": "tablets",
-                "bicycle": "sports-accessories",
-                "bike": "sports-accessories",
-                "sunglasses": "sunglasses",
-                "glasses": "sunglasses",
-                "bag": "womens-bags",
-                "handbag": "womens-bags",
-                "furniture": "furniture",
-                "chair": "furniture",
-                "sofa": "furniture",
-                "perfume": "fragrances",
-                "cologne": "fragrances",
-            }
-            
-            categories_to_try = []
-            for key, category in category_mappings.items():
-                if key.lower() in gift_name.lower():
-                    categories_to_try.append(category)
-                    search_terms.append(key)
-                    break
-            
-            product_data = None
-            async with aiohttp.ClientSession() as session:
-                for search_term in search_terms:
-                    try:
-                        # URL encode the search term
-                        encoded_term = urllib.parse.quote(search_term)
-                        search_url = f"https://dummyjson.com/products/search?q={encoded_term}&limit=5"
-                        
-                        async with session.get(search_url, timeout=aiohttp.ClientTimeout(total=5)) as response:
-                            if response.status != 200:
-                                continue
-                            
-                            data = await response.json()
-                            products = data.get("products", [])
-                            
-                            if products:
-                                # Try to find the best match
-                                # Prefer products with the search term in the title
-                                best_match = None
-                                for product in products:
-                                    title_lower = product.get("title", "").lower()
-                                    if search_term.lower() in title_lower:
-                                        best_match = product
-                                        break
-                                
-                                # If no exact match, use the first product
-                                product_data = best_match or products[0]
-                                logger.info(f"Found product using search term: '{search_term}'")
-                                break
-                    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
-                        logger.warning(f"Error searching with term '{search_term}': {e}")
-                        continue
-                
-                # Try searching by category if we have a category mapping
-                if not product_data and categories_to_try:
-                    for category in categories_to_try:
-                        try:
-                            category_url = f"https://dummyjson.com/products/category/{category}"
-                            async with session.get(category_url, timeout=aiohttp.ClientTimeout(total=5)) as response:
-                                if response.status == 200:
-                                    data = await response.json()
-                                    category_products = data.get("products", [])
-                                    if category_products:
-                                        # Get the first product from the category
-                                        product_data = category_products[0]
-                                        logger.info(f"Found product from category '{category}': {product_data.get('title')}")
-                                        break
-                        except Exception as e:
-                            logger.warning(f"Error searching category '{category}': {e}")
-                            continue
-                
-                # Last resort: try getting products from general list if nothing found yet
-                if not product_data:
-                    try:
-                        # Try to get products from a general category
-                        category_url = "https://dummyjson.com/products?limit=100"
-                        async with session.get(category_url, timeout=aiohttp.ClientTimeout(total=5)) as response:
-                            if response.status == 200:
-                                data = await response.json()
-                                all_products = data.get("products", [])
-                                if all_products:
-                                    # Try to find something related in title or description
-                                    for product in all_products:
-                                        title = product.get("title", "").lower()
-                                        description = product.get("description", "").lower()
-                                        category = product.get("category", "").lower()
-                                        
-                                        # Check if any search term matches
-                                        for term in search_terms[:3]:
-                                            if (term.lower() in title or 
-                                                term.lower() in description or 
-                                                term.lower() in category):
-                                                product_data = product
-                                                logger.info(f"Found related product: {product.get('title')}")
-                                                break
-                                        
-                                        if product_data:
-                                            break
-                                    
-                                    # If still no match, just pick a random product as fallback
-                                    if not product_data and all_products:
-                                        product_data = all_products[0]
-                                        logger.info(f"Using fallback product: {product_data.get('title')}")
-                    except Exception as e:
-                        logger.warning(f"Error in fallback search: {e}")
+            product_data = await self.prefetcher.get(gift_name)
             
             # Add product to wishlist (this runs after finding a product, outside the session context)
             if product_data:
                 product = userdata.add_product(product_data)
                 
-                # Format description for display (split into 3 parts if needed)
-                description = product_data.get("description", "")
-                # Split description into parts for display
-                words = description.split()
-                part_length = len(words) // 3
-                description1 = " ".join(words[:part_length]) if part_length > 0 else description[:50]
-                description2 = " ".join(words[part_length:part_length*2]) if part_length > 0 else ""
-                description3 = " ".join(words[part_length*2:]) if part_length > 0 else ""
-                
-                # If description is short, just use it as description1
-                if len(words) < 10:
-                    description1 = description
-                    description2 = ""
-                    description3 = ""
-                
-                # Send product to frontend via RPC
-                payload = {
-                    "action": "add",
-                    "product": {
-                        "id": product.id,
-                        "title": product.title,
-                        "description1": description1,
-                        "description2": description2,
-                        "description3": description3,
-                        "image": product.image,
-                        "price": product.price,
-                        "category": product.category
-                    }
-                }
-                
-                json_payload = json.dumps(payload)
+                # Send product to frontend via RPC, reusing its cached display fragment
+                json_payload = f'{{"action": "add", "product": {product.display_json}}}'
                 total_items = len(userdata.wishlist)
-                logger.info(f"Sending product to wishlist ({total_items} items total): {json_payload}")
-                try:
-                    await room.local_participant.perform_rpc(
-                        destination_identity=participant.identity,
-                        method="client.addToWishlist",
-                        payload=json_payload
-                    )
-                except Exception as rpc_error:
-                    logger.warning(f"RPC call failed but continuing: {rpc_error}")
-                    # Continue even if RPC fails - the product is still added to wishlist
+                logger.info(f"Sending {product.title} to wishlist ({total_items} items total)")
+                # Sent in the background so the reply isn't held up by the client
+                userdata.dispatch(participant.identity, "client.addToWishlist", json_payload)
                 
                 return f"I've added {product.title} to your wishlist! Ho ho ho! You now have {total_items} item{'s' if total_items > 1 else ''} in your wishlist."
             else:
@@ -419,13 +712,102 @@ class AvatarAgent(Agent):
             # Re-raise ToolError as-is (don't wrap it)
             raise
         except (aiohttp.ClientError, asyncio.TimeoutError) as e:
-            logger.error(f"Error fetching product from API: {e}")
-            raise ToolError(f"I'm having trouble connecting to my gift catalog right now. Could you try again in a moment?")
+            # Breaker open, request failed or timed out, or the tool's budget used up
+            if not isinstance(e, upstream.UpstreamUnavailable):
+                logger.error(f"Error fetching product from API: {e!r}")
+            raise ToolError(CATALOG_UNAVAILABLE_MESSAGE)
         except Exception as e:
             logger.error(f"Error adding gift to wishlist: {e}")
             raise ToolError(f"Something unexpected happened while adding the gift. Please try again or ask for a different item.")
 
     @function_tool
+    @tracing.traced
+    async def add_gifts_to_wishlist(self, context: RunContext[UserData], gift_names: List[str]):
+        """Add several gifts to Santa's wishlist at once.
+
+        Use this instead of calling add_gift_to_wishlist repeatedly when the user asks
+        for more than one gift in the same request. All gifts are looked up concurrently
+        and shown in the wishlist together.
+
+        Args:
+            gift_names: The names of the gifts the user wants (e.g., ["iPhone", "AirPods", "laptop"])
+        """
+        userdata = context.userdata
+
+        if not userdata.ctx or not userdata.ctx.room:
+            raise ToolError("Couldn't access the room to add the gifts.")
+
+        # The human client this session serves (never the avatar)
+        participant = userdata.client()
+        if not participant:
+            raise ToolError("No participants found to send the gifts to.")
+
+        # Drop repeats (case-insensitive), keeping the order the user asked in
+        unique_names = list({name.strip().lower(): name.strip() for name in gift_names if name.strip()}.values())
+        if not unique_names:
+            raise ToolError("I didn't catch which gifts you'd like. Could you tell me again?")
+
+        try:
+            results = await asyncio.gather(
+                *(self.prefetcher.get(name) for name in unique_names), return_exceptions=True
+            )
+
+            added: List[Product] = []
+            missing: List[str] = []
+            # Not looked up because the product API is down, timed out or used up
+            # the tool's budget (rather than not found)
+            unavailable: List[str] = []
+            added_titles = set()
+            for name, result in zip(unique_names, results):
+                if isinstance(result, (aiohttp.ClientError, asyncio.TimeoutError)):
+                    if not isinstance(result, upstream.UpstreamUnavailable):
+                        logger.warning(f"Error looking up '{name}': {result!r}")
+                    unavailable.append(name)
+                    continue
+                if isinstance(result, BaseException):
+                    logger.warning(f"Error looking up '{name}': {result}")
+                    missing.append(name)
+                    continue
+                if not result:
+                    missing.append(name)
+                    continue
+                # Two names can resolve to the same product; add it once
+                title = result.get("title", "")
+                if title in added_titles:
+                    continue
+                added_titles.add(title)
+                added.append(userdata.add_product(result))
+
+            tracing.set_attribute("gifts", len(unique_names))
+            tracing.set_attribute("gifts_added", len(added))
+            if not added and unavailable and not missing:
+                raise ToolError(CATALOG_UNAVAILABLE_MESSAGE)
+            if not added:
+                missing += unavailable
+                raise ToolError(f"I couldn't find {', '.join(missing)} in my catalog. Could you try asking for something else? For example: iPhone, laptop, headphones, watch, or other common items.")
+
+            # One RPC for the whole batch, built from the products' cached display fragments
+            json_payload = f'{{"action": "add_batch", "products": {products_json(added)}}}'
+            total_items = len(userdata.wishlist)
+            logger.info(f"Sending {len(added)} products to wishlist ({total_items} items total)")
+            userdata.dispatch(participant.identity, "client.addToWishlist", json_payload)
+
+            titles = ", ".join(product.title for product in added)
+            response = f"I've added {titles} to your wishlist! Ho ho ho! You now have {total_items} item{'s' if total_items > 1 else ''} in your wishlist."
+            if missing:
+                response += f" I couldn't find {', '.join(missing)}, though. Could you describe those differently?"
+            if unavailable:
+                response += f" My gift catalog is temporarily unavailable, so I couldn't look up {', '.join(unavailable)} yet."
+            return response
+
+        except ToolError:
+            raise
+        except Exception as e:
+            logger.error(f"Error adding gifts to wishlist: {e}")
+            raise ToolError("Something unexpected happened while adding the gifts. Please try again.")
+
+    @function_tool
+    @tracing.traced
     async def create_letter(self, context: RunContext[UserData], recipient: str, message: str):
         """Create a letter to someone that includes the wishlist items.
         
@@ -438,89 +820,22 @@ class AvatarAgent(Agent):
         if not userdata.ctx or not userdata.ctx.room:
             raise ToolError("Couldn't access the room to create the letter.")
         
-        room = userdata.ctx.room
-        participants = room.remote_participants
-        if not participants:
-            raise ToolError("No participants found to send the letter to.")
-        
-        participant = next(iter(participants.values()), None)
+        # The human client this session serves (never the avatar)
+        participant = userdata.client()
         if not participant:
-            raise ToolError("Couldn't get the first participant.")
+            raise ToolError("No participants found to send the letter to.")
         
         try:
-            # Get wishlist items
-            wishlist_items = [product.title for product in userdata.wishlist]
-            
-            # Generate letter content with a natural, warm tone (without listing products in text)
-            letter_content = f"Dear {recipient},\n\n"
-            letter_content += f"{message}\n\n"
-            
-            # Add introduction for products if there are any
-            if wishlist_items:
-                letter_content += "I'm bringing you these wonderful gifts:\n\n"
-                letter_content += "[PRODUCTS]\n\n"
-            
-            letter_content += "I hope you have a magical Christmas filled with joy, love, and happiness!\n\n"
-            letter_content += "With lots of love and Christmas cheer,\n"
-            letter_content += "Santa Claus\n"
-            letter_content += "🎅🎄🎁"
-            
-            # Save letter
-            letter = userdata.set_letter(recipient, letter_content)
-            
-            # Prepare products data for frontend
-            products_data = []
-            for product in userdata.wishlist:
-                description = product.description or ""
-                words = description.split()
-                part_length = len(words) // 3
-                description1 = " ".join(words[:part_length]) if part_length > 0 else description[:50]
-                description2 = " ".join(words[part_length:part_length*2]) if part_length > 0 else ""
-                description3 = " ".join(words[part_length*2:]) if part_length > 0 else ""
-                
-                if len(words) < 10:
-                    description1 = description
-                    description2 = ""
-                    description3 = ""
-                
-                products_data.append({
-                    "id": product.id,
-                    "title": product.title,
-                    "description1": description1,
-                    "description2": description2,
-                    "description3": description3,
-                    "image": product.image,
-                    "price": product.price,
-                    "category": product.category
-                })
+            # Save letter; the greeting, products section and signature come from the letter template
+            userdata.cancel_letter_rewrite()
+            letter = userdata.set_letter(recipient, message)
             
             # Send to frontend
-            payload = {
-                "action": "show",
-                "letter": {
-                    "id": letter.id,
-                    "recipient": letter.recipient,
-                    "content": letter.content,
-                    "products": products_data
-                }
-            }
-            
-            json_payload = json.dumps(payload)
-            logger.info(f"Sending letter to frontend. Letter content length: {len(letter_content)} characters")
+            logger.info(f"Sending letter to frontend. Letter message: {len(letter.message)} paragraph(s)")
             logger.info(f"Letter recipient: {recipient}")
             logger.info(f"RPC method: client.showLetter, participant: {participant.identity}")
             
-            try:
-                await room.local_participant.perform_rpc(
-                    destination_identity=participant.identity,
-                    method="client.showLetter",
-                    payload=json_payload
-                )
-                logger.info("Letter sent successfully to frontend")
-            except Exception as rpc_error:
-                logger.error(f"Error sending letter via RPC: {rpc_error}")
-                # Don't fail the entire operation if RPC fails - the letter is still created
-                logger.warning("Continuing despite RPC error - letter was created successfully")
+            self._queue_letter(participant, userdata, full_action="show")
             
             return f"I've created a beautiful letter for {recipient}! Ho ho ho! You can see it on the right side of the screen."
             
@@ -531,6 +846,7 @@ class AvatarAgent(Agent):
             raise ToolError(f"Something went wrong while creating the letter. Please try again.")
 
     @function_tool
+    @tracing.traced
     async def edit_letter(self, context: RunContext[UserData], instructions: str):
         """Edit the existing letter based on user instructions.
         
@@ -545,36 +861,14 @@ class AvatarAgent(Agent):
         if not userdata.ctx or not userdata.ctx.room:
             raise ToolError("Couldn't access the room to edit the letter.")
         
-        room = userdata.ctx.room
-        participants = room.remote_participants
-        if not participants:
-            raise ToolError("No participants found to send the letter to.")
-        
-        participant = next(iter(participants.values()), None)
+        # The human client this session serves (never the avatar)
+        participant = userdata.client()
         if not participant:
-            raise ToolError("Couldn't get the first participant.")
+            raise ToolError("No participants found to send the letter to.")
         
         try:
-            # Get current letter
-            current_letter = userdata.letter
-            
-            # Extract the main message from the current letter (between "Dear X," and "I'm bringing" or "I hope you have")
-            current_content = current_letter.content
-            lines = current_content.split("\n")
-            
-            # Find the main message part (before "I'm bringing" or "I hope you have")
-            message_parts = []
-            for line in lines:
-                line_stripped = line.strip()
-                if line_stripped.startswith("Dear"):
-                    continue
-                elif line_stripped.startswith("I'm bringing") or line_stripped.startswith("I hope you have") or line_stripped.startswith("With lots") or line_stripped.startswith("Santa Claus") or "🎅" in line_stripped or "[PRODUCTS]" in line_stripped:
-                    break
-                elif line_stripped:
-                    message_parts.append(line_stripped)
-            
-            # Get the existing message (clean, without products marker)
-            existing_message = "\n".join(message_parts).strip()
+            # New message paragraphs, appended after the existing ones
+            new_text = ""
             
             # Parse instructions to update the message
             instructions_lower = instructions.lower()
@@ -629,105 +923,47 @@ class AvatarAgent(Agent):
                         content_to_add = content_to_add[:-1].strip()
                     
                     # Add to message
-                    if content_to_add:
-                        if existing_message:
-                            existing_message = f"{existing_message}\n\n{content_to_add}"
-                        else:
-                            existing_message = content_to_add
+                    new_text = content_to_add
                 
                 # Check if user wants to change content
                 elif "change" in instructions_lower or "modify" in instructions_lower or "update" in instructions_lower:
                     # For changes, we'll replace parts of the message
                     # This is a simplified version - ideally we'd use LLM for this
-                    if existing_message:
+                    if userdata.letter.message:
                         # Try to extract what to change
                         # For now, just append the change instruction as new content
                         parts = instructions.split("to", 1)
                         if len(parts) > 1:
                             new_text = parts[1].strip()
-                            existing_message = f"{existing_message}\n\n{new_text}"
             
             # Check if user wants to change content
             elif "change" in instructions_lower or "modify" in instructions_lower or "update" in instructions_lower:
                 # For changes, we'll replace parts of the message
                 # This is a simplified version - ideally we'd use LLM for this
-                if existing_message:
+                if userdata.letter.message:
                     # Try to extract what to change
                     # For now, just append the change instruction as new content
                     parts = instructions.split("to", 1)
                     if len(parts) > 1:
                         new_text = parts[1].strip()
-                        existing_message = f"{existing_message}\n\n{new_text}"
-            
-            # Get current wishlist items for products data
-            wishlist_items = [product for product in userdata.wishlist]
-            
-            # Build new letter content - only update the message part, keep structure
-            new_content = f"Dear {current_letter.recipient},\n\n"
-            new_content += f"{existing_message}\n\n"
             
-            # Add products section if there are products
-            if wishlist_items:
-                new_content += "I'm bringing you these wonderful gifts:\n[PRODUCTS]\n\n"
-            
-            new_content += "I hope you have a magical Christmas filled with joy, love, and happiness!\n\n"
-            new_content += "With lots of love and Christmas cheer,\n"
-            new_content += "Santa Claus\n"
-            new_content += "🎅🎄🎁"
+            # Content edits are rewritten by the LLM in the background and streamed to the
+            # frontend; the keyword edit above is applied if the rewrite fails
+            userdata.cancel_letter_rewrite()
+            model = self.llm
+            if LETTER_REWRITE and not is_gift_update and isinstance(model, LLM):
+                userdata.letter_rewrite = asyncio.create_task(
+                    self._rewrite_letter(participant, userdata, model, instructions, fallback_text=new_text)
+                )
+                return "I'm rewriting the letter now! Ho ho ho! You'll see the changes appear on the right side."
             
-            logger.info(f"Updated letter content. Message length: {len(existing_message)}, Gifts included: {len(wishlist_items)}")
+            # Update letter: only the message and products sections change, the rest keeps its structure
+            letter = userdata.add_to_letter(new_text)
             
-            # Update letter
-            letter = userdata.set_letter(current_letter.recipient, new_content)
+            logger.info(f"Updated letter content. Message paragraphs: {len(letter.message)}, Gifts included: {len(userdata.wishlist)}")
             
-            # Prepare products data for frontend
-            products_data = []
-            for product in wishlist_items:
-                description = product.description or ""
-                words = description.split()
-                part_length = len(words) // 3
-                description1 = " ".join(words[:part_length]) if part_length > 0 else description[:50]
-                description2 = " ".join(words[part_length:part_length*2]) if part_length > 0 else ""
-                description3 = " ".join(words[part_length*2:]) if part_length > 0 else ""
-                
-                if len(words) < 10:
-                    description1 = description
-                    description2 = ""
-                    description3 = ""
-                
-                products_data.append({
-                    "id": product.id,
-                    "title": product.title,
-                    "description1": description1,
-                    "description2": description2,
-                    "description3": description3,
-                    "image": product.image,
-                    "price": product.price,
-                    "category": product.category
-                })
-            
-            # Send updated letter to frontend with products
-            payload = {
-                "action": "update",
-                "letter": {
-                    "id": letter.id,
-                    "recipient": letter.recipient,
-                    "content": letter.content,
-                    "products": products_data
-                }
-            }
-            
-            json_payload = json.dumps(payload)
-            logger.info(f"Sending updated letter to frontend: {json_payload}")
-            try:
-                await room.local_participant.perform_rpc(
-                    destination_identity=participant.identity,
-                    method="client.showLetter",
-                    payload=json_payload
-                )
-            except Exception as rpc_error:
-                logger.warning(f"RPC call failed but continuing: {rpc_error}")
-                # Continue even if RPC fails - the letter was still updated
+            # Send only what changed since the frontend's revision (full letter on mismatch)
+            self._queue_letter(participant, userdata, full_action="update", allow_patch=True)
             
             return f"I've updated the letter! Ho ho ho! The changes are now visible on the right side."
             
@@ -736,6 +972,7 @@ class AvatarAgent(Agent):
             raise ToolError(f"Something went wrong while editing the letter. Please try again.")
 
     @function_tool
+    @tracing.traced
     async def download_letter_pdf(self, context: RunContext[UserData]):
         """Download the current letter as a PDF file.
         When the user asks you to download or export the letter as PDF, use this function.
@@ -748,14 +985,10 @@ class AvatarAgent(Agent):
         if not userdata.ctx or not userdata.ctx.room:
             raise ToolError("Couldn't access the room to download the letter.")
         
-        room = userdata.ctx.room
-        participants = room.remote_participants
-        if not participants:
-            raise ToolError("No participants found to send the download request to.")
-        
-        participant = next(iter(participants.values()), None)
+        # The human client this session serves (never the avatar)
+        participant = userdata.client()
         if not participant:
-            raise ToolError("Couldn't get the first participant.")
+            raise ToolError("No participants found to send the download request to.")
         
         try:
             # Send RPC to frontend to trigger PDF download
@@ -765,15 +998,8 @@ class AvatarAgent(Agent):
             
             json_payload = json.dumps(payload)
             logger.info("Sending PDF download request to frontend")
-            try:
-                await room.local_participant.perform_rpc(
-                    destination_identity=participant.identity,
-                    method="client.downloadLetterPDF",
-                    payload=json_payload
-                )
-            except Exception as rpc_error:
-                logger.warning(f"RPC call failed but continuing: {rpc_error}")
-                # Continue even if RPC fails - user can still click the PDF button manually
+            # Queued behind any pending letter update, so the PDF has the latest letter
+            userdata.dispatch(participant.identity, "client.downloadLetterPDF", json_payload)
             
             return "I've started downloading your letter as a PDF! Ho ho ho! It should start downloading in a moment."
             
@@ -781,7 +1007,61 @@ class AvatarAgent(Agent):
             logger.error(f"Error downloading letter PDF: {e}")
             raise ToolError(f"Something went wrong while downloading the letter. Please try again.")
 
+    async def _fetch_recommendations(self, userdata: UserData) -> List[dict]:
+        """Recommendations from the DummyJSON API, used when the local catalog is unavailable.
+
+        Raises UpstreamUnavailable if the circuit breaker kept every request from being sent.
+        """
+        # Get categories from current wishlist
+        categories = list(set([product.category for product in userdata.wishlist if product.category]))
+        
+        recommended_products = []
+        unavailable = False
+        
+        session = self._http.session
+        # Get products from similar categories
+        for category in categories[:3]:  # Limit to 3 categories
+            try:
+                products_in_category = await fetch_products(
+                    session, category_url(category, limit=5), cache=self._product_cache
+                )
+                    
+                # Filter out products already in wishlist
+                existing_titles = [p.title.lower() for p in userdata.wishlist]
+                for product in products_in_category:
+                    if product.get("title", "").lower() not in existing_titles:
+                        recommended_products.append(product)
+                        if len(recommended_products) >= 6:  # Limit to 6 recommendations
+                            break
+                    
+                if len(recommended_products) >= 6:
+                    break
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                unavailable = unavailable or isinstance(e, upstream.UpstreamUnavailable)
+                logger.warning(f"Error fetching category {category}: {e}")
+                continue
+            
+        # If we don't have enough recommendations, get some from general products
+        if len(recommended_products) < 6:
+            try:
+                all_products = await fetch_products(session, products_url(30), cache=self._product_cache)
+                existing_titles = [p.title.lower() for p in userdata.wishlist]
+                    
+                for product in all_products:
+                    if product.get("title", "").lower() not in existing_titles:
+                        recommended_products.append(product)
+                        if len(recommended_products) >= 6:
+                            break
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                unavailable = unavailable or isinstance(e, upstream.UpstreamUnavailable)
+                logger.warning(f"Error fetching general products: {e}")
+
+        if not recommended_products and unavailable:
+            raise upstream.UpstreamUnavailable("product API circuit breaker is open")
+        return recommended_products
+
     @function_tool
+    @tracing.traced
     async def recommend_similar_products(self, context: RunContext[UserData]):
         """Recommend similar products based on the items already in the wishlist.
         This will analyze the current wishlist items and suggest similar or complementary products.
@@ -794,88 +1074,38 @@ class AvatarAgent(Agent):
         if not userdata.ctx or not userdata.ctx.room:
             raise ToolError("Couldn't access the room to send recommendations.")
         
-        room = userdata.ctx.room
-        participants = room.remote_participants
-        if not participants:
-            raise ToolError("No participants found to send recommendations to.")
-        
-        participant = next(iter(participants.values()), None)
+        # The human client this session serves (never the avatar)
+        participant = userdata.client()
         if not participant:
-            raise ToolError("Couldn't get the first participant.")
+            raise ToolError("No participants found to send recommendations to.")
         
         try:
-            # Get categories from current wishlist
-            categories = list(set([product.category for product in userdata.wishlist if product.category]))
-            
-            recommended_products = []
-            
-            async with aiohttp.ClientSession() as session:
-                # Get products from similar categories
-                for category in categories[:3]:  # Limit to 3 categories
-                    try:
-                        category_url = f"https://dummyjson.com/products/category/{category}?limit=5"
-                        async with session.get(category_url, timeout=aiohttp.ClientTimeout(total=5)) as response:
-                            if response.status == 200:
-                                data = await response.json()
-                                products_in_category = data.get("products", [])
-                                
-                                # Filter out products already in wishlist
-                                existing_titles = [p.title.lower() for p in userdata.wishlist]
-                                for product in products_in_category:
-                                    if product.get("title", "").lower() not in existing_titles:
-                                        recommended_products.append(product)
-                                        if len(recommended_products) >= 6:  # Limit to 6 recommendations
-                                            break
-                                
-                                if len(recommended_products) >= 6:
-                                    break
-                    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
-                        logger.warning(f"Error fetching category {category}: {e}")
-                        continue
-                
-                # If we don't have enough recommendations, get some from general products
-                if len(recommended_products) < 6:
-                    try:
-                        all_products_url = "https://dummyjson.com/products?limit=30"
-                        async with session.get(all_products_url, timeout=aiohttp.ClientTimeout(total=5)) as response:
-                            if response.status == 200:
-                                data = await response.json()
-                                all_products = data.get("products", [])
-                                existing_titles = [p.title.lower() for p in userdata.wishlist]
-                                
-                                for product in all_products:
-                                    if product.get("title", "").lower() not in existing_titles:
-                                        recommended_products.append(product)
-                                        if len(recommended_products) >= 6:
-                                            break
-                    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
-                        logger.warning(f"Error fetching general products: {e}")
-            
+            # One upstream budget for the catalog load and any remote fallback
+            with upstream.budget():
+                catalog = await get_catalog(self._http.session, bulk_url=products_url(0))
+                if catalog:
+                    # Ranked in-process against the whole wishlist, no HTTP calls
+                    with tracing.span("recommend.local"):
+                        recommended_products = recommender_for(catalog).recommend(
+                            [product.to_source() for product in userdata.wishlist], limit=6
+                        )
+                else:
+                    recommended_products = await self._fetch_recommendations(userdata)
+
             if not recommended_products:
                 raise ToolError("I couldn't find similar products to recommend right now. Try again in a moment!")
             
             # Prepare products data for frontend
             products_data = []
             for product in recommended_products[:6]:  # Limit to 6
-                description = product.get("description", "") or ""
-                words = description.split()
-                part_length = len(words) // 3
-                description1 = " ".join(words[:part_length]) if part_length > 0 else description[:50]
-                description2 = " ".join(words[part_length:part_length*2]) if part_length > 0 else ""
-                description3 = " ".join(words[part_length*2:]) if part_length > 0 else ""
-                
-                if len(words) < 10:
-                    description1 = description
-                    description2 = ""
-                    description3 = ""
-                
+                description1, description2, description3 = split_description(product.get("description", "") or "")
                 products_data.append({
                     "id": str(uuid.uuid4()),  # Generate new ID for recommendations
                     "title": product.get("title", ""),
                     "description1": description1,
                     "description2": description2,
                     "description3": description3,
-                    "image": product.get("thumbnail", "") or (product.get("images", [""])[0] if product.get("images") else ""),
+                    "image": product_image(product),
                     "price": product.get("price", 0.0),
                     "category": product.get("category", ""),
                     "isRecommendation": True
@@ -887,28 +1117,26 @@ class AvatarAgent(Agent):
                 "products": products_data
             }
             
-            json_payload = json.dumps(payload)
+            with tracing.span("serialize.recommendations"):
+                json_payload = json.dumps(payload)
+            tracing.set_attribute("recommendations", len(products_data))
             logger.info(f"Sending {len(products_data)} recommendations to frontend")
-            try:
-                await room.local_participant.perform_rpc(
-                    destination_identity=participant.identity,
-                    method="client.showRecommendations",
-                    payload=json_payload
-                )
-            except Exception as rpc_error:
-                logger.warning(f"RPC call failed but continuing: {rpc_error}")
-                # Continue even if RPC fails - recommendations were still generated
+            # Each set replaces the last, so only the newest still-queued set is sent
+            userdata.dispatch(participant.identity, "client.showRecommendations", json_payload, key="recommendations")
             
             product_names = ", ".join([p.get("title", "") for p in recommended_products[:3]])
             return f"Ho ho ho! I found {len(recommended_products)} similar products you might like! For example: {product_names}. You can see all my recommendations below your wishlist."
             
         except ToolError:
             raise
+        except upstream.UpstreamUnavailable:
+            raise ToolError(CATALOG_UNAVAILABLE_MESSAGE)
         except Exception as e:
             logger.error(f"Error recommending products: {e}")
             raise ToolError(f"Something went wrong while finding recommendations. Please try again.")
 
     @function_tool
+    @tracing.traced
     async def start_rock_paper_scissors(self, context: RunContext[UserData]):
         """Start a Rock, Paper, Scissors game with the user.
         When the user asks to play Rock, Paper, Scissors, use this function to open the game modal.
@@ -918,33 +1146,22 @@ class AvatarAgent(Agent):
         if not userdata.ctx or not userdata.ctx.room:
             raise ToolError("Couldn't access the room to start the game.")
         
-        room = userdata.ctx.room
-        participants = room.remote_participants
-        if not participants:
-            raise ToolError("No participants found to start the game with.")
-        
-        participant = next(iter(participants.values()), None)
+        # The human client this session serves (never the avatar)
+        participant = userdata.client()
         if not participant:
-            raise ToolError("Couldn't get the first participant.")
+            raise ToolError("No participants found to start the game with.")
         
         try:
             # Send RPC to frontend to open the game
             payload = {
                 "action": "show",
-                "message": "Ho ho ho! Let's play Rock, Paper, Scissors! Choose your move!"
+                "message": "Ho ho ho! Let's play Rock, Paper, Scissors! Choose your move!",
+                "score": userdata.game.score()
             }
             
             json_payload = json.dumps(payload)
             logger.info("Sending Rock, Paper, Scissors game request to frontend")
-            try:
-                await room.local_participant.perform_rpc(
-                    destination_identity=participant.identity,
-                    method="client.showRockPaperScissors",
-                    payload=json_payload
-                )
-            except Exception as rpc_error:
-                logger.warning(f"RPC call failed but continuing: {rpc_error}")
-                # Continue even if RPC fails
+            userdata.dispatch(participant.identity, "client.showRockPaperScissors", json_payload)
             
             return "Ho ho ho! The game is ready! Choose rock, paper, or scissors on the left side!"
             
@@ -952,16 +1169,191 @@ class AvatarAgent(Agent):
             logger.error(f"Error starting Rock, Paper, Scissors game: {e}")
             raise ToolError(f"Something went wrong while starting the game. Please try again.")
 
+    def _resumed(self) -> bool:
+        """Whether a saved session was restored (False while it is still loading)."""
+        resume = self._resume
+        return (
+            resume is not None and resume.done() and not resume.cancelled()
+            and resume.exception() is None and resume.result()
+        )
+
     async def on_enter(self):
-        await asyncio.sleep(5)
-        self.session.generate_reply()
+        # Greet as soon as the avatar, the participant and TTS are ready and any
+        # saved session is loaded, all under one GREETING_READY_TIMEOUT deadline.
+        # The span's duration is the time to greeting.
+        entered = time.perf_counter()
+        with tracing.span("greeting") as span:
+            readiness = (
+                asyncio.ensure_future(self._readiness.wait(self.session.tts)) if self._readiness else None
+            )
+            waiters = {waiter for waiter in (readiness, self._resume) if waiter is not None}
+            if waiters:
+                await asyncio.wait(waiters, timeout=GREETING_READY_TIMEOUT)
+            ready = True
+            if readiness is not None:
+                if not readiness.done():
+                    readiness.cancel()
+                ready = readiness.done() and not readiness.cancelled() and readiness.result()
+            resumed = self._resumed()
+            span.set("ready", ready)
+            span.set("resumed", resumed)
+
+            if resumed:
+                # Tell the LLM what the returning user already has instead of starting over
+                userdata: UserData = self.session.userdata
+                gifts = ", ".join(product.title for product in userdata.wishlist) or "none"
+                letter = f"a letter to {userdata.letter.recipient}" if userdata.letter else "no letter yet"
+                chat_ctx = self.chat_ctx.copy()
+                chat_ctx.add_message(
+                    role="system",
+                    content=f"This user is returning to an earlier session. Their wishlist: {gifts}. They have {letter}, already shown on screen.",
+                )
+                await self.update_chat_ctx(chat_ctx)
+                self.session.generate_reply(
+                    instructions="Welcome the user back warmly, briefly mention what's already on their wishlist, and ask what they'd like to do next."
+                )
+            else:
+                self.session.generate_reply()
+        time_to_greeting = time.perf_counter() - entered
+        logger.info(
+            f"Time to greeting: {time_to_greeting:.3f}s after on_enter, "
+            f"{time.perf_counter() - self._created_at:.3f}s after agent creation (ready={ready}, resumed={resumed})",
+            extra={
+                "metric": "time_to_greeting",
+                "value": time_to_greeting,
+                "ready": ready,
+                "signals": self._readiness.timings if self._readiness else {},
+            },
+        )
+
+def prewarm(proc: JobProcess):
+    """Create per-process singletons shared by every job in this worker process."""
+    # Load the VAD model once per process instead of once per job
+    started = time.perf_counter()
+    proc.userdata["vad"] = load_vad()
+    proc.userdata["vad_load_seconds"] = time.perf_counter() - started
+    # Load the catalog (bundled snapshot, else one bulk fetch) before the first
+    # job arrives, and embed it for recommendations
+    catalog = preload_catalog(bulk_url=products_url(0))
+    if catalog:
+        recommender_for(catalog)
+    # Pooled HTTP client; its session is opened on the job loop and closed with the process
+    proc.userdata["http_client"] = WorkerHttpClient.from_env()
+    # Product API responses are cached across all sessions in this process
+    proc.userdata["product_cache"] = ProductCache.from_env()
+    # Span exporters (TRACE_EXPORTERS); tracing stays a no-op when none are set
+    tracing.configure()
+    # Saved wishlists and letters (SESSION_STORE), shared by every job in this process
+    proc.userdata["session_store"] = session_store.from_env()
+    # Audio of Santa's fixed phrases, loaded from disk or synthesized once per process
+    proc.userdata["phrase_cache"] = phrase_cache.from_env(
+        SANTA_VOICE_ID,
+        SANTA_PHRASES,
+        tts_factory=(lambda http_session: santa_tts(http_session=http_session)) if eleven_api_key else None,
+    )
+
+async def resume_session(ctx: JobContext, userdata: UserData, store: SessionStore) -> bool:
+    """Rehydrate the participant's saved session and persist it from now on.
+
+    A restored wishlist and letter are pushed to the frontend in one
+    client.restoreSession RPC. Returns True if a saved session was restored.
+    """
+    participant = await userdata.participants.wait_for_client()
+    userdata.participant_identity = participant.identity
+    key = session_key(participant.identity)
+    if key is None:
+        logger.info(f"Not persisting session for {participant.identity}: identity wasn't issued by the token route")
+        return False
+    with tracing.span("session.resume") as span:
+        try:
+            state = await store.load(key)
+            if state:
+                userdata.restore_state(state)
+        except Exception as e:
+            logger.warning(f"Couldn't restore session {key}, starting fresh: {e}")
+            state = None
+
+        # Persist every later change, coalesced into background writes
+        writer = SessionWriter(store, key, userdata.to_state)
+        userdata.on_change = writer.mark_dirty
+
+        async def flush_session():
+            await writer.flush()
+            logger.info(f"Session {key} saved: {writer.stats}")
+
+        ctx.add_shutdown_callback(flush_session)
+
+        restored = bool(state) and bool(userdata.wishlist or userdata.letter)
+        span.set("restored", restored)
+        if not restored:
+            return False
+        span.set("wishlist", len(userdata.wishlist))
+        logger.info(
+            f"Restored session {key}: {len(userdata.wishlist)} gifts, "
+            f"letter {'revision ' + str(userdata.letter.revision) if userdata.letter else 'none'}"
+        )
+
+        def build() -> str:
+            payload = userdata.restore_payload()
+            if userdata.letter:
+                userdata.mark_letter_synced()
+            return payload
+
+        def on_result(payload: str, response: Optional[str]) -> None:
+            if response is None and userdata.letter:
+                userdata.letter.synced_revision = None
+
+        userdata.dispatch(participant.identity, "client.restoreSession", build, on_result=on_result)
+        return True
 
 async def entrypoint(ctx: JobContext):
-    agent = AvatarAgent()
+    job_started = time.perf_counter()
+
+    # Share the worker's pooled HTTP client; it stays open for later jobs and closes with the process
+    http_client: WorkerHttpClient = ctx.proc.userdata["http_client"]
+    http_client.open()
+
+    product_cache: ProductCache = ctx.proc.userdata["product_cache"]
+
+    async def log_product_cache_stats():
+        logger.info(f"Product cache stats: {product_cache.stats()}")
+
+    ctx.add_shutdown_callback(log_product_cache_stats)
+
+    async def log_upstream_stats():
+        logger.info(f"Product API policy stats: {upstream.product_api.stats()}")
+
+    ctx.add_shutdown_callback(log_upstream_stats)
+
+    # Pre-synthesized game phrases; None when PHRASE_CACHE=0
+    phrases: Optional[PhraseCache] = ctx.proc.userdata.get("phrase_cache")
+
+    async def log_phrase_cache_stats():
+        if phrases is not None:
+            logger.info(f"Phrase cache stats: {phrases.stats()}")
+
+    ctx.add_shutdown_callback(log_phrase_cache_stats)
+
+    # Jobs in a prewarmed process skip the VAD load ("warm" start)
+    vad = ctx.proc.userdata.get("vad")
+    start_kind = "warm" if vad is not None else "cold"
     await ctx.connect()
 
+    # Create the avatar session
+    avatar = tavus.AvatarSession(
+        replica_id=os.getenv("TAVUS_REPLICA_ID", "r9d30b0e55ac"),  
+        persona_id="p28bd1d78e56"
+    )
+
     # Create a single AgentSession with userdata
-    userdata = UserData(ctx=ctx)
+    userdata = UserData(
+        ctx=ctx,
+        outbox=RpcOutbox(ctx.room),
+        participants=ParticipantRegistry(ctx.room, avatar_identity=avatar.avatar_identity),
+    )
+    # Let queued frontend updates go out before the room closes; drop queues of departed clients
+    ctx.add_shutdown_callback(userdata.outbox.close)
+    userdata.participants.on_client_left(userdata.outbox.drop)
     
     # Note: EnglishModel() causes AttributeError when used with current livekit version
     # The internal code tries to access .model and .provider attributes that don't exist
@@ -971,85 +1363,55 @@ async def entrypoint(ctx: JobContext):
         turn_detection=None  # Disabled due to compatibility issues with EnglishModel
     )
 
-    # Create the avatar session
-    avatar = tavus.AvatarSession(
-        replica_id=os.getenv("TAVUS_REPLICA_ID", "r9d30b0e55ac"),  
-        persona_id="p28bd1d78e56"
+    # Load the participant's saved session while the avatar and agent start
+    store: Optional[SessionStore] = ctx.proc.userdata.get("session_store")
+    resume = asyncio.create_task(resume_session(ctx, userdata, store)) if store else None
+
+    # Track readiness before the avatar starts so its track events aren't missed
+    readiness = GreetingReadiness(ctx.room, avatar.avatar_identity)
+    agent = AvatarAgent(
+        http_client=http_client,
+        product_cache=product_cache,
+        vad=vad,
+        readiness=readiness,
+        resume=resume,
     )
 
+    # Start gift lookups while the user is still speaking
+    session.on("user_input_transcribed", lambda event: agent.prefetcher.observe(event.transcript))
+
+    async def close_prefetcher():
+        logger.info(f"Gift prefetch stats: {agent.prefetcher.stats.as_dict()}")
+        agent.prefetcher.close()
+
+    ctx.add_shutdown_callback(close_prefetcher)
+
     # Register RPC methods - The method names need to match exactly what the client is calling
     logger.info("Registering RPC methods")
 
     # Register RPC method for handling game choices
-    async def handle_game_choice(rpc_data):
-        try:
-            logger.info(f"Received game choice payload: {rpc_data}")
+    def announce_choice(participant_identity: str, played: Round):
+        # Santa reacts to the user's move right away
+        say_phrase(session, phrases, GAME_CHOICE_MESSAGES.get(played.user_choice, GAME_CHOICE_DEFAULT_MESSAGE))
 
-            # Extract the payload from the RpcInvocationData object
-            payload_str = rpc_data.payload
-            logger.info(f"Extracted game choice string: {payload_str}")
+    def announce_result(participant_identity: str, played: Round):
+        result_message = GAME_RESULT_MESSAGES.get(played.result, GAME_RESULT_DEFAULT_MESSAGE)
+        say_phrase(session, phrases, result_message)
+        # Update the game message in the frontend; a newer message replaces a queued one
+        update_payload = json.dumps({
+            "action": "update_message",
+            "round": played.number,
+            "message": result_message
+        })
+        userdata.dispatch(participant_identity, "client.showRockPaperScissors", update_payload, key="game.message")
 
-            # Parse the JSON payload
-            payload_data = json.loads(payload_str)
-            logger.info(f"Parsed game choice data: {payload_data}")
+    # Commentary for the rounds played in this session, one round at a time
+    announcer = RoundAnnouncer(announce_choice, announce_result)
+    ctx.add_shutdown_callback(announcer.close)
 
-            user_choice = payload_data.get("choice")
-            santa_choice = payload_data.get("santaChoice")
-            result = payload_data.get("result")
-            
-            participant = next(iter(ctx.room.remote_participants.values()), None)
-            if not participant:
-                return "error: No participant found"
-            
-            if user_choice:
-                # Provide commentary based on the choice
-                choice_messages = {
-                    "rock": "Rock! A solid choice! Ho ho ho!",
-                    "paper": "Paper! Very clever!",
-                    "scissors": "Scissors! Sharp thinking! Ho ho ho!"
-                }
-                
-                message = choice_messages.get(user_choice, "Great choice! Let's see who wins!")
-                session.say(message)
-                
-                logger.info(f"User chose: {user_choice}")
-                
-                # If we have the result, provide commentary
-                if result and santa_choice:
-                    await asyncio.sleep(1)  # Small delay for dramatic effect
-                    
-                    result_messages = {
-                        "win": "Oh no! You beat me! Well played! Ho ho ho!",
-                        "lose": "Ho ho ho! I won this round! Great game though!",
-                        "tie": "It's a tie! What a coincidence! Let's play again!"
-                    }
-                    
-                    result_message = result_messages.get(result, "Great game!")
-                    session.say(result_message)
-                    
-                    # Update the game message in the frontend
-                    try:
-                        update_payload = {
-                            "action": "update_message",
-                            "message": result_message
-                        }
-                        await ctx.room.local_participant.perform_rpc(
-                            destination_identity=participant.identity,
-                            method="client.showRockPaperScissors",
-                            payload=json.dumps(update_payload)
-                        )
-                    except Exception as e:
-                        logger.warning(f"Failed to update game message: {e}")
-            else:
-                logger.error("No choice found in payload")
-
-            return "success"
-        except json.JSONDecodeError as e:
-            logger.error(f"JSON parsing error for game choice payload '{rpc_data.payload}': {e}")
-            return f"error: {str(e)}"
-        except Exception as e:
-            logger.error(f"Error handling game choice: {e}")
-            return f"error: {str(e)}"
+    async def handle_game_choice(rpc_data):
+        # The round is decided and answered immediately; commentary follows in the background
+        return handle_choice(userdata.game, announcer, rpc_data.caller_identity, rpc_data.payload)
 
     ctx.room.local_participant.register_rpc_method(
         "agent.gameChoice",
@@ -1071,6 +1433,10 @@ async def entrypoint(ctx: JobContext):
         agent=agent
     )
     logger.info("Agent session started")
+    logger.info(
+        f"Job start latency: {time.perf_counter() - job_started:.3f}s ({start_kind} start, "
+        f"VAD prewarm took {ctx.proc.userdata.get('vad_load_seconds', 0.0):.3f}s)"
+    )
     
     # Log room participants to debug
     logger.info(f"Room participants: {[p.identity for p in ctx.room.remote_participants.values()]}")
@@ -1085,6 +1451,11 @@ async def entrypoint(ctx: JobContext):
 if __name__ == "__main__":
     cli.run_app(
         WorkerOptions(
-            entrypoint_fnc=entrypoint
+            entrypoint_fnc=entrypoint,
+            prewarm_fnc=prewarm,
+            # Prewarm may spend up to CATALOG_PREWARM_TIMEOUT + PHRASE_CACHE_WARM_TIMEOUT on the network
+            initialize_process_timeout=10 + CATALOG_PREWARM_TIMEOUT + phrase_cache.PHRASE_CACHE_WARM_TIMEOUT,
+            # Serves /metrics, including span metrics from the "prometheus" trace exporter
+            prometheus_port=int(os.environ["PROMETHEUS_PORT"]) if os.getenv("PROMETHEUS_PORT") else NOT_GIVEN,
         )
     )
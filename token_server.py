@@ -0,0 +1,174 @@
+"""
+LiveKit connection-details token service.
+
+Python stand-in for the frontend's /api/connection-details route, for local
+load tests. Tokens are LiveKit-compatible HS256 JWTs. The JWT header segment,
+the video grant template and the HMAC key schedule are built once; issuing a
+token only serializes the per-participant claims and signs them.
+
+Usage:
+    python token_server.py [--host 127.0.0.1] [--port 8081]
+
+Endpoints:
+    GET  /api/connection-details   same response (and identity cookie) as the Next.js route
+    POST /api/tokens  {"count": N, "roomName": "..."}   bulk issue
+"""
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import re
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from aiohttp import web
+from dotenv import load_dotenv
+
+logger = logging.getLogger("avatar.tokens")
+
+# Same lifetime as the frontend route
+TOKEN_TTL_SECONDS = 15 * 60
+# Upper bound on tokens issued by one bulk request
+MAX_BULK_TOKENS = 1000
+# HttpOnly cookie holding the identity issued to a browser, reused on its next
+# connection so the agent can resume its session; same as the frontend route
+IDENTITY_COOKIE = "santa_identity"
+IDENTITY_COOKIE_MAX_AGE = 24 * 60 * 60
+# Identities issued by random_participant(); other cookie values are ignored
+PARTICIPANT_IDENTITY_RE = re.compile(r"voice_assistant_user_[0-9a-f]{32}")
+
+
+def _b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _json(value: object) -> str:
+    return json.dumps(value, separators=(",", ":"))
+
+
+class TokenIssuer:
+    """Issues LiveKit participant tokens from pre-built templates."""
+
+    # Grants match the frontend route: join, publish, publish data, subscribe
+    _GRANT_PREFIX = '"video":{"roomJoin":true,"room":'
+    _GRANT_SUFFIX = ',"canPublish":true,"canSubscribe":true,"canPublishData":true}'
+
+    def __init__(self, api_key: str, api_secret: str, ttl: int = TOKEN_TTL_SECONDS) -> None:
+        self.api_key = api_key
+        self.ttl = ttl
+        self._header = _b64url(_json({"alg": "HS256", "typ": "JWT"}).encode()) + "."
+        self._issuer = _json(api_key)
+        # Keyed HMAC state; copying it skips re-deriving the key pads for every token
+        self._mac = hmac.new(api_secret.encode(), digestmod=hashlib.sha256)
+
+    @classmethod
+    def from_env(cls) -> "TokenIssuer":
+        api_key = os.getenv("LIVEKIT_API_KEY")
+        api_secret = os.getenv("LIVEKIT_API_SECRET")
+        if api_key is None:
+            raise ValueError("LIVEKIT_API_KEY is not defined")
+        if api_secret is None:
+            raise ValueError("LIVEKIT_API_SECRET is not defined")
+        return cls(api_key, api_secret)
+
+    def issue(self, identity: str, room: str, now: Optional[int] = None) -> str:
+        """Sign a token allowing `identity` to join `room`."""
+        now = int(time.time()) if now is None else now
+        identity_json = _json(identity)
+        claims = (
+            f'{{"name":{identity_json},{self._GRANT_PREFIX}{_json(room)}{self._GRANT_SUFFIX},'
+            f'"sub":{identity_json},"iss":{self._issuer},"nbf":{now},"exp":{now + self.ttl}}}'
+        )
+        signing_input = self._header + _b64url(claims.encode())
+        mac = self._mac.copy()
+        mac.update(signing_input.encode("ascii"))
+        return signing_input + "." + _b64url(mac.digest())
+
+    def issue_bulk(self, participants: Sequence[Tuple[str, str]]) -> List[str]:
+        """Sign tokens for (identity, room) pairs sharing one issue timestamp."""
+        now = int(time.time())
+        return [self.issue(identity, room, now) for identity, room in participants]
+
+
+def random_participant() -> Tuple[str, str]:
+    """Unguessable identity and room name in the same format as the frontend route."""
+    return (
+        f"voice_assistant_user_{uuid.uuid4().hex}",
+        f"voice_assistant_room_{uuid.uuid4().hex}",
+    )
+
+
+def create_app(issuer: TokenIssuer, server_url: str) -> web.Application:
+    async def connection_details(request: web.Request) -> web.Response:
+        identity, room = random_participant()
+        # A returning browser keeps the identity from its cookie so the agent can
+        # resume its session; never one the client picks itself
+        issued = request.cookies.get(IDENTITY_COOKIE, "")
+        if PARTICIPANT_IDENTITY_RE.fullmatch(issued):
+            identity = issued
+        data: Dict[str, str] = {
+            "serverUrl": server_url,
+            "roomName": room,
+            "participantToken": issuer.issue(identity, room),
+            "participantName": identity,
+        }
+        response = web.json_response(data, headers={"Cache-Control": "no-store"})
+        response.set_cookie(
+            IDENTITY_COOKIE,
+            identity,
+            max_age=IDENTITY_COOKIE_MAX_AGE,
+            path="/api/connection-details",
+            httponly=True,
+            samesite="Strict",
+        )
+        return response
+
+    async def bulk_tokens(request: web.Request) -> web.Response:
+        try:
+            body = await request.json()
+            count = int(body.get("count", 1))
+        except (ValueError, TypeError, AttributeError):
+            return web.Response(status=400, text="expected a JSON body like {\"count\": 10}")
+        if not 1 <= count <= MAX_BULK_TOKENS:
+            return web.Response(status=400, text=f"count must be between 1 and {MAX_BULK_TOKENS}")
+
+        room_name = body.get("roomName")
+        participants = [random_participant() for _ in range(count)]
+        if room_name:
+            participants = [(identity, room_name) for identity, _ in participants]
+        tokens = issuer.issue_bulk(participants)
+        return web.json_response({
+            "serverUrl": server_url,
+            "tokens": [
+                {"participantName": identity, "roomName": room, "participantToken": token}
+                for (identity, room), token in zip(participants, tokens)
+            ],
+        }, headers={"Cache-Control": "no-store"})
+
+    app = web.Application()
+    app.router.add_get("/api/connection-details", connection_details)
+    app.router.add_post("/api/tokens", bulk_tokens)
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="LiveKit connection-details token service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    args = parser.parse_args()
+
+    load_dotenv(dotenv_path=Path(__file__).parent.parent / '.env', override=True)
+    logging.basicConfig(level=logging.INFO)
+    server_url = os.getenv("LIVEKIT_URL")
+    if server_url is None:
+        raise SystemExit("LIVEKIT_URL is not defined")
+    web.run_app(create_app(TokenIssuer.from_env(), server_url), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+"""
+Lightweight tracing for the agent's tools and RPC calls.
+
+A span records a name, its duration, the error class it ended with (if any) and
+attributes such as search attempts, cache hits and payload sizes. Spans nest
+through a context variable, so code deep in a lookup can annotate the span of
+the tool that triggered it with `set_attribute` / `incr`.
+
+Finished spans go to pluggable exporters: a JSONL file, Prometheus metrics
+(served by the worker's /metrics endpoint) or OpenTelemetry. With no exporter
+configured, `span()` returns a shared no-op span and the attribute helpers
+return after a single context variable lookup.
+"""
+import contextvars
+import functools
+import json
+import logging
+import os
+import secrets
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TypeVar
+
+logger = logging.getLogger("avatar.tracing")
+
+# Comma-separated exporters to enable: jsonl, prometheus, otel (empty disables tracing)
+TRACE_EXPORTERS = os.getenv("TRACE_EXPORTERS", "")
+TRACE_JSONL_PATH = os.getenv("TRACE_JSONL_PATH", "traces.jsonl")
+
+_current: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("avatar_span", default=None)
+
+F = TypeVar("F", bound=Callable[..., Awaitable[Any]])
+
+
+@dataclass(slots=True)
+class Span:
+    name: str
+    tracer: "Tracer"
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    start_time: float = field(default_factory=time.time)
+    duration: float = 0.0
+    error: Optional[str] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    _started: float = field(default_factory=time.perf_counter)
+    _token: Optional[contextvars.Token] = None
+
+    recording = True
+
+    def set(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def incr(self, key: str, amount: int = 1) -> None:
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time": self.start_time,
+            "duration": self.duration,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+    def __enter__(self) -> "Span":
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.duration = time.perf_counter() - self._started
+        if exc_type is not None:
+            self.error = exc_type.__name__
+        _current.reset(self._token)
+        self.tracer._finish(self)
+
+
+class _NoopSpan:
+    """Returned by span() while tracing is disabled."""
+
+    __slots__ = ()
+    recording = False
+
+    def set(self, key: str, value: Any) -> None:
+        pass
+
+    def incr(self, key: str, amount: int = 1) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Exporter:
+    """Receives spans as they start and finish."""
+
+    def on_start(self, span: Span) -> None:
+        pass
+
+    def export(self, span: Span) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class JsonlExporter(Exporter):
+    """Appends one JSON object per finished span to a file."""
+
+    def __init__(self, path: str = TRACE_JSONL_PATH) -> None:
+        self.path = path
+        # Line buffered so each span is a single append, even with several job processes
+        self._file = open(path, "a", buffering=1, encoding="utf-8")
+
+    def export(self, span: Span) -> None:
+        self._file.write(json.dumps(span.to_dict(), default=str) + "\n")
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class PrometheusExporter(Exporter):
+    """Records span durations and numeric attributes as Prometheus metrics.
+
+    Metrics go to prometheus_client's default registry, which the LiveKit worker
+    serves on /metrics when PROMETHEUS_PORT is set.
+    """
+
+    def __init__(self) -> None:
+        import prometheus_client
+
+        self._durations = prometheus_client.Histogram(
+            "avatar_span_duration_seconds",
+            "Duration of agent tool, lookup and RPC spans",
+            ["span", "outcome"],
+            buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+        )
+        self._attributes = prometheus_client.Counter(
+            "avatar_span_attribute",
+            "Sum of numeric span attributes (cache hits, search attempts, payload bytes)",
+            ["span", "attribute"],
+        )
+
+    def export(self, span: Span) -> None:
+        self._durations.labels(span.name, span.error or "ok").observe(span.duration)
+        for key, value in span.attributes.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                self._attributes.labels(span.name, key).inc(value)
+
+
+class OpenTelemetryExporter(Exporter):
+    """Mirrors spans onto the globally configured OpenTelemetry tracer provider."""
+
+    def __init__(self) -> None:
+        from opentelemetry import trace
+
+        self._trace = trace
+        self._tracer = trace.get_tracer("avatar")
+        self._live: Dict[str, Any] = {}
+
+    def on_start(self, span: Span) -> None:
+        parent = self._live.get(span.parent_id) if span.parent_id else None
+        context = self._trace.set_span_in_context(parent) if parent is not None else None
+        self._live[span.span_id] = self._tracer.start_span(
+            span.name, context=context, start_time=int(span.start_time * 1e9)
+        )
+
+    def export(self, span: Span) -> None:
+        otel_span = self._live.pop(span.span_id, None)
+        if otel_span is None:
+            return
+        for key, value in span.attributes.items():
+            if isinstance(value, (str, bool, int, float)):
+                otel_span.set_attribute(f"avatar.{key}", value)
+        if span.error:
+            otel_span.set_status(self._trace.Status(self._trace.StatusCode.ERROR, span.error))
+        otel_span.end(end_time=int((span.start_time + span.duration) * 1e9))
+
+
+class Tracer:
+    def __init__(self, exporters: Optional[List[Exporter]] = None) -> None:
+        self.exporters: List[Exporter] = list(exporters or [])
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.exporters)
+
+    def span(self, name: str, **attributes: Any):
+        """Context manager timing a block; a no-op when no exporter is configured."""
+        if not self.exporters:
+            return NOOP_SPAN
+        parent = _current.get()
+        span = Span(
+            name=name,
+            tracer=self,
+            trace_id=parent.trace_id if parent else secrets.token_hex(8),
+            span_id=secrets.token_hex(4),
+            parent_id=parent.span_id if parent else None,
+            attributes=attributes,
+        )
+        for exporter in self.exporters:
+            exporter.on_start(span)
+        return span
+
+    def _finish(self, span: Span) -> None:
+        for exporter in self.exporters:
+            try:
+                exporter.export(span)
+            except Exception as e:
+                logger.warning(f"Failed to export span {span.name} to {type(exporter).__name__}: {e}")
+
+    def close(self) -> None:
+        for exporter in self.exporters:
+            exporter.close()
+        self.exporters = []
+
+
+# Per-process tracer, configured at worker prewarm
+tracer = Tracer()
+
+_EXPORTERS: Dict[str, Callable[[], Exporter]] = {
+    "jsonl": JsonlExporter,
+    "prometheus": PrometheusExporter,
+    "otel": OpenTelemetryExporter,
+}
+
+
+def configure(names: str = TRACE_EXPORTERS) -> Tracer:
+    """Enable the named exporters (comma-separated) on the process tracer."""
+    for name in filter(None, (n.strip().lower() for n in names.split(","))):
+        factory = _EXPORTERS.get(name)
+        if factory is None:
+            logger.warning(f"Unknown trace exporter '{name}', expected one of {sorted(_EXPORTERS)}")
+            continue
+        try:
+            tracer.exporters.append(factory())
+        except Exception as e:
+            logger.warning(f"Failed to enable '{name}' trace exporter: {e}")
+    if tracer.enabled:
+        logger.info(f"Tracing enabled with exporters: {[type(e).__name__ for e in tracer.exporters]}")
+    return tracer
+
+
+def span(name: str, **attributes: Any):
+    return tracer.span(name, **attributes)
+
+
+def set_attribute(key: str, value: Any) -> None:
+    """Set an attribute on the innermost active span, if any."""
+    current = _current.get()
+    if current is not None:
+        current.attributes[key] = value
+
+
+def incr(key: str, amount: int = 1) -> None:
+    """Add to a counter attribute on the innermost active span, if any."""
+    current = _current.get()
+    if current is not None:
+        current.attributes[key] = current.attributes.get(key, 0) + amount
+
+
+def traced(func: F) -> F:
+    """Wrap an async tool so each call runs in a `tool.<name>` span."""
+    name = f"tool.{func.__name__}"
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        if not tracer.exporters:
+            return await func(*args, **kwargs)
+        with tracer.span(name):
+            return await func(*args, **kwargs)
+
+    return wrapper  # type: ignore[return-value]
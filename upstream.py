@@ -0,0 +1,291 @@
+"""
+Shared request policy for the product API (DummyJSON).
+
+Every session in a worker process calls the same upstream, so its health is
+tracked once per process:
+
+- A circuit breaker opens after UPSTREAM_BREAKER_FAILURES consecutive failed
+  lookups. While it is open, requests fail immediately with
+  UpstreamUnavailable (callers serve cached products instead) and, after
+  UPSTREAM_BREAKER_RESET seconds, a single probe request decides whether it
+  closes again. A lookup is everything one tool call sends inside budget():
+  it fails only if none of its requests succeeded, so one gift lookup racing
+  several search variants counts once.
+- A request still unanswered after the recent p95 latency gets a second,
+  hedged copy; whichever answers first wins and the other is cancelled.
+- A deadline budget (see budget()) bounds every request made inside a tool
+  call, so later fallbacks only get the time that is left.
+"""
+import asyncio
+import contextlib
+import contextvars
+import logging
+import os
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Deque, Dict, Iterator, Optional, TypeVar
+
+import aiohttp
+
+import tracing
+
+logger = logging.getLogger("avatar.upstream")
+
+# Consecutive failed lookups that open the breaker, and seconds before it lets a probe through
+UPSTREAM_BREAKER_FAILURES = int(os.getenv("UPSTREAM_BREAKER_FAILURES", "5"))
+UPSTREAM_BREAKER_RESET = float(os.getenv("UPSTREAM_BREAKER_RESET", "30"))
+# Set to 0 to disable hedged requests
+UPSTREAM_HEDGE = os.getenv("UPSTREAM_HEDGE", "1") != "0"
+# Hedge delay until enough latencies were seen to estimate the p95, and its lower bound
+UPSTREAM_HEDGE_DELAY = float(os.getenv("UPSTREAM_HEDGE_DELAY", "1.0"))
+UPSTREAM_HEDGE_MIN_DELAY = 0.05
+# Seconds of upstream time one tool call may spend across all its requests and fallbacks
+UPSTREAM_TOOL_BUDGET = float(os.getenv("UPSTREAM_TOOL_BUDGET", "8"))
+
+# Successful request latencies kept for the p95, and how many are needed first
+LATENCY_WINDOW = 200
+LATENCY_MIN_SAMPLES = 20
+
+T = TypeVar("T")
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("upstream_deadline", default=None)
+# Outcomes of the current lookup's requests, per breaker: True once any succeeded
+_lookup: contextvars.ContextVar[Optional[Dict["CircuitBreaker", bool]]] = contextvars.ContextVar(
+    "upstream_lookup", default=None
+)
+
+
+class UpstreamUnavailable(aiohttp.ClientError):
+    """The breaker is open; the request wasn't sent."""
+
+
+@contextlib.contextmanager
+def budget(seconds: float = UPSTREAM_TOOL_BUDGET) -> Iterator[None]:
+    """Bound every upstream request in this block (and tasks it starts) to `seconds` in total.
+
+    The block is also one lookup for the circuit breaker: on exit it records a
+    single success if any request succeeded, else a single failure if any
+    failed. Nested budgets can only shorten the enclosing one and belong to
+    its lookup.
+    """
+    deadline = time.monotonic() + seconds
+    enclosing = _deadline.get()
+    if enclosing is not None:
+        deadline = min(deadline, enclosing)
+    token = _deadline.set(deadline)
+    outcomes: Optional[Dict[CircuitBreaker, bool]] = None
+    lookup_token = None
+    if _lookup.get() is None:
+        outcomes = {}
+        lookup_token = _lookup.set(outcomes)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+        if lookup_token is not None:
+            _lookup.reset(lookup_token)
+            for breaker, succeeded in outcomes.items():
+                if succeeded:
+                    breaker.record_success()
+                else:
+                    breaker.record_failure()
+
+
+def remaining(timeout: float) -> float:
+    """`timeout`, cut to what's left of the current budget (may be <= 0)."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return timeout
+    return min(timeout, deadline - time.monotonic())
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with a single half-open probe."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = UPSTREAM_BREAKER_FAILURES, reset_timeout: float = UPSTREAM_BREAKER_RESET) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        # Times the breaker opened
+        self.trips = 0
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            logger.info("Product API breaker half-open, probing")
+        if self.state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self, probe: bool = False) -> None:
+        if self.state != self.CLOSED and not probe:
+            # Sent before the breaker opened; only the probe decides whether it closes
+            return
+        if self.state != self.CLOSED:
+            logger.info("Product API breaker closed")
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self, probe: bool = False) -> None:
+        if self.state != self.CLOSED and not probe:
+            return
+        self.failures += 1
+        if probe or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self.trips += 1
+            logger.warning(
+                f"Product API breaker open after {self.failures} consecutive failed lookups; "
+                f"serving cached products for {self.reset_timeout:.0f}s"
+            )
+        self._probing = False
+
+    def release(self) -> None:
+        """Give back the half-open probe slot; only for the call that acquired it."""
+        self._probing = False
+
+
+@dataclass(slots=True)
+class PolicyStats:
+    requests: int = 0
+    failures: int = 0
+    # Requests refused while the breaker was open
+    rejected: int = 0
+    hedged: int = 0
+    # Hedged requests answered first by the second copy
+    hedge_wins: int = 0
+
+
+class UpstreamPolicy:
+    """Circuit breaker, hedging and deadline budget around one upstream's requests."""
+
+    def __init__(
+        self,
+        breaker: Optional[CircuitBreaker] = None,
+        hedge: bool = UPSTREAM_HEDGE,
+        hedge_delay: float = UPSTREAM_HEDGE_DELAY,
+    ) -> None:
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self.hedge = hedge
+        self.default_hedge_delay = hedge_delay
+        self.counters = PolicyStats()
+        self._latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+
+    def hedge_delay(self) -> float:
+        """Seconds to wait before hedging: the p95 of recent successful requests."""
+        if len(self._latencies) < LATENCY_MIN_SAMPLES:
+            return self.default_hedge_delay
+        ordered = sorted(self._latencies)
+        return max(UPSTREAM_HEDGE_MIN_DELAY, ordered[int(len(ordered) * 0.95) - 1])
+
+    async def call(self, request: Callable[[float], Awaitable[T]], timeout: float, hedge: bool = True) -> T:
+        """Run request(timeout) under the breaker and the current budget, hedging it if slow.
+
+        Raises UpstreamUnavailable if the breaker is open, asyncio.TimeoutError if
+        the budget is used up, and otherwise the last attempt's error.
+        """
+        timeout = remaining(timeout)
+        if timeout <= 0:
+            raise asyncio.TimeoutError("upstream budget exhausted")
+        if not self.breaker.allow():
+            self.counters.rejected += 1
+            tracing.incr("breaker_rejected")
+            raise UpstreamUnavailable("product API circuit breaker is open")
+        # allow() only lets a request through a half-open breaker as its probe
+        probe = self.breaker.state == CircuitBreaker.HALF_OPEN
+
+        self.counters.requests += 1
+        loop = asyncio.get_running_loop()
+        started: Dict[asyncio.Future, float] = {}
+
+        def attempt(attempt_timeout: float) -> asyncio.Future:
+            task = asyncio.ensure_future(request(attempt_timeout))
+            started[task] = loop.time()
+            return task
+
+        deadline = loop.time() + timeout
+        primary = attempt(timeout)
+        try:
+            delay = self.hedge_delay()
+            if hedge and self.hedge and self.breaker.state == CircuitBreaker.CLOSED and delay < timeout:
+                done, _ = await asyncio.wait({primary}, timeout=delay)
+                if not done:
+                    self.counters.hedged += 1
+                    tracing.incr("hedged")
+                    attempt(timeout - delay)
+
+            # The first attempt to succeed wins; one that fails leaves the other running
+            pending = set(started)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=deadline - loop.time(), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    error = asyncio.TimeoutError(f"upstream request timed out after {timeout:.1f}s")
+                    break
+                for task in done:
+                    if task.exception() is None:
+                        self._latencies.append(loop.time() - started[task])
+                        if task is not primary:
+                            self.counters.hedge_wins += 1
+                            tracing.incr("hedge_wins")
+                        self._record(True, probe)
+                        return task.result()
+                    error = task.exception()
+            self.counters.failures += 1
+            self._record(False, probe)
+            raise error
+        except asyncio.CancelledError:
+            # The caller gave up (e.g. a lost search race or an interrupted tool
+            # call); that says nothing about the upstream
+            if probe:
+                self.breaker.release()
+            raise
+        finally:
+            for task in started:
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    # The losing attempt's error is superseded by the winner's result
+                    task.exception()
+
+    def _record(self, succeeded: bool, probe: bool) -> None:
+        """Count a request's outcome towards its lookup, or directly outside of one (and for the probe)."""
+        outcomes = _lookup.get()
+        if outcomes is None or probe:
+            if succeeded:
+                self.breaker.record_success(probe)
+            else:
+                self.breaker.record_failure(probe)
+        else:
+            outcomes[self.breaker] = outcomes.get(self.breaker, False) or succeeded
+
+    def stats(self) -> Dict[str, object]:
+        stats = self.counters
+        return {
+            "breaker": self.breaker.state,
+            "breaker_trips": self.breaker.trips,
+            "requests": stats.requests,
+            "failures": stats.failures,
+            "rejected": stats.rejected,
+            "hedged": stats.hedged,
+            "hedge_win_rate": round(stats.hedge_wins / stats.hedged, 3) if stats.hedged else 0.0,
+            "hedge_delay_ms": round(self.hedge_delay() * 1000, 1),
+        }
+
+
+# The product API policy shared by every session in this process
+product_api = UpstreamPolicy()
@@ -1,5 +1,5 @@
 import { AccessToken, AccessTokenOptions, VideoGrant } from "livekit-server-sdk";
-import { NextResponse } from "next/server";
+import { NextRequest, NextResponse } from "next/server";
 
 // NOTE: you are expected to define the following environment variables in `.env.local`:
 const API_KEY = process.env.LIVEKIT_API_KEY;
@@ -16,7 +16,20 @@ export type ConnectionDetails = {
   participantToken: string;
 };
 
-export async function GET() {
+// HttpOnly cookie holding the identity this server issued to the browser. The
+// agent resumes saved sessions by identity, so it is never taken from anything
+// the page itself can choose.
+const IDENTITY_COOKIE = "santa_identity";
+// Same as the agent's SESSION_STORE_TTL default
+const IDENTITY_COOKIE_MAX_AGE = 24 * 60 * 60;
+// Identities issued below; other cookie values are ignored
+const PARTICIPANT_IDENTITY_RE = /^voice_assistant_user_[0-9a-f]{32}$/;
+
+function randomId() {
+  return crypto.randomUUID().replace(/-/g, "");
+}
+
+export async function GET(request: NextRequest) {
   try {
     if (LIVEKIT_URL === undefined) {
       throw new Error("LIVEKIT_URL is not defined");
@@ -28,9 +41,14 @@ export async function GET() {
       throw new Error("LIVEKIT_API_SECRET is not defined");
     }
 
-    // Generate participant token
-    const participantIdentity = `voice_assistant_user_${Math.floor(Math.random() * 10_000)}`;
-    const roomName = `voice_assistant_room_${Math.floor(Math.random() * 10_000)}`;
+    // Generate participant token. A returning browser keeps the identity from its
+    // cookie so the agent can resume its saved wishlist and letter
+    const issuedIdentity = request.cookies.get(IDENTITY_COOKIE)?.value;
+    const participantIdentity =
+      issuedIdentity && PARTICIPANT_IDENTITY_RE.test(issuedIdentity)
+        ? issuedIdentity
+        : `voice_assistant_user_${randomId()}`;
+    const roomName = `voice_assistant_room_${randomId()}`;
     const participantToken = await createParticipantToken(
       { identity: participantIdentity },
       roomName
@@ -46,7 +64,15 @@ export async function GET() {
     const headers = new Headers({
       "Cache-Control": "no-store",
     });
-    return NextResponse.json(data, { headers });
+    const response = NextResponse.json(data, { headers });
+    response.cookies.set(IDENTITY_COOKIE, participantIdentity, {
+      httpOnly: true,
+      secure: process.env.NODE_ENV === "production",
+      sameSite: "strict",
+      path: "/api/connection-details",
+      maxAge: IDENTITY_COOKIE_MAX_AGE,
+    });
+    return response;
   } catch (error) {
     if (error instanceof Error) {
       console.error(error);
@@ -38,6 +38,8 @@ export default function Page() {
       process.env.NEXT_PUBLIC_CONN_DETAILS_ENDPOINT ?? "/api/connection-details",
       window.location.origin
     );
+    // The route keeps this browser's identity in an HttpOnly cookie, so a
+    // reconnect resumes the saved session
     const response = await fetch(url.toString());
     const connectionDetailsData: ConnectionDetails = await response.json();
 
@@ -291,21 +293,39 @@ function SimpleVoiceAssistant(props: { onConnectButtonClicked: () => void }) {
           <RockPaperScissorsPanel 
             gameState={gameState}
             onClose={() => setIsGameVisible(false)}
-            onChoice={(choice, santaChoice, result) => {
-              setGameState({
+            onChoice={(choice) => {
+              setGameState((prev) => ({
+                ...prev,
                 userChoice: choice,
-                santaChoice,
-                result,
+                santaChoice: null,
+                result: null,
                 message: "",
-              });
+              }));
+            }}
+            onRound={(round) => {
+              setGameState((prev) => ({
+                ...prev,
+                userChoice: round.choice,
+                santaChoice: round.santaChoice,
+                result: round.result,
+                score: round.score,
+              }));
+            }}
+            onRoundFailed={() => {
+              setGameState((prev) => ({
+                ...prev,
+                userChoice: null,
+                message: "Santa missed that one! Choose your move again!",
+              }));
             }}
             onReset={() => {
-              setGameState({
+              setGameState((prev) => ({
+                ...prev,
                 userChoice: null,
                 santaChoice: null,
                 result: null,
                 message: "Choose your move!",
-              });
+              }));
             }}
             room={room}
           />
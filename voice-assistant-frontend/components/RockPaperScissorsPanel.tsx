@@ -4,10 +4,9 @@ import { motion } from "framer-motion";
 import { Room } from "livekit-client";
 import { useVoiceAssistant } from "@livekit/components-react";
 import { CloseIcon } from "./CloseIcon";
-import type { GameState, GameChoice } from "@/types";
+import type { GameState, GameChoice, GameRound, GameScore } from "@/types";
 import {
-  generateSantaChoice,
-  calculateGameResult,
+  parseGameRound,
   getChoiceEmoji,
   getResultMessage,
   getResultColor,
@@ -16,7 +15,9 @@ import {
 interface RockPaperScissorsPanelProps {
   gameState: GameState;
   onClose: () => void;
-  onChoice: (choice: GameChoice, santaChoice: GameChoice, result: "win" | "lose" | "tie") => void;
+  onChoice: (choice: GameChoice) => void;
+  onRound: (round: GameRound) => void;
+  onRoundFailed: () => void;
   onReset: () => void;
   room: Room;
 }
@@ -29,27 +30,30 @@ export default function RockPaperScissorsPanel({
   gameState,
   onClose,
   onChoice,
+  onRound,
+  onRoundFailed,
   onReset,
   room,
 }: RockPaperScissorsPanelProps) {
   const { agent } = useVoiceAssistant();
 
   const handleChoice = async (choice: GameChoice) => {
-    const santaChoice = generateSantaChoice();
-    const result = calculateGameResult(choice, santaChoice);
-
-    onChoice(choice, santaChoice, result);
-
-    if (agent) {
-      try {
-        await room.localParticipant.performRpc({
-          destinationIdentity: agent.identity,
-          method: "agent.gameChoice",
-          payload: JSON.stringify({ choice, santaChoice, result }),
-        });
-      } catch (error) {
-        console.error("Error sending choice to agent:", error);
-      }
+    if (!agent) {
+      return;
+    }
+
+    // Santa's move and the result come back in the agent's answer
+    onChoice(choice);
+    try {
+      const response = await room.localParticipant.performRpc({
+        destinationIdentity: agent.identity,
+        method: "agent.gameChoice",
+        payload: JSON.stringify({ choice }),
+      });
+      onRound(parseGameRound(response));
+    } catch (error) {
+      console.error("Error sending choice to agent:", error);
+      onRoundFailed();
     }
   };
 
@@ -107,6 +111,8 @@ function GameContent({ gameState, onChoice, onReset, isChoiceDisabled }: GameCon
         </div>
       )}
 
+      {gameState.score && <GameScoreDisplay score={gameState.score} />}
+
       {gameState.userChoice && gameState.santaChoice && gameState.result && (
         <GameResultDisplay
           userChoice={gameState.userChoice}
@@ -135,6 +141,14 @@ function GameContent({ gameState, onChoice, onReset, isChoiceDisabled }: GameCon
   );
 }
 
+function GameScoreDisplay({ score }: { score: GameScore }) {
+  return (
+    <div className="text-sm font-semibold text-center">
+      You {score.wins} · Santa {score.losses} · Ties {score.ties}
+    </div>
+  );
+}
+
 interface GameResultDisplayProps {
   userChoice: GameChoice;
   santaChoice: GameChoice;
@@ -1,6 +1,23 @@
-import { useEffect } from "react";
+import { useEffect, useRef } from "react";
 import { Room } from "livekit-client";
-import type { WishlistProduct, Letter, GameState, RpcPayload } from "@/types";
+import type { WishlistProduct, Letter, LetterPatch, GameState, GameScore, RpcPayload } from "@/types";
+import { applyLetterPatch } from "@/utils/letterPatch";
+
+// Returned to the agent when a letter patch doesn't apply to our revision
+const LETTER_RESYNC_RESPONSE = "resync";
+
+function toWishlistProduct(productData: unknown): WishlistProduct {
+  return {
+    id: (productData as { id: string }).id,
+    title: (productData as { title: string }).title,
+    description1: (productData as { description1?: string }).description1 || "",
+    description2: (productData as { description2?: string }).description2 || "",
+    description3: (productData as { description3?: string }).description3 || "",
+    image: (productData as { image?: string }).image || "/images/airpods.png",
+    price: (productData as { price?: number }).price || 0,
+    category: (productData as { category?: string }).category || "",
+  };
+}
 
 interface UseRpcHandlersProps {
   room: Room | null;
@@ -27,6 +44,9 @@ export function useRpcHandlers({
   onGameVisibilityChange,
   onGameStateUpdate,
 }: UseRpcHandlersProps) {
+  // Last letter received from the agent, the base that patches are applied to
+  const letterRef = useRef<Letter | null>(null);
+
   useEffect(() => {
     if (!room) return;
 
@@ -40,18 +60,12 @@ export function useRpcHandlers({
           typeof data.payload === "string" ? JSON.parse(data.payload) : data.payload;
 
         if (payload.action === "add" && payload.product) {
-          const productData = payload.product as unknown;
-          const product: WishlistProduct = {
-            id: (productData as { id: string }).id,
-            title: (productData as { title: string }).title,
-            description1: (productData as { description1?: string }).description1 || "",
-            description2: (productData as { description2?: string }).description2 || "",
-            description3: (productData as { description3?: string }).description3 || "",
-            image: (productData as { image?: string }).image || "/images/airpods.png",
-            price: (productData as { price?: number }).price || 0,
-            category: (productData as { category?: string }).category || "",
-          };
-          onWishlistUpdate(product);
+          onWishlistUpdate(toWishlistProduct(payload.product));
+        } else if (payload.action === "add_batch" && payload.products) {
+          // Several gifts resolved by one tool call arrive in a single RPC
+          (payload.products as unknown[]).forEach((productData) =>
+            onWishlistUpdate(toWishlistProduct(productData))
+          );
         }
 
         return "Success";
@@ -72,9 +86,19 @@ export function useRpcHandlers({
 
         if (payload.action === "show" || payload.action === "update") {
           if (payload.letter) {
-            onLetterUpdate(payload.letter as Letter);
+            letterRef.current = payload.letter as Letter;
+            onLetterUpdate(letterRef.current);
             onLetterVisibilityChange(true);
           }
+        } else if (payload.action === "patch" && payload.letter) {
+          const patched = applyLetterPatch(letterRef.current, payload.letter as LetterPatch);
+          if (!patched) {
+            // Out of sync: ask the agent for the full letter
+            return LETTER_RESYNC_RESPONSE;
+          }
+          letterRef.current = patched;
+          onLetterUpdate(patched);
+          onLetterVisibilityChange(true);
         } else if (payload.action === "hide") {
           onLetterVisibilityChange(false);
         }
@@ -86,6 +110,34 @@ export function useRpcHandlers({
       }
     };
 
+    const handleRestoreSessionRpc = async (data: { payload?: string | RpcPayload }): Promise<string> => {
+      try {
+        if (!data?.payload) {
+          throw new Error("Invalid RPC data format");
+        }
+
+        const payload: RpcPayload =
+          typeof data.payload === "string" ? JSON.parse(data.payload) : data.payload;
+
+        // A resumed session's wishlist and letter arrive together in one RPC
+        if (payload.action === "restore") {
+          ((payload.wishlist as unknown[]) || []).forEach((productData) =>
+            onWishlistUpdate(toWishlistProduct(productData))
+          );
+          if (payload.letter) {
+            letterRef.current = payload.letter as Letter;
+            onLetterUpdate(letterRef.current);
+            onLetterVisibilityChange(true);
+          }
+        }
+
+        return "Success";
+      } catch (error) {
+        console.error("Error processing restored session:", error);
+        return `Error: ${error instanceof Error ? error.message : String(error)}`;
+      }
+    };
+
     const handlePdfExportRpc = async (): Promise<string> => {
       try {
         onPdfExportRequest();
@@ -110,14 +162,7 @@ export function useRpcHandlers({
         if (payload.action === "show_recommendations" && payload.products) {
           const productsData = payload.products as unknown[];
           const products: WishlistProduct[] = productsData.map((p: unknown) => ({
-            id: (p as { id: string }).id,
-            title: (p as { title: string }).title,
-            description1: (p as { description1?: string }).description1 || "",
-            description2: (p as { description2?: string }).description2 || "",
-            description3: (p as { description3?: string }).description3 || "",
-            image: (p as { image?: string }).image || "/images/airpods.png",
-            price: (p as { price?: number }).price || 0,
-            category: (p as { category?: string }).category || "",
+            ...toWishlistProduct(p),
             isRecommendation: true,
           }));
           onRecommendationsUpdate(products);
@@ -146,6 +191,7 @@ export function useRpcHandlers({
             santaChoice: null,
             result: null,
             message: (payload.message as string) || "Choose your move!",
+            score: (payload.score as GameScore) ?? null,
           });
         } else if (payload.action === "hide") {
           onGameVisibilityChange(false);
@@ -162,6 +208,7 @@ export function useRpcHandlers({
 
     room.localParticipant.registerRpcMethod("client.addToWishlist", handleWishlistRpc);
     room.localParticipant.registerRpcMethod("client.showLetter", handleLetterRpc);
+    room.localParticipant.registerRpcMethod("client.restoreSession", handleRestoreSessionRpc);
     room.localParticipant.registerRpcMethod("client.downloadLetterPDF", handlePdfExportRpc);
     room.localParticipant.registerRpcMethod("client.showRecommendations", handleRecommendationsRpc);
     room.localParticipant.registerRpcMethod("client.showRockPaperScissors", handleGameRpc);
@@ -169,6 +216,7 @@ export function useRpcHandlers({
     return () => {
       room.localParticipant.unregisterRpcMethod("client.addToWishlist");
       room.localParticipant.unregisterRpcMethod("client.showLetter");
+      room.localParticipant.unregisterRpcMethod("client.restoreSession");
       room.localParticipant.unregisterRpcMethod("client.downloadLetterPDF");
       room.localParticipant.unregisterRpcMethod("client.showRecommendations");
       room.localParticipant.unregisterRpcMethod("client.showRockPaperScissors");
@@ -12,19 +12,53 @@ export interface WishlistProduct {
 
 export interface Letter {
   id: string;
+  revision?: number;
   recipient: string;
   content: string;
   products?: WishlistProduct[];
 }
 
+/**
+ * Delta update for the letter, applied on top of revision `baseRevision`.
+ * `paragraphs` maps paragraph index to new text for changed paragraphs only.
+ */
+export interface LetterPatch {
+  id: string;
+  baseRevision: number;
+  revision: number;
+  recipient: string;
+  paragraphCount: number;
+  paragraphs: Record<string, string>;
+  removedProductIds: string[];
+  addedProducts: WishlistProduct[];
+}
+
 export type GameChoice = "rock" | "paper" | "scissors";
 export type GameResult = "win" | "lose" | "tie";
 
+export interface GameScore {
+  wins: number;
+  losses: number;
+  ties: number;
+}
+
+/**
+ * A round decided by the agent (the agent.gameChoice response)
+ */
+export interface GameRound {
+  round: number;
+  choice: GameChoice;
+  santaChoice: GameChoice;
+  result: GameResult;
+  score: GameScore;
+}
+
 export interface GameState {
   userChoice: GameChoice | null;
   santaChoice: GameChoice | null;
   result: GameResult | null;
   message: string;
+  score?: GameScore | null;
 }
 
 export interface RpcPayload {
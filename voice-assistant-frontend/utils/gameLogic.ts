@@ -1,33 +1,14 @@
-import type { GameChoice, GameResult } from "@/types";
+import type { GameChoice, GameResult, GameRound } from "@/types";
 
 /**
- * Generates a random choice for Santa
- * Using Math.random ensures fair distribution across all three options
+ * Parses the agent's answer to agent.gameChoice
+ * Santa's move and the result are decided by the agent; errors come back as "error: ..."
  */
-export function generateSantaChoice(): GameChoice {
-  const choices: GameChoice[] = ["rock", "paper", "scissors"];
-  return choices[Math.floor(Math.random() * choices.length)];
-}
-
-/**
- * Determines the game result based on user and Santa choices
- * Returns "tie" if choices match, "win" if user wins, "lose" if Santa wins
- */
-export function calculateGameResult(
-  userChoice: GameChoice,
-  santaChoice: GameChoice
-): GameResult {
-  if (userChoice === santaChoice) {
-    return "tie";
+export function parseGameRound(response: string): GameRound {
+  if (response.startsWith("error")) {
+    throw new Error(response);
   }
-
-  const winConditions: Record<GameChoice, GameChoice> = {
-    rock: "scissors",
-    paper: "rock",
-    scissors: "paper",
-  };
-
-  return winConditions[userChoice] === santaChoice ? "win" : "lose";
+  return JSON.parse(response) as GameRound;
 }
 
 /**
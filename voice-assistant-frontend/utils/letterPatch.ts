@@ -0,0 +1,26 @@
+import type { Letter, LetterPatch } from "@/types";
+
+/**
+ * Applies a letter patch, or returns null if it was computed against another revision
+ */
+export function applyLetterPatch(letter: Letter | null, patch: LetterPatch): Letter | null {
+  if (!letter || letter.id !== patch.id || letter.revision !== patch.baseRevision) {
+    return null;
+  }
+
+  const paragraphs = letter.content.split("\n\n").slice(0, patch.paragraphCount);
+  for (const [index, text] of Object.entries(patch.paragraphs)) {
+    paragraphs[Number(index)] = text;
+  }
+
+  const removedIds = new Set(patch.removedProductIds);
+  const products = (letter.products || []).filter((p) => !removedIds.has(p.id));
+
+  return {
+    ...letter,
+    revision: patch.revision,
+    recipient: patch.recipient,
+    content: paragraphs.join("\n\n"),
+    products: [...products, ...patch.addedProducts],
+  };
+}